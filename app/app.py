@@ -38,29 +38,29 @@ def huanik(
         )
 
     try:
-        model_load(endpoint, base, model, api_key, temperature, rpm)
+        config = model_load(endpoint, base, model, api_key, temperature, rpm)
     except Exception as e:
         raise gr.Error(f"发生了意外的错误：{e}") from e
 
     source_text = re.sub(r"(?m)^\s*$\n?", "", source_text)
 
     if choice:
-        init_translation, reflect_translation, final_translation = (
-            translator_sec(
-                endpoint2=endpoint2,
-                base2=base2,
-                model2=model2,
-                api_key2=api_key2,
-                source_lang=source_lang,
-                target_lang=target_lang,
-                source_text=source_text,
-                country=country,
-                max_tokens=max_tokens,
-            )
+        outputs = translator_sec(
+            model=config,
+            endpoint2=endpoint2,
+            base2=base2,
+            model2=model2,
+            api_key2=api_key2,
+            source_lang=source_lang,
+            target_lang=target_lang,
+            source_text=source_text,
+            country=country,
+            max_tokens=max_tokens,
         )
 
     else:
-        init_translation, reflect_translation, final_translation = translator(
+        outputs = translator(
+            model=config,
             source_lang=source_lang,
             target_lang=target_lang,
             source_text=source_text,
@@ -68,6 +68,15 @@ def huanik(
             max_tokens=max_tokens,
         )
 
+    # 边生成边更新三个输出框，对比结果在最后给出
+    for init_translation, reflect_translation, final_translation in outputs:
+        yield (
+            init_translation,
+            reflect_translation,
+            final_translation,
+            gr.update(),
+        )
+
     final_diff = gr.HighlightedText(
         diff_texts(init_translation, final_translation),
         label="翻译对比",
@@ -77,7 +86,7 @@ def huanik(
         color_map={"removed": "red", "added": "green"},
     )
 
-    return init_translation, reflect_translation, final_translation, final_diff
+    yield init_translation, reflect_translation, final_translation, final_diff
 
 
 def update_model(endpoint):
@@ -1,20 +1,69 @@
 import os
 import time
-from functools import wraps
-from threading import Lock
-from typing import Optional, Union
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Union
 
 import gradio as gr
-import openai
 import translation_agent.utils as utils
+from translation_agent.cache import CompletionCache
+from translation_agent.clients import get_client
+from translation_agent.ratelimit import RateLimiter, limiter_for
+from translation_agent.retry import (
+    CircuitBreaker,
+    breaker_for,
+    call_with_retry,
+)
+from translation_agent.stats import (
+    current_stage,
+    record_completion,
+    record_usage,
+)
+from translation_agent.streaming import STREAM_OPTIONS, current_stream
 
 
 RPM = 60
-MODEL = ""
+# 每分钟令牌数限制，None 表示不限制
+TPM = None
 TEMPERATURE = 0.3
 # Hide js_mode in UI now, update in plan.
 JS_MODE = False
-ENDPOINT = ""
+
+# 设置 TRANSLATION_AGENT_CACHE 为 SQLite 文件路径即可在 WebUI 中复用已有的补全；
+# 未设置时使用内存缓存，某次调用失败后重新翻译不会重复已完成的块
+utils.set_completion_cache(
+    CompletionCache(os.getenv("TRANSLATION_AGENT_CACHE") or ":memory:")
+)
+
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """
+    一次翻译使用的端点、模型和参数，由 model_load 创建。
+
+    属性:
+        client: 端点的 OpenAI 客户端，由 clients 中的注册表共享。
+        model (str): 模型名称。
+        temperature (float): 采样温度。
+        json_mode (bool): 是否以 JSON 模式请求。
+        limiter (RateLimiter): 端点的 RPM/TPM 令牌桶。
+        breaker (CircuitBreaker): 端点的断路器。
+    """
+
+    client: Any
+    model: str
+    temperature: float
+    json_mode: bool
+    limiter: RateLimiter
+    breaker: CircuitBreaker
+
+
+# 当前翻译按阶段使用的模型，"default" 用于没有单独指定的阶段；
+# 每个会话在自己的上下文中设置，互不影响
+_current_models: ContextVar[Optional[Dict[str, ModelConfig]]] = ContextVar(
+    "app_models", default=None
+)
 
 
 # Add your LLMs here
@@ -26,65 +75,150 @@ def model_load(
     temperature: float = TEMPERATURE,
     rpm: int = RPM,
     js_mode: bool = JS_MODE,
-):
-    global client, RPM, MODEL, TEMPERATURE, JS_MODE, ENDPOINT
-    ENDPOINT = endpoint
-    RPM = rpm
-    MODEL = model
-    TEMPERATURE = temperature
-    JS_MODE = js_mode
+    tpm: Optional[int] = TPM,
+) -> ModelConfig:
+    """
+    按界面中的设置创建 ModelConfig，不修改任何全局状态。
 
+    返回的配置通过 use_models 在一次翻译的范围内生效，
+    并发的会话和之后的翻译不受影响。
+    """
+    # 相同端点、地址和密钥复用同一个客户端及其连接池，
+    # 重复加载或在翻译中途切换端点都不会丢弃已经建立的连接
     match endpoint:
         case "OpenAI":
-            client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            client = get_client(
+                api_key=os.getenv("OPENAI_API_KEY"), endpoint=endpoint
+            )
         case "Groq":
-            client = openai.OpenAI(
+            client = get_client(
                 api_key=api_key if api_key else os.getenv("GROQ_API_KEY"),
                 base_url="https://api.groq.com/openai/v1",
+                endpoint=endpoint,
             )
         case "TogetherAI":
-            client = openai.OpenAI(
+            client = get_client(
                 api_key=api_key if api_key else os.getenv("TOGETHER_API_KEY"),
                 base_url="https://api.together.xyz/v1",
+                endpoint=endpoint,
             )
         case "CUSTOM":
-            client = openai.OpenAI(api_key=api_key, base_url=base_url)
+            client = get_client(
+                api_key=api_key, base_url=base_url, endpoint=endpoint
+            )
         case "Ollama":
-            client = openai.OpenAI(
-                api_key="ollama", base_url="http://localhost:11434/v1"
+            client = get_client(
+                api_key="ollama",
+                base_url="http://localhost:11434/v1",
+                endpoint=endpoint,
             )
         case _:
-            client = openai.OpenAI(
-                api_key=api_key if api_key else os.getenv("OPENAI_API_KEY")
+            client = get_client(
+                api_key=api_key if api_key else os.getenv("OPENAI_API_KEY"),
+                endpoint=endpoint,
             )
 
+    # 每个端点使用自己的令牌桶，切换端点不会重置其他端点的额度
+    return ModelConfig(
+        client=client,
+        model=model,
+        temperature=temperature,
+        json_mode=js_mode,
+        limiter=limiter_for(f"{endpoint}|{base_url}", rpm, tpm),
+        breaker=breaker_for(f"{endpoint}|{base_url}"),
+    )
+
+
+@contextmanager
+def use_models(default: ModelConfig, **stages: ModelConfig) -> Iterator[None]:
+    """
+    在作用范围内用 default 生成补全，stages 按阶段标签指定不同的模型。
+
+    示例:
+        >>> with use_models(first, reflect=second, improve=second):
+        ...     translate(source_lang, target_lang, source_text, country)
+    """
+    token = _current_models.set({"default": default, **stages})
+    try:
+        yield
+    finally:
+        _current_models.reset(token)
+
 
-def rate_limit(get_max_per_minute):
-    def decorator(func):
-        lock = Lock()
-        last_called = [0.0]
+def current_model() -> ModelConfig:
+    """返回当前阶段使用的模型配置。"""
+    models = _current_models.get()
+    if models is None:
+        raise gr.Error("请先加载模型")
+    return models.get(current_stage(), models["default"])
 
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            with lock:
-                max_per_minute = get_max_per_minute()
-                min_interval = 60.0 / max_per_minute
-                elapsed = time.time() - last_called[0]
-                left_to_wait = min_interval - elapsed
 
-                if left_to_wait > 0:
-                    time.sleep(left_to_wait)
+def _create_completion(
+    prompt: str, system_message: str, config: ModelConfig
+) -> str:
+    """调用 config 的端点生成补全，受该端点的 RPM/TPM 限制和断路器保护。"""
+    client, limiter = config.client, config.limiter
+    model, temperature = config.model, config.temperature
 
-                ret = func(*args, **kwargs)
-                last_called[0] = time.time()
-                return ret
+    def request() -> str:
+        # 只在准入时持有锁，不同请求的 API 调用可以并行进行
+        estimated = 0
+        if limiter.tpm:
+            estimated = 2 * (
+                utils.num_tokens_in_string(system_message)
+                + utils.num_tokens_in_string(prompt)
+            )
+        limiter.acquire(estimated)
+
+        # 在 stream_completions 范围内把增量实时转发给界面
+        stream = current_stream()
+        options = STREAM_OPTIONS if stream is not None else {}
+        started = time.perf_counter()
 
-        return wrapper
+        if config.json_mode:
+            response = client.chat.completions.create(
+                model=model,
+                temperature=temperature,
+                top_p=1,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt},
+                ],
+                **options,
+            )
+        else:
+            response = client.chat.completions.create(
+                model=model,
+                temperature=temperature,
+                top_p=1,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt},
+                ],
+                **options,
+            )
+        if stream is not None:
+            content, usage = stream.consume(response, started)
+        else:
+            content = response.choices[0].message.content
+            usage = getattr(response, "usage", None)
+        # 流式响应的用量在最后一个块中，同样记录并修正 TPM 额度
+        record_usage(usage, model)
+        limiter.settle(estimated, utils._usage_tokens(usage))
+        return content
 
-    return decorator
+    # 限流和临时错误按 utils.retry_policy 重试，只重复失败的这一次调用；
+    # 重试用尽后才报错，已完成的补全保存在缓存中，重新翻译时直接复用
+    try:
+        policy = utils.retry_policy
+        if policy is None:
+            return request()
+        return call_with_retry(request, policy, config.breaker)
+    except Exception as e:
+        raise gr.Error(f"发生了一个意外的错误：{e}") from e
 
 
-@rate_limit(lambda: RPM)
 def get_completion(
     prompt: str,
     system_message: str = "你是一个提供帮助的助手。",
@@ -112,39 +246,30 @@ def get_completion(
             如果 json_mode 为 False，则返回生成的文本作为一个字符串。
     """
 
-    model = MODEL
-    temperature = TEMPERATURE
-    json_mode = JS_MODE
+    # 模型和参数取自当前会话在本阶段使用的配置，调用方传入的值被忽略
+    config = current_model()
+    model = config.model
+    temperature = config.temperature
+    json_mode = config.json_mode
 
-    if json_mode:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                temperature=temperature,
-                top_p=1,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt},
-                ],
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            raise gr.Error(f"发生了一个意外的错误：{e}") from e
-    else:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                temperature=temperature,
-                top_p=1,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt},
-                ],
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            raise gr.Error(f"发生了一个意外的错误：{e}") from e
+    # 缓存命中时直接返回，不占用 RPM 配额
+    cache = utils.completion_cache
+    if cache is not None:
+        key = cache.key(model, system_message, prompt, temperature, json_mode)
+        cached = cache.get(key)
+        if cached is not None:
+            stream = current_stream()
+            if stream is not None:
+                stream.on_delta(cached)
+            record_completion(0.0, cached=True)
+            return cached
+
+    started = time.perf_counter()
+    content = _create_completion(prompt, system_message, config)
+    record_completion(time.perf_counter() - started)
+    if cache is not None and content is not None:
+        cache.set(key, content)
+    return content
 
 
 utils.get_completion = get_completion
@@ -158,4 +283,4 @@ multichunk_initial_translation = utils.multichunk_initial_translation
 multichunk_reflect_on_translation = utils.multichunk_reflect_on_translation
 multichunk_improve_translation = utils.multichunk_improve_translation
 multichunk_translation = utils.multichunk_translation
-calculate_chunk_size = utils.calculate_chunk_size
+translate = utils.translate
@@ -1,26 +1,27 @@
+import queue
+import threading
 from difflib import Differ
 
 import docx
 import gradio as gr
 import pymupdf
-from icecream import ic
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from patch import (
-    calculate_chunk_size,
-    model_load,
-    multichunk_improve_translation,
-    multichunk_initial_translation,
-    multichunk_reflect_on_translation,
-    num_tokens_in_string,
-    one_chunk_improve_translation,
-    one_chunk_initial_translation,
-    one_chunk_reflect_on_translation,
-)
+from patch import ModelConfig, model_load, translate, use_models
 from simplemma import simple_tokenizer
+from translation_agent.streaming import stream_completions
+from translation_agent.tracing import Tracer, trace
 
 
 progress = gr.Progress()
 
+# 界面中的三个输出框依次对应的阶段
+STAGES = ("initial", "reflect", "improve")
+
+STAGE_DESCRIPTIONS = {
+    "initial": "初次翻译中...",
+    "reflect": "反思中...",
+    "improve": "二次翻译中...",
+}
+
 
 def extract_text(path):
     with open(path) as f:
@@ -86,91 +87,123 @@ def diff_texts(text1, text2):
     return highlighted_text
 
 
-# 改编自 src.translaation-agent.utils.tranlsate
-def translator(
+class StageEvents(Tracer):
+    """把库中翻译阶段的开始和结果放进队列，供界面线程读取。"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def on_span_start(self, span):
+        if span.name == "stage":
+            self.events.put(("stage", span.attributes["stage"]))
+
+    def on_span_end(self, span):
+        if span.name == "stage" and span.error is None:
+            output = span.output
+            if isinstance(output, list):
+                output = "".join(output)
+            self.events.put(("output", span.attributes["stage"], output))
+
+
+def run_translation(
+    model: ModelConfig,
     source_lang: str,
     target_lang: str,
     source_text: str,
     country: str,
     max_tokens: int = 1000,
+    **stage_models: ModelConfig,
 ):
     """
-    将 source_text 从 source_lang 翻译到 target_lang。
-    """
-    num_tokens_in_text = num_tokens_in_string(source_text)
-
-    ic(num_tokens_in_text)
-
-    if num_tokens_in_text < max_tokens:
-        ic("将文本作为单个块翻译")
-
-        progress((1, 3), desc="初次翻译中...")
-        init_translation = one_chunk_initial_translation(
-            source_lang, target_lang, source_text
-        )
-
-        progress((2, 3), desc="反思中...")
-        reflection = one_chunk_reflect_on_translation(
-            source_lang, target_lang, source_text, init_translation, country
-        )
-
-        progress((3, 3), desc="二次翻译中...")
-        final_translation = one_chunk_improve_translation(
-            source_lang, target_lang, source_text, init_translation, reflection
-        )
+    在后台线程中用库的 translate 翻译，边生成边产出界面输出。
 
-        return init_translation, reflection, final_translation
-
-    else:
-        ic("将文本作为多个块翻译")
-
-        token_size = calculate_chunk_size(
-            token_count=num_tokens_in_text, token_limit=max_tokens
-        )
-
-        ic(token_size)
-
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name="gpt-4",
-            chunk_size=token_size,
-            chunk_overlap=0,
-        )
-
-        source_text_chunks = text_splitter.split_text(source_text)
-
-        progress((1, 3), desc="初次翻译中...")
-        translation_1_chunks = multichunk_initial_translation(
-            source_lang, target_lang, source_text_chunks
-        )
-
-        init_translation = "".join(translation_1_chunks)
-
-        progress((2, 3), desc="反思中...")
-        reflection_chunks = multichunk_reflect_on_translation(
-            source_lang,
-            target_lang,
-            source_text_chunks,
-            translation_1_chunks,
-            country,
-        )
+    生成器：翻译过程中不断产出 (初次翻译, 反思, 二次翻译) 的当前内容，
+    最后一次产出为完整结果。阶段的开始和结果来自 tracing 的 "stage" Span，
+    补全内容以流式方式实时显示在当前阶段的输出框中。补全使用 model，
+    stage_models 按阶段标签指定不同的模型；这些设置只对本次翻译有效。
+    """
+    events = queue.Queue()
+    outcome = {}
 
-        reflection = "".join(reflection_chunks)
+    def run():
+        try:
+            with use_models(model, **stage_models), trace(
+                StageEvents(events)
+            ), stream_completions(
+                lambda delta: events.put(("delta", delta)),
+                # 请求中途失败重试时去掉已显示的部分，避免重复
+                lambda text: events.put(("discard", text)),
+            ):
+                outcome["result"] = translate(
+                    source_lang,
+                    target_lang,
+                    source_text,
+                    country,
+                    max_tokens=max_tokens,
+                )
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    outputs = dict.fromkeys(STAGES, "")
+    current = None
+    while (event := events.get()) is not None:
+        if event[0] == "stage":
+            current = event[1]
+            if current in outputs:
+                outputs[current] = ""
+                progress(
+                    (STAGES.index(current) + 1, len(STAGES)),
+                    desc=STAGE_DESCRIPTIONS[current],
+                )
+        elif event[0] == "delta":
+            if current in outputs:
+                outputs[current] += event[1]
+                yield tuple(outputs.values())
+        elif event[0] == "discard":
+            if current in outputs:
+                text = outputs[current]
+                start = text.rfind(event[1])
+                if start >= 0:
+                    outputs[current] = (
+                        text[:start] + text[start + len(event[1]) :]
+                    )
+                    yield tuple(outputs.values())
+        elif event[1] in outputs:
+            outputs[event[1]] = event[2]
+            yield tuple(outputs.values())
+
+    if "error" in outcome:
+        raise outcome["error"]
+
+    outputs["improve"] = outcome["result"]
+    yield tuple(outputs.values())
 
-        progress((3, 3), desc="二次翻译中...")
-        translation_2_chunks = multichunk_improve_translation(
-            source_lang,
-            target_lang,
-            source_text_chunks,
-            translation_1_chunks,
-            reflection_chunks,
-        )
 
-        final_translation = "".join(translation_2_chunks)
+def translator(
+    model: ModelConfig,
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str,
+    max_tokens: int = 1000,
+):
+    """
+    将 source_text 从 source_lang 翻译到 target_lang。
 
-        return init_translation, reflection, final_translation
+    生成器：翻译过程中不断产出 (初次翻译, 反思, 二次翻译) 的当前内容，
+    最后一次产出为完整结果。
+    """
+    yield from run_translation(
+        model, source_lang, target_lang, source_text, country, max_tokens
+    )
 
 
 def translator_sec(
+    model: ModelConfig,
     endpoint2: str,
     base2: str,
     model2: str,
@@ -182,86 +215,24 @@ def translator_sec(
     max_tokens: int = 1000,
 ):
     """
-    将 source_text 从 source_lang 翻译到 target_lang。
-    """
-    num_tokens_in_text = num_tokens_in_string(source_text)
-
-    ic(num_tokens_in_text)
-
-    if num_tokens_in_text < max_tokens:
-        ic("将文本作为单个块翻译")
+    将 source_text 从 source_lang 翻译到 target_lang，反思和改进使用第二个模型。
 
-        progress((1, 3), desc="初次翻译中...")
-        init_translation = one_chunk_initial_translation(
-            source_lang, target_lang, source_text
-        )
-
-        try:
-            model_load(endpoint2, base2, model2, api_key2)
-        except Exception as e:
-            raise gr.Error(f"发生了一个意外的错误：{e}") from e
-
-        progress((2, 3), desc="反思中...")
-        reflection = one_chunk_reflect_on_translation(
-            source_lang, target_lang, source_text, init_translation, country
-        )
-
-        progress((3, 3), desc="二次翻译中...")
-        final_translation = one_chunk_improve_translation(
-            source_lang, target_lang, source_text, init_translation, reflection
-        )
-
-        return init_translation, reflection, final_translation
-
-    else:
-        ic("将文本作为多个块翻译")
-
-        token_size = calculate_chunk_size(
-            token_count=num_tokens_in_text, token_limit=max_tokens
-        )
-
-        ic(token_size)
-
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name="gpt-4",
-            chunk_size=token_size,
-            chunk_overlap=0,
-        )
-
-        source_text_chunks = text_splitter.split_text(source_text)
-
-        progress((1, 3), desc="初次翻译中...")
-        translation_1_chunks = multichunk_initial_translation(
-            source_lang, target_lang, source_text_chunks
-        )
-
-        init_translation = "".join(translation_1_chunks)
+    生成器：翻译过程中不断产出 (初次翻译, 反思, 二次翻译) 的当前内容，
+    最后一次产出为完整结果。
+    """
 
-        try:
-            model_load(endpoint2, base2, model2, api_key2)
-        except Exception as e:
-            raise gr.Error(f"发生了一个意外的错误：{e}") from e
-
-        progress((2, 3), desc="反思中...")
-        reflection_chunks = multichunk_reflect_on_translation(
-            source_lang,
-            target_lang,
-            source_text_chunks,
-            translation_1_chunks,
-            country,
-        )
-
-        reflection = "".join(reflection_chunks)
-
-        progress((3, 3), desc="二次翻译中...")
-        translation_2_chunks = multichunk_improve_translation(
-            source_lang,
-            target_lang,
-            source_text_chunks,
-            translation_1_chunks,
-            reflection_chunks,
-        )
-
-        final_translation = "".join(translation_2_chunks)
-
-        return init_translation, reflection, final_translation
+    try:
+        second = model_load(endpoint2, base2, model2, api_key2)
+    except Exception as e:
+        raise gr.Error(f"发生了一个意外的错误：{e}") from e
+
+    yield from run_translation(
+        model,
+        source_lang,
+        target_lang,
+        source_text,
+        country,
+        max_tokens,
+        reflect=second,
+        improve=second,
+    )
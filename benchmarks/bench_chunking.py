@@ -0,0 +1,271 @@
+"""
+比较内置分块器与原来的 RecursiveCharacterTextSplitter。
+
+langchain 是原来 split_source_text 的实现，recursive 是在令牌偏移量上执行的同样的
+递归分隔符策略，builtin 是 translation_agent.chunking 中按句子边界平衡切分的分块器。
+
+对每个示例文本报告块数、块令牌数的最大值/最小值/变异系数、在句子边界结束的块所占比例
+以及切分耗时（不含编码）。多块翻译的整体耗时取决于最大的块，因此最大值和变异系数越小越好。
+
+用法:
+    python benchmarks/bench_chunking.py [--max-tokens 500] [--repeat 20] [文件 ...]
+
+默认使用 examples/sample-texts 中的所有文本；JSON 文件中的记录会拼接成一个文档。
+"""
+
+import argparse
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from translation_agent.chunking import chunk_text
+from translation_agent.tokens import TokenizedText, get_encoding
+
+
+SAMPLE_DIR = (
+    Path(__file__).resolve().parent.parent / "examples" / "sample-texts"
+)
+
+# 按优先级排列的分隔符，与 RecursiveCharacterTextSplitter 的默认值相同
+SEPARATORS = ("\n\n", "\n", " ", "")
+
+# 块末尾（忽略闭合引号和空白）是句末标点即视为在句子边界结束
+_SENTENCE_END = re.compile(r"[.!?。！？；…][\"'”’」』）)\]]*\s*$")
+
+
+def load_texts(paths: List[Path]) -> Dict[str, str]:
+    texts = {}
+    for path in paths:
+        if path.suffix == ".json":
+            records = json.loads(path.read_text(encoding="utf-8"))
+            texts[path.name] = "\n\n".join(
+                record["text"] for record in records
+            )
+        else:
+            texts[path.name] = path.read_text(encoding="utf-8")
+    return texts
+
+
+def calculate_chunk_size(token_count: int, token_limit: int) -> int:
+    """
+    根据令牌总数和令牌限制来计算块的大小。
+
+    参数:
+        token_count (int): 令牌的总数。
+        token_limit (int): 每个块允许的最大令牌数。
+
+    返回:
+        int: 计算出的块大小。
+
+    描述:
+        该函数基于给定的令牌总数和令牌限制来计算块的大小。
+        如果令牌总数小于或等于令牌限制，则函数将返回令牌总数作为块大小。
+        否则，它将计算在令牌限制内容纳所有令牌所需的块数。
+        块大小由令牌限制除以块数来确定。
+        如果在令牌总数除以令牌限制后还有剩余的令牌，
+        则通过将剩余的令牌除以块数来调整块大小。
+
+    示例:
+        >>> calculate_chunk_size(1000, 500)
+        500
+        >>> calculate_chunk_size(1530, 500)
+        389
+        >>> calculate_chunk_size(2242, 500)
+        496
+    """
+
+    if token_count <= token_limit:
+        return token_count
+
+    num_chunks = (token_count + token_limit - 1) // token_limit
+    chunk_size = token_count // num_chunks
+
+    remaining_tokens = token_count % token_limit
+    if remaining_tokens > 0:
+        chunk_size += remaining_tokens // num_chunks
+
+    return chunk_size
+
+
+def split_token_spans(
+    tokenized: TokenizedText,
+    chunk_size: int,
+    separators: Sequence[str] = SEPARATORS,
+) -> List[Tuple[int, int]]:
+    """
+    按分隔符优先级递归切分文本，使每块不超过 chunk_size 个令牌。
+
+    与 RecursiveCharacterTextSplitter 的策略相同：先尝试最粗的分隔符，
+    过大的片段再用下一级分隔符切分，相邻的小片段合并到 chunk_size 为止。
+    分隔符保留在后一个片段的开头，所有区间首尾相接，拼接后与原文完全一致。
+
+    参数:
+        tokenized (TokenizedText): 已编码的文本。
+        chunk_size (int): 每块的最大令牌数。
+        separators (Sequence[str], 可选): 按优先级排列的分隔符，"" 表示按令牌切分。
+
+    返回:
+        List[Tuple[int, int]]: 每块的字符区间 [start, end)。
+    """
+    text = tokenized.text
+
+    def split(
+        start: int, end: int, seps: Sequence[str]
+    ) -> List[Tuple[int, int]]:
+        if tokenized.count(start, end) <= chunk_size:
+            return [(start, end)]
+
+        # 第一个出现在区间中的分隔符，没有时按令牌切分
+        k = next(
+            (
+                k
+                for k, sep in enumerate(seps)
+                if sep == "" or text.find(sep, start, end) != -1
+            ),
+            None,
+        )
+        if k is None or seps[k] == "":
+            return tokenized.cut(start, end, chunk_size)
+
+        sep = seps[k]
+        rest = seps[k + 1 :]
+        pieces = []
+        piece_start = start
+        position = text.find(sep, start + 1, end)
+        while position != -1:
+            pieces.append((piece_start, position))
+            piece_start = position
+            position = text.find(sep, position + len(sep), end)
+        pieces.append((piece_start, end))
+
+        spans: List[Tuple[int, int]] = []
+        current_start, current_end, current_count = start, start, 0
+        for piece_start, piece_end in pieces:
+            piece_count = tokenized.count(piece_start, piece_end)
+            if piece_count > chunk_size:
+                if current_end > current_start:
+                    spans.append((current_start, current_end))
+                spans.extend(split(piece_start, piece_end, rest))
+                current_start = current_end = piece_end
+                current_count = 0
+                continue
+            if (
+                current_count + piece_count > chunk_size
+                and current_end > current_start
+            ):
+                spans.append((current_start, current_end))
+                current_start, current_count = piece_start, 0
+            current_end = piece_end
+            current_count += piece_count
+        if current_end > current_start:
+            spans.append((current_start, current_end))
+        return spans
+
+    if not text:
+        return []
+    return split(0, len(text), separators)
+
+
+def split_tokenized_text(
+    tokenized: TokenizedText, chunk_size: int
+) -> List[str]:
+    """返回 split_token_spans 切分出的文本块。"""
+    return [
+        tokenized.text[start:end]
+        for start, end in split_token_spans(tokenized, chunk_size)
+    ]
+
+
+def langchain_split(tokenized: TokenizedText, max_tokens: int) -> List[str]:
+    """原来 split_source_text 的实现。"""
+    chunk_size = calculate_chunk_size(len(tokenized), max_tokens)
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-4", chunk_size=chunk_size, chunk_overlap=0
+    )
+    return splitter.split_text(tokenized.text)
+
+
+def recursive_split(tokenized: TokenizedText, max_tokens: int) -> List[str]:
+    """同样的递归分隔符策略，但直接在令牌偏移量上切分。"""
+    chunk_size = calculate_chunk_size(len(tokenized), max_tokens)
+    return split_tokenized_text(tokenized, chunk_size)
+
+
+def builtin_split(tokenized: TokenizedText, max_tokens: int) -> List[str]:
+    return chunk_text(tokenized, max_tokens)
+
+
+def measure(
+    split: Callable[[TokenizedText, int], List[str]],
+    tokenized: TokenizedText,
+    max_tokens: int,
+    repeat: int,
+) -> Dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = split(tokenized, max_tokens)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    encoding = get_encoding()
+    sizes = [len(encoding.encode(chunk)) for chunk in chunks]
+    mean = statistics.mean(sizes)
+    sentence_ends = sum(
+        1 for chunk in chunks[:-1] if _SENTENCE_END.search(chunk)
+    )
+    return {
+        "chunks": len(chunks),
+        "max": max(sizes),
+        "min": min(sizes),
+        "cv": statistics.pstdev(sizes) / mean if mean else 0.0,
+        "sentence_end": (
+            sentence_ends / (len(chunks) - 1) if len(chunks) > 1 else 1.0
+        ),
+        "ms": elapsed * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="*", type=Path)
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(
+        path
+        for path in SAMPLE_DIR.iterdir()
+        if path.suffix in (".txt", ".json")
+    )
+    splitters = {
+        "langchain": langchain_split,
+        "recursive": recursive_split,
+        "builtin": builtin_split,
+    }
+
+    header = (
+        f"{'text':<28}{'splitter':<11}{'tokens':>7}{'chunks':>7}"
+        f"{'max':>6}{'min':>6}{'cv':>7}{'sent%':>7}{'ms':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, text in load_texts(paths).items():
+        tokenized = TokenizedText(text)
+        if len(tokenized) <= args.max_tokens:
+            print(f"{name:<28}(不超过 {args.max_tokens} 个令牌，无需切分)")
+            continue
+        for label, split in splitters.items():
+            result = measure(split, tokenized, args.max_tokens, args.repeat)
+            print(
+                f"{name:<28}{label:<11}{len(tokenized):>7}"
+                f"{result['chunks']:>7}{result['max']:>6}{result['min']:>6}"
+                f"{result['cv']:>7.3f}{result['sentence_end'] * 100:>6.0f}%"
+                f"{result['ms']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
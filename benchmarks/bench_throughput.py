@@ -0,0 +1,234 @@
+"""
+在本地模拟服务器上测量各执行方式的翻译吞吐量。
+
+启动 benchmarks/mock_server.py 中的模拟服务器，把 translation_agent 的客户端指向它，
+用 examples/sample-texts 中的文本（JSON 文件中的每条记录是一篇文档）构造指定数量的
+文档，按每种执行方式翻译全部文档。对每种方式报告文档数/秒、单篇文档耗时的 p50/p99、
+API 调用数、重试数、服务器返回的 429 数以及服务器端单次请求耗时的 p50/p99。
+
+执行方式:
+    full/stage      三次调用，按阶段屏障执行
+    full/dataflow   三次调用，按块推进的数据流调度
+    fused/stage     两次调用，反思和改进合并为一次 JSON 模式的调用
+    draft/stage     只做初始翻译
+    full/async      atranslate，在一个事件循环中并发翻译
+    draft/packed    translate_packed，把多篇短文档打包进同一个请求
+
+用法:
+    python benchmarks/bench_throughput.py [--docs 24] [--concurrency 4] [--chunk-concurrency 4]
+        [--max-tokens 200] [--latency 0.2] [--tps 200] [--error-rate 0.02] [--rpm 600]
+        [--modes full/stage,draft/stage]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from mock_server import MockConfig, MockServer
+
+
+SAMPLE_DIR = (
+    Path(__file__).resolve().parent.parent / "examples" / "sample-texts"
+)
+
+MODES = (
+    "full/stage",
+    "full/dataflow",
+    "fused/stage",
+    "draft/stage",
+    "full/async",
+    "draft/packed",
+)
+
+
+def load_documents(count: int) -> List[str]:
+    """按顺序循环使用示例文本，凑足 count 篇文档。"""
+    texts = []
+    for path in sorted(SAMPLE_DIR.iterdir()):
+        if path.suffix == ".json":
+            records = json.loads(path.read_text(encoding="utf-8"))
+            texts.extend(record["text"] for record in records)
+        elif path.suffix == ".txt":
+            texts.append(path.read_text(encoding="utf-8"))
+    return [texts[i % len(texts)] for i in range(count)]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法的百分位数，values 为空时返回 0。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_threads(
+    translate_one: Callable[[str], str], docs: List[str], concurrency: int
+) -> List[float]:
+    """用线程池并发翻译文档，返回每篇文档的耗时。"""
+
+    def timed(doc: str) -> float:
+        started = time.perf_counter()
+        translate_one(doc)
+        return time.perf_counter() - started
+
+    # 每个任务在调用方上下文的副本中运行，使 collect_stats 对工作线程可见
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(
+            executor.map(lambda doc: context.copy().run(timed, doc), docs)
+        )
+
+
+def run_async(
+    atranslate_one, docs: List[str], concurrency: int
+) -> List[float]:
+    """在一个事件循环中并发翻译文档，返回每篇文档的耗时。"""
+
+    async def main() -> List[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(doc: str) -> float:
+            async with semaphore:
+                started = time.perf_counter()
+                await atranslate_one(doc)
+                return time.perf_counter() - started
+
+        return await asyncio.gather(*(timed(doc) for doc in docs))
+
+    return asyncio.run(main())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--chunk-concurrency", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tps", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--rpm", type=int)
+    parser.add_argument("--tpm", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        seed=args.seed,
+    )
+    server = MockServer(config).start()
+
+    # translation_agent 第一次创建客户端时读取这些环境变量，变量名由它的
+    # .env 约定决定，不能改成全大写
+    base_url = server.base_url
+    os.environ["OpenAI_Compatibility_BASE_URL"] = base_url  # noqa: SIM112
+    os.environ["OpenAI_Compatibility_MODEL"] = "mock-model"  # noqa: SIM112
+    os.environ["GROQ_API_KEY"] = "mock"
+
+    from icecream import ic
+    from translation_agent.async_utils import atranslate
+    from translation_agent.packing import translate_packed
+    from translation_agent.stats import collect_stats
+    from translation_agent.utils import translate
+
+    ic.disable()
+
+    docs = load_documents(args.docs)
+    options = {
+        "max_tokens": args.max_tokens,
+        "max_concurrency": args.chunk_concurrency,
+    }
+
+    def sync_mode(pipeline: str, schedule: str) -> Callable[[], List[float]]:
+        def run() -> List[float]:
+            return run_threads(
+                lambda doc: translate(
+                    "English",
+                    "Spanish",
+                    doc,
+                    "",
+                    pipeline=pipeline,
+                    schedule=schedule,
+                    **options,
+                ),
+                docs,
+                args.concurrency,
+            )
+
+        return run
+
+    def async_mode() -> List[float]:
+        return run_async(
+            lambda doc: atranslate("English", "Spanish", doc, "", **options),
+            docs,
+            args.concurrency,
+        )
+
+    def packed_mode() -> List[float]:
+        started = time.perf_counter()
+        translate_packed(
+            "English", "Spanish", docs, max_concurrency=args.concurrency
+        )
+        return [time.perf_counter() - started] * len(docs)
+
+    runners: Dict[str, Callable[[], List[float]]] = {
+        "full/stage": sync_mode("full", "stage"),
+        "full/dataflow": sync_mode("full", "dataflow"),
+        "fused/stage": sync_mode("fused", "stage"),
+        "draft/stage": sync_mode("draft", "stage"),
+        "full/async": async_mode,
+        "draft/packed": packed_mode,
+    }
+
+    header = (
+        f"{'mode':<15}{'docs/s':>8}{'p50':>8}{'p99':>8}{'calls':>7}"
+        f"{'retries':>8}{'429':>6}{'call p50':>10}{'call p99':>10}"
+    )
+    print(
+        f"{len(docs)} 篇文档，文档并发 {args.concurrency}，块并发 "
+        f"{args.chunk_concurrency}，max_tokens {args.max_tokens}，"
+        f"服务器延迟 {args.latency}s，{args.tps:g} 令牌/秒，"
+        f"429 注入比例 {args.error_rate:g}"
+    )
+    print(header)
+    print("-" * len(header))
+    try:
+        for mode in args.modes.split(","):
+            server.reset_stats()
+            started = time.perf_counter()
+            with collect_stats() as stats:
+                latencies = runners[mode]()
+            elapsed = time.perf_counter() - started
+            served = server.stats
+            print(
+                f"{mode:<15}{len(docs) / elapsed:>8.2f}"
+                f"{statistics.median(latencies):>8.2f}"
+                f"{percentile(latencies, 99):>8.2f}"
+                f"{stats.calls:>7}{stats.retries:>8}"
+                f"{served.injected_errors + served.rate_limited:>6}"
+                f"{percentile(served.latencies, 50):>10.3f}"
+                f"{percentile(served.latencies, 99):>10.3f}"
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
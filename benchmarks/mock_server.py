@@ -0,0 +1,422 @@
+"""
+模拟 OpenAI 兼容 chat completions 接口的本地服务器，用于在不调用付费服务的情况下测量吞吐量。
+
+服务器按配置的延迟分布和生成速度（令牌/秒）等待后返回确定的补全，可以按比例注入 429
+错误并执行 RPM/TPM 限制，超出限制时返回带 Retry-After 的 429。补全内容根据提示中的
+标签生成：翻译请求返回 <TRANSLATE_THIS> 中的文本（或整个 <SOURCE_TEXT>），反思请求返回
+建议，JSON 模式的融合请求和打包请求返回对应结构的 JSON。支持 stream=True 的 SSE 响应，
+stream_options.include_usage 为真时在最后一个块中返回用量。
+
+令牌数按每 4 个字符 1 个令牌估算，不需要下载编码文件。
+
+用法:
+    python benchmarks/mock_server.py [--port 8000] [--latency 0.3] [--tps 80] [--error-rate 0.05]
+
+然后设置 OpenAI_Compatibility_BASE_URL=http://127.0.0.1:8000/v1 运行翻译。
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+_TRANSLATE_THIS = re.compile(
+    r"<TRANSLATE_THIS>\n?(.*?)\n?</TRANSLATE_THIS>", re.S
+)
+_SOURCE_TEXT = re.compile(r"<SOURCE_TEXT>\n?(.*?)\n?</SOURCE_TEXT>", re.S)
+_SEGMENTS = re.compile(r"<SEGMENTS>\n(.*?)\n</SEGMENTS>", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    """按每 4 个字符 1 个令牌估算。"""
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class MockConfig:
+    """
+    模拟服务器的行为。
+
+    属性:
+        latency (float): 首个令牌前的延迟中位数（秒）。
+        latency_sigma (float): 对数正态分布的 sigma，0 表示固定延迟。
+        tokens_per_second (float): 生成速度，0 表示不计生成时间。
+        error_rate (float): 随机返回 429 的比例。
+        retry_after (float): 注入的 429 和超限的 429 中 Retry-After 的秒数。
+        rpm (int, 可选): 每分钟请求数限制。
+        tpm (int, 可选): 每分钟令牌数限制（提示和补全令牌之和）。
+        seed (int, 可选): 随机数种子，便于重复实验。
+    """
+
+    latency: float = 0.3
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 80.0
+    error_rate: float = 0.0
+    retry_after: float = 1.0
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    seed: Optional[int] = None
+
+
+@dataclass
+class ServerStats:
+    """服务器端的计数和每个成功请求的服务时间（秒）。"""
+
+    requests: int = 0
+    injected_errors: int = 0
+    rate_limited: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+
+def _last_match(pattern: re.Pattern, text: str) -> Optional[str]:
+    matches = pattern.findall(text)
+    return matches[-1] if matches else None
+
+
+def fake_content(prompt: str, json_mode: bool) -> str:
+    """根据提示中的标签生成确定的补全。"""
+    chunk = _last_match(_TRANSLATE_THIS, prompt)
+    if chunk is None:
+        chunk = _last_match(_SOURCE_TEXT, prompt) or prompt
+    translation = f"[translated] {chunk}"
+
+    if json_mode:
+        segments = _SEGMENTS.search(prompt)
+        if segments is not None:
+            items = json.loads(segments.group(1))
+            return json.dumps(
+                {
+                    "translations": [
+                        {
+                            "id": item["id"],
+                            "translation": f"[translated] {item['text']}",
+                        }
+                        for item in items
+                    ]
+                },
+                ensure_ascii=False,
+            )
+        return json.dumps(
+            {"critique": "1. 保持术语一致。", "translation": translation},
+            ensure_ascii=False,
+        )
+
+    if "<EXPERT_SUGGESTIONS>" in prompt:
+        return translation
+    if "<TRANSLATION>" in prompt:
+        return "1. 保持术语一致。\n2. 调整语序使译文更自然。"
+    return translation
+
+
+class _Window:
+    """最近 60 秒内的请求和令牌数，用于执行 RPM/TPM 限制。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Deque[Tuple[float, int]] = deque()
+
+    def admit(
+        self, tokens: int, rpm: Optional[int], tpm: Optional[int]
+    ) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._entries and now - self._entries[0][0] >= 60:
+                self._entries.popleft()
+            if rpm is not None and len(self._entries) >= rpm:
+                return False
+            used = sum(count for _, count in self._entries)
+            if tpm is not None and used + tokens > tpm:
+                return False
+            self._entries.append((now, tokens))
+            return True
+
+
+class MockServer:
+    """
+    在后台线程中运行的模拟服务器，可以作为上下文管理器使用。
+
+    示例:
+        >>> with MockServer(MockConfig(latency=0.1, error_rate=0.05)) as server:
+        ...     client = openai.OpenAI(api_key="mock", base_url=server.base_url)
+        ...     print(server.stats.requests)
+    """
+
+    def __init__(
+        self,
+        config: Optional[MockConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.config = config or MockConfig()
+        self.stats = ServerStats()
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._window = _Window()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = ServerStats()
+
+    def _latency(self) -> float:
+        config = self.config
+        with self._lock:
+            if config.latency_sigma <= 0:
+                return config.latency
+            return self._random.lognormvariate(0, config.latency_sigma) * (
+                config.latency
+            )
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.config.error_rate
+
+    def _record(self, **counts: Any) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                if key == "latency":
+                    self.stats.latencies.append(value)
+                else:
+                    setattr(self.stats, key, getattr(self.stats, key) + value)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _json(
+                self,
+                status: int,
+                body: Dict[str, Any],
+                headers: Optional[Dict[str, str]] = None,
+            ) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _too_many_requests(self, message: str) -> None:
+                self._json(
+                    429,
+                    {"error": {"message": message, "type": "rate_limit"}},
+                    {"Retry-After": str(server.config.retry_after)},
+                )
+
+            # 方法名由 BaseHTTPRequestHandler 规定
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._json(404, {"error": {"message": "not found"}})
+                    return
+                server._record(requests=1)
+
+                messages = request.get("messages", [])
+                prompt = "\n".join(
+                    str(message.get("content", "")) for message in messages
+                )
+                json_mode = (request.get("response_format") or {}).get(
+                    "type"
+                ) == "json_object"
+                content = fake_content(
+                    messages[-1].get("content", "") if messages else "",
+                    json_mode,
+                )
+                prompt_tokens = estimate_tokens(prompt)
+                completion_tokens = estimate_tokens(content)
+
+                if server._inject_error():
+                    server._record(injected_errors=1)
+                    self._too_many_requests("injected rate limit error")
+                    return
+                config = server.config
+                if not server._window.admit(
+                    prompt_tokens + completion_tokens, config.rpm, config.tpm
+                ):
+                    server._record(rate_limited=1)
+                    self._too_many_requests("rate limit exceeded")
+                    return
+
+                started = time.perf_counter()
+                time.sleep(server._latency())
+                generation = (
+                    completion_tokens / config.tokens_per_second
+                    if config.tokens_per_second > 0
+                    else 0.0
+                )
+                model = request.get("model") or "mock"
+
+                if request.get("stream"):
+                    usage = None
+                    if (request.get("stream_options") or {}).get(
+                        "include_usage"
+                    ):
+                        usage = {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                        }
+                    self._stream(content, generation, model, usage)
+                else:
+                    time.sleep(generation)
+                    self._json(
+                        200,
+                        {
+                            "id": "chatcmpl-mock",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {
+                                        "role": "assistant",
+                                        "content": content,
+                                    },
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                            "usage": {
+                                "prompt_tokens": prompt_tokens,
+                                "completion_tokens": completion_tokens,
+                                "total_tokens": prompt_tokens
+                                + completion_tokens,
+                            },
+                        },
+                    )
+                server._record(
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    latency=time.perf_counter() - started,
+                )
+
+            def _stream(
+                self,
+                content: str,
+                generation: float,
+                model: str,
+                usage: Optional[Dict[str, int]] = None,
+            ):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                pieces = re.findall(r"\S*\s*", content)[:-1] or [content]
+                for piece in pieces:
+                    time.sleep(generation / len(pieces))
+                    event = {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"content": piece},
+                                "finish_reason": None,
+                            }
+                        ],
+                    }
+                    self._chunk(f"data: {json.dumps(event)}\n\n")
+                if usage is not None:
+                    # stream_options.include_usage：最后一个块不含 choices，只有用量
+                    event = {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [],
+                        "usage": usage,
+                    }
+                    self._chunk(f"data: {json.dumps(event)}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self._chunk("")
+
+            def _chunk(self, text: str) -> None:
+                data = text.encode()
+                self.wfile.write(
+                    f"{len(data):X}\r\n".encode() + data + b"\r\n"
+                )
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tps", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--rpm", type=int)
+    parser.add_argument("--tpm", type=int)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        seed=args.seed,
+    )
+    server = MockServer(config, args.host, args.port)
+    print(f"模拟服务器运行在 {server.base_url}，按 Ctrl+C 退出")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import json
 import os
 
 import translation_agent as ta
@@ -13,16 +14,33 @@ if __name__ == "__main__":
 
     full_path = os.path.join(script_dir, relative_path)
 
-    with open(full_path, encoding="utf-8") as file:
-        source_text = file.read()
+    if full_path.endswith(".json"):
+        # JSON 文件是 {"text": ...} 记录的列表，逐条翻译并写入 JSONL
+        with open(full_path, encoding="utf-8") as file:
+            records = json.load(file)
 
-    print(f"源文本:\n\n{source_text}\n------------\n")
+        output_path = os.path.splitext(full_path)[0] + ".translated.jsonl"
+        count = ta.translate_many(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            records=records,
+            sink=output_path,
+            country=country,
+        )
 
-    translation = ta.translate(
-        source_lang=source_lang,
-        target_lang=target_lang,
-        source_text=source_text,
-        country=country,
-    )
+        print(f"已翻译 {count} 条记录，结果写入 {output_path}")
 
-    print(f"翻译结果:\n\n{translation}")
+    else:
+        with open(full_path, encoding="utf-8") as file:
+            source_text = file.read()
+
+        print(f"源文本:\n\n{source_text}\n------------\n")
+
+        translation = ta.translate(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            source_text=source_text,
+            country=country,
+        )
+
+        print(f"翻译结果:\n\n{translation}")
@@ -1 +1,101 @@
-from .utils import translate
+import importlib
+from typing import TYPE_CHECKING
+
+
+# 公开名称及其所在的子模块。子模块在第一次访问名称时才导入，
+# import translation_agent 不导入 openai、tiktoken 等依赖，也不创建客户端
+_EXPORTS = {
+    "atranslate": "async_utils",
+    "atranslate_stream": "async_utils",
+    "BatchJob": "batchjob",
+    "CompletionDeferred": "batchjob",
+    "batch_mode": "batchjob",
+    "CompletionCache": "cache",
+    "Cassette": "cassette",
+    "CassetteMissError": "cassette",
+    "ClientOptions": "clients",
+    "get_client": "clients",
+    "set_client_options": "clients",
+    "ContextWindow": "context",
+    "iter_translations": "corpus",
+    "translate_many": "corpus",
+    "ReflectionGate": "gating",
+    "TranslationMemory": "memory",
+    "ModelPrice": "metrics",
+    "prometheus_text": "metrics",
+    "set_model_price": "metrics",
+    "translate_packed": "packing",
+    "RateLimiter": "ratelimit",
+    "limiter_for": "ratelimit",
+    "CircuitOpenError": "retry",
+    "RetryPolicy": "retry",
+    "PipelineStats": "stats",
+    "collect_stats": "stats",
+    "global_stats": "stats",
+    "set_global_stats": "stats",
+    "stream_completions": "streaming",
+    "OpenTelemetryTracer": "tracing",
+    "Profiler": "tracing",
+    "Span": "tracing",
+    "Tracer": "tracing",
+    "trace": "tracing",
+    "PIPELINES": "utils",
+    "set_cassette": "utils",
+    "set_completion_cache": "utils",
+    "set_rate_limiter": "utils",
+    "set_reflection_gate": "utils",
+    "set_retry_policy": "utils",
+    "set_translation_memory": "utils",
+    "translate": "utils",
+    "translate_stream": "utils",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+if TYPE_CHECKING:
+    from .async_utils import atranslate, atranslate_stream
+    from .batchjob import BatchJob, CompletionDeferred, batch_mode
+    from .cache import CompletionCache
+    from .cassette import Cassette, CassetteMissError
+    from .clients import ClientOptions, get_client, set_client_options
+    from .context import ContextWindow
+    from .corpus import iter_translations, translate_many
+    from .gating import ReflectionGate
+    from .memory import TranslationMemory
+    from .metrics import ModelPrice, prometheus_text, set_model_price
+    from .packing import translate_packed
+    from .ratelimit import RateLimiter, limiter_for
+    from .retry import CircuitOpenError, RetryPolicy
+    from .stats import (
+        PipelineStats,
+        collect_stats,
+        global_stats,
+        set_global_stats,
+    )
+    from .streaming import stream_completions
+    from .tracing import OpenTelemetryTracer, Profiler, Span, Tracer, trace
+    from .utils import (
+        PIPELINES,
+        set_cassette,
+        set_completion_cache,
+        set_rate_limiter,
+        set_reflection_gate,
+        set_retry_policy,
+        set_translation_memory,
+        translate,
+        translate_stream,
+    )
@@ -0,0 +1,826 @@
+import asyncio
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from . import utils
+from .batchjob import CompletionDeferred
+from .clients import get_async_client
+from .context import ContextWindow, as_context_window
+from .retry import acall_with_retry, breaker_for
+from .scheduler import ChunkTiming
+from .stats import stage_label
+from .tracing import span
+from .utils import (
+    _PIPELINE_STAGES,
+    MAX_CONCURRENCY,
+    MAX_TOKENS_PER_CHUNK,
+    _check_pipeline,
+    _memory_lookup,
+    _memory_write_back,
+    _multichunk_fused_prompt,
+    _multichunk_improve_prompt,
+    _multichunk_initial_prompt,
+    _multichunk_reflect_prompt,
+    _multichunk_steps,
+    _one_chunk_fused_prompt,
+    _one_chunk_improve_prompt,
+    _one_chunk_initial_prompt,
+    _one_chunk_reflect_prompt,
+    _one_chunk_steps,
+    _parse_fused,
+    _skip_fused_chunk,
+    _skip_improve_chunk,
+    _skip_reflect_chunk,
+    _split_for_translation,
+    _Step,
+)
+
+
+if TYPE_CHECKING:
+    import openai
+
+# 异步 OpenAI API 客户端，与 utils.client 使用相同的配置。默认由 default_aclient
+# 为每个事件循环分别创建；直接赋值后所有事件循环都使用赋值的客户端
+aclient: "openai.AsyncOpenAI"
+
+
+def default_aclient() -> "openai.AsyncOpenAI":
+    """
+    utils.default_client 的异步版本，返回 aget_completion 使用的客户端。
+
+    没有给 aclient 赋值时，返回为正在运行的事件循环缓存的客户端（见
+    clients.get_async_client），因此多次 asyncio.run 不会复用已关闭的事件循环
+    上的连接。
+    """
+    assigned = globals().get("aclient")
+    if assigned is not None:
+        return assigned
+    return get_async_client(**utils.default_client_settings())
+
+
+def __getattr__(name: str):
+    # 访问 async_utils.aclient 时返回当前事件循环的客户端
+    if name == "aclient":
+        return default_aclient()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+T = TypeVar("T")
+
+
+async def aget_completion(
+    prompt: str,
+    system_message: str = "你是一个提供帮助的助手。",
+    model: Optional[str] = None,
+    temperature: float = 0.3,
+    json_mode: bool = False,
+) -> Union[str, dict]:
+    """
+    get_completion 的异步版本，使用 AsyncOpenAI 客户端生成补全。
+
+    参数与返回值与 utils.get_completion 相同。缓存、批处理、磁带和用量等步骤由
+    utils._CompletionCall 完成，与同步版本共享 utils 中的设置。
+    """
+
+    call = utils._CompletionCall(
+        prompt, system_message, model, temperature, json_mode
+    )
+    content = call.lookup()
+    if content is not None:
+        return content
+
+    entry = call.replay()
+    if entry is not None:
+        started = time.perf_counter()
+        await asyncio.sleep(call.tape.delay(entry))
+        return call.replayed(entry, time.perf_counter() - started)
+
+    async def request() -> str:
+        limiter, estimated = call.reserve()
+        if limiter is not None:
+            await limiter.aacquire(estimated)
+
+        aclient = default_aclient()
+        started = time.perf_counter()
+        response = await aclient.chat.completions.create(
+            **call.create_kwargs()
+        )
+        if call.stream is not None:
+            content, usage = await call.stream.aconsume(response, started)
+        else:
+            content, usage = call.read(response)
+        call.settle(limiter, estimated, usage)
+        return content
+
+    # 与同步调用共享 utils 中设置的重试策略，失败时只重试这一次调用
+    policy = utils.retry_policy
+    started = time.perf_counter()
+    if policy is None:
+        content = await request()
+    else:
+        content = await acall_with_retry(
+            request, policy, breaker_for(str(default_aclient().base_url))
+        )
+    return call.finish(content, time.perf_counter() - started)
+
+
+async def _arun_steps(
+    steps: Generator[_Step, Any, T],
+    functions: Dict[str, Callable[..., Awaitable[Any]]],
+) -> T:
+    """utils._run_steps 的异步版本，functions 中是协程函数。"""
+    try:
+        stage, args = next(steps)
+        while True:
+            try:
+                result = await functions[stage](*args)
+            except BaseException as e:
+                stage, args = steps.throw(e)
+            else:
+                stage, args = steps.send(result)
+    except StopIteration as e:
+        return e.value
+
+
+async def _amap_chunks(
+    func: Callable[[int], Awaitable[T]],
+    num_chunks: int,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> List[T]:
+    """
+    _map_chunks 的异步版本：对每个块索引等待 func，
+    最多同时进行 max_concurrency 个调用，结果保持块的顺序。
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    deferred: List[CompletionDeferred] = []
+
+    async def run(i: int) -> Optional[T]:
+        async with semaphore:
+            try:
+                return await func(i)
+            except CompletionDeferred as e:
+                deferred.append(e)
+                return None
+
+    results = list(await asyncio.gather(*(run(i) for i in range(num_chunks))))
+    if deferred:
+        raise CompletionDeferred.merge(deferred)
+    return results
+
+
+async def aone_chunk_initial_translation(
+    source_lang: str, target_lang: str, source_text: str, country: str = ""
+) -> str:
+    """one_chunk_initial_translation 的异步版本。"""
+
+    system_message, translation_prompt = _one_chunk_initial_prompt(
+        source_lang, target_lang, source_text, country
+    )
+
+    with stage_label("initial"):
+        return await aget_completion(
+            translation_prompt, system_message=system_message
+        )
+
+
+async def aone_chunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+) -> str:
+    """one_chunk_reflect_on_translation 的异步版本。"""
+
+    system_message, reflection_prompt = _one_chunk_reflect_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+
+    with stage_label("reflect"):
+        return await aget_completion(
+            reflection_prompt, system_message=system_message
+        )
+
+
+async def aone_chunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    reflection: str,
+) -> str:
+    """one_chunk_improve_translation 的异步版本。"""
+
+    system_message, prompt = _one_chunk_improve_prompt(
+        source_lang, target_lang, source_text, translation_1, reflection
+    )
+
+    with stage_label("improve"):
+        return await aget_completion(prompt, system_message)
+
+
+async def aone_chunk_fused_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+) -> str:
+    """one_chunk_fused_translation 的异步版本。"""
+
+    system_message, prompt = _one_chunk_fused_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+
+    with stage_label("fused"):
+        content = await aget_completion(prompt, system_message, json_mode=True)
+
+    return _parse_fused(content, translation_1)
+
+
+async def aone_chunk_translate_text(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str = "",
+    pipeline: str = "full",
+) -> str:
+    """one_chunk_translate_text 的异步版本。"""
+
+    return await _arun_steps(
+        _one_chunk_steps(
+            source_lang, target_lang, source_text, country, pipeline
+        ),
+        {
+            "initial": aone_chunk_initial_translation,
+            "reflect": aone_chunk_reflect_on_translation,
+            "improve": aone_chunk_improve_translation,
+            "fused": aone_chunk_fused_translation,
+        },
+    )
+
+
+async def _ainitial_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """utils._initial_chunk 的异步版本。"""
+    if reused is not None:
+        return reused
+
+    system_message, prompt = _multichunk_initial_prompt(
+        source_lang, target_lang, source_text_chunks, i, context_window
+    )
+
+    with stage_label("initial", i):
+        return await aget_completion(prompt, system_message=system_message)
+
+
+async def _areflect_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str,
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """utils._reflect_chunk 的异步版本。"""
+    skipped = _skip_reflect_chunk(
+        source_text_chunks, translation_1_chunks, i, reused
+    )
+    if skipped is not None:
+        return skipped
+
+    system_message, prompt = _multichunk_reflect_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        translation_1_chunks,
+        country,
+        i,
+        context_window,
+    )
+
+    with stage_label("reflect", i):
+        return await aget_completion(prompt, system_message)
+
+
+async def _aimprove_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """utils._improve_chunk 的异步版本。"""
+    skipped = _skip_improve_chunk(
+        translation_1_chunks, reflection_chunks, i, reused
+    )
+    if skipped is not None:
+        return skipped
+
+    system_message, prompt = _multichunk_improve_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        translation_1_chunks,
+        reflection_chunks,
+        i,
+        context_window,
+    )
+
+    with stage_label("improve", i):
+        return await aget_completion(prompt, system_message)
+
+
+async def _afused_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str,
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """utils._fused_chunk 的异步版本。"""
+    skipped = _skip_fused_chunk(
+        source_text_chunks, translation_1_chunks, i, reused
+    )
+    if skipped is not None:
+        return skipped
+
+    system_message, prompt = _multichunk_fused_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        translation_1_chunks,
+        country,
+        i,
+        context_window,
+    )
+
+    with stage_label("fused", i):
+        content = await aget_completion(prompt, system_message, json_mode=True)
+
+    return _parse_fused(content, translation_1_chunks[i])
+
+
+async def amultichunk_initial_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
+) -> List[str]:
+    """multichunk_initial_translation 的异步版本。"""
+
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks
+        )
+
+    async def translate_chunk(i: int) -> str:
+        return await _ainitial_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    return await _amap_chunks(
+        translate_chunk, len(source_text_chunks), max_concurrency
+    )
+
+
+async def amultichunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
+) -> List[str]:
+    """multichunk_reflect_on_translation 的异步版本。"""
+
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks, country
+        )
+
+    async def reflect_chunk(i: int) -> str:
+        return await _areflect_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    return await _amap_chunks(
+        reflect_chunk, len(source_text_chunks), max_concurrency
+    )
+
+
+async def amultichunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
+) -> List[str]:
+    """multichunk_improve_translation 的异步版本。"""
+
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks
+        )
+
+    async def improve_chunk(i: int) -> str:
+        return await _aimprove_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            reflection_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    return await _amap_chunks(
+        improve_chunk, len(source_text_chunks), max_concurrency
+    )
+
+
+async def amultichunk_fused_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
+) -> List[str]:
+    """multichunk_fused_translation 的异步版本。"""
+
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks, country
+        )
+
+    async def fuse_chunk(i: int) -> str:
+        return await _afused_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    return await _amap_chunks(
+        fuse_chunk, len(source_text_chunks), max_concurrency
+    )
+
+
+def _adataflow_tasks(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str,
+    max_concurrency: int,
+    context_window: Optional[ContextWindow],
+    order: List[int],
+    pipeline: str = "full",
+) -> Tuple[Dict[int, "asyncio.Task[str]"], List[ChunkTiming]]:
+    """
+    为每个块启动一个依次执行 pipeline 各阶段的任务。
+
+    信号量按先来先得的顺序放行，因此 order 决定了同时就绪时各块的先后。
+    必须在事件循环中调用。
+    """
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    timings = [
+        ChunkTiming(i, len(chunk))
+        for i, chunk in enumerate(source_text_chunks)
+    ]
+    translation_1_chunks: List[str] = [""] * len(source_text_chunks)
+    reflection_chunks: List[str] = [""] * len(source_text_chunks)
+    reused_chunks = _memory_lookup(
+        source_lang, target_lang, source_text_chunks, country
+    )
+    started = time.perf_counter()
+
+    async def timed(stage: str, i: int, step: Awaitable[str]) -> str:
+        async with semaphore:
+            start = time.perf_counter() - started
+            result = await step
+            timings[i].stages[stage] = (start, time.perf_counter() - started)
+            return result
+
+    def translate_chunk(i: int) -> Awaitable[str]:
+        return _ainitial_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    def reflect_chunk(i: int) -> Awaitable[str]:
+        return _areflect_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    def improve_chunk(i: int) -> Awaitable[str]:
+        return _aimprove_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            reflection_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    def fuse_chunk(i: int) -> Awaitable[str]:
+        return _afused_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    steps = {
+        "initial": translate_chunk,
+        "reflect": reflect_chunk,
+        "improve": improve_chunk,
+        "fused": fuse_chunk,
+    }
+    intermediate = {
+        "initial": translation_1_chunks,
+        "reflect": reflection_chunks,
+    }
+
+    async def run_chunk(i: int) -> str:
+        for stage in _PIPELINE_STAGES[pipeline]:
+            result = await timed(stage, i, steps[stage](i))
+            if stage in intermediate:
+                intermediate[stage][i] = result
+        # 中间结果只被同一块使用，完成后即可释放
+        for results in intermediate.values():
+            results[i] = ""
+        return result
+
+    tasks = {i: asyncio.ensure_future(run_chunk(i)) for i in order}
+    return tasks, timings
+
+
+async def amultichunk_dataflow_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+) -> Tuple[List[str], List[ChunkTiming]]:
+    """multichunk_dataflow_translation 的异步版本。"""
+
+    # 较长的块先启动
+    order = sorted(
+        range(len(source_text_chunks)),
+        key=lambda i: -len(source_text_chunks[i]),
+    )
+    tasks, timings = _adataflow_tasks(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        country,
+        max_concurrency,
+        context_window,
+        order,
+        pipeline,
+    )
+    # 与同步调度器一致：批处理模式下合并所有块的推迟，其他错误取消其余的块
+    deferred: List[CompletionDeferred] = []
+    pending = set(tasks.values())
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                error = task.exception()
+                if isinstance(error, CompletionDeferred):
+                    deferred.append(error)
+                elif error is not None:
+                    raise error
+    finally:
+        for task in pending:
+            task.cancel()
+    if deferred:
+        raise CompletionDeferred.merge(deferred)
+
+    return [tasks[i].result() for i in range(len(order))], timings
+
+
+async def amultichunk_translation_stream(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+) -> AsyncIterator[str]:
+    """multichunk_translation_stream 的异步版本，提前关闭时取消未完成的块。"""
+
+    _check_pipeline(pipeline)
+    tasks, _ = _adataflow_tasks(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        country,
+        max_concurrency,
+        context_window,
+        list(range(len(source_text_chunks))),
+        pipeline,
+    )
+    try:
+        for i in range(len(source_text_chunks)):
+            translation_2 = await tasks.pop(i)
+            if pipeline != "draft":
+                _memory_write_back(
+                    source_lang,
+                    target_lang,
+                    source_text_chunks[i : i + 1],
+                    [translation_2],
+                    country,
+                )
+            yield translation_2
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+
+async def amultichunk_translation(
+    source_lang,
+    target_lang,
+    source_text_chunks,
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    schedule: str = "stage",
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+):
+    """multichunk_translation 的异步版本。"""
+
+    return await _arun_steps(
+        _multichunk_steps(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            schedule,
+            context_window,
+            pipeline,
+        ),
+        {
+            "dataflow": amultichunk_dataflow_translation,
+            "initial": amultichunk_initial_translation,
+            "reflect": amultichunk_reflect_on_translation,
+            "improve": amultichunk_improve_translation,
+            "fused": amultichunk_fused_translation,
+        },
+    )
+
+
+async def atranslate(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    schedule="stage",
+    context_window=None,
+    pipeline="full",
+):
+    """translate 的异步版本，可在同一个事件循环中并发运行多个翻译。"""
+
+    with span(
+        "translate",
+        source_lang=source_lang,
+        target_lang=target_lang,
+        pipeline=pipeline,
+        schedule=schedule,
+    ):
+        _check_pipeline(pipeline)
+
+        source_text_chunks = _split_for_translation(source_text, max_tokens)
+
+        if source_text_chunks is None:
+            return await aone_chunk_translate_text(
+                source_lang, target_lang, source_text, country, pipeline
+            )
+
+        else:
+            translation_2_chunks = await amultichunk_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                country,
+                max_concurrency,
+                schedule,
+                as_context_window(context_window),
+                pipeline,
+            )
+
+            return "".join(translation_2_chunks)
+
+
+async def atranslate_stream(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    context_window=None,
+    pipeline="full",
+) -> AsyncIterator[str]:
+    """translate_stream 的异步版本，按顺序异步产出每个块的最终翻译。"""
+
+    _check_pipeline(pipeline)
+
+    source_text_chunks = _split_for_translation(source_text, max_tokens)
+
+    if source_text_chunks is None:
+        yield await aone_chunk_translate_text(
+            source_lang, target_lang, source_text, country, pipeline
+        )
+
+    else:
+        async for translation_2 in amultichunk_translation_stream(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            as_context_window(context_window),
+            pipeline,
+        ):
+            yield translation_2
@@ -0,0 +1,259 @@
+import glob
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .cache import CompletionCache
+
+
+# OpenAI Batch API 的请求地址
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+# 这不是错误，而是让调用方推迟到批次有结果后再运行的控制流信号，
+# 因此不使用 Error 后缀
+class CompletionDeferred(Exception):  # noqa: N818
+    """
+    批处理模式下补全尚无结果，请求已写入待提交的批次。
+
+    多块翻译和 translate_many 会先收集同一阶段所有被推迟的请求，再抛出一个
+    合并后的 CompletionDeferred，因此每一轮生成的批次包含该阶段的全部请求。
+
+    属性:
+        count (int): 被推迟的补全数。
+    """
+
+    def __init__(self, count: int = 1):
+        super().__init__(f"{count} 个补全等待批处理结果")
+        self.count = count
+
+    @classmethod
+    def merge(
+        cls, errors: Iterable["CompletionDeferred"]
+    ) -> "CompletionDeferred":
+        """把多个 CompletionDeferred 合并为一个。"""
+        return cls(sum(error.count for error in errors))
+
+
+class BatchJob:
+    """
+    以 OpenAI Batch API 的 JSONL 格式离线执行补全。
+
+    在 batch_mode(job) 的作用范围内，get_completion 不直接调用 API：已有结果的请求
+    直接返回结果，否则把请求加入待提交批次并抛出 CompletionDeferred。每一轮运行后
+    调用 write_requests 写出请求文件，把它提交给 Batch API，将输出文件保存为同名的
+    .results.jsonl（或调用 ingest）后重新运行同样的翻译，即可继续下一个阶段。
+
+    custom_id 是请求参数的哈希（与 CompletionCache.key 相同），所以重新运行时
+    同一个请求总是对应同一个结果。
+
+    参数:
+        directory (str): 存放请求文件和结果文件的目录。创建时自动读取其中所有
+            *.results.jsonl 文件。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._results: Dict[str, str] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+        for path in sorted(
+            glob.glob(os.path.join(self.directory, "*.results.jsonl"))
+        ):
+            self.ingest(path)
+
+    @staticmethod
+    def request_body(
+        model: str,
+        system_message: str,
+        prompt: str,
+        temperature: float,
+        json_mode: bool,
+    ) -> Dict[str, Any]:
+        """构建与 get_completion 相同参数的 chat.completions 请求体。"""
+        body: Dict[str, Any] = {
+            "model": model,
+            "temperature": temperature,
+            "top_p": 1,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+        }
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+        return body
+
+    def complete(
+        self,
+        model: str,
+        system_message: str,
+        prompt: str,
+        temperature: float,
+        json_mode: bool,
+    ) -> str:
+        """
+        返回请求的批处理结果，没有结果时记录请求并抛出 CompletionDeferred。
+
+        返回:
+            str: 补全文本。
+        """
+        custom_id = CompletionCache.key(
+            model, system_message, prompt, temperature, json_mode
+        )
+        with self._lock:
+            content = self._results.get(custom_id)
+            if content is not None:
+                return content
+            self._pending[custom_id] = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": self.request_body(
+                    model, system_message, prompt, temperature, json_mode
+                ),
+            }
+        raise CompletionDeferred()
+
+    @property
+    def pending(self) -> int:
+        """尚未写出的请求数。"""
+        return len(self._pending)
+
+    def write_requests(self) -> Optional[str]:
+        """
+        把待提交的请求写入新的批次文件。
+
+        返回:
+            Optional[str]: 请求文件路径，形如 batch-001.requests.jsonl；
+                没有待提交请求时返回 None。
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            number = (
+                len(
+                    glob.glob(
+                        os.path.join(self.directory, "batch-*.requests.jsonl")
+                    )
+                )
+                + 1
+            )
+            path = os.path.join(
+                self.directory, f"batch-{number:03d}.requests.jsonl"
+            )
+            with open(path, "w", encoding="utf-8") as file:
+                for request in self._pending.values():
+                    file.write(json.dumps(request, ensure_ascii=False) + "\n")
+            self._pending.clear()
+        return path
+
+    def ingest(self, path: str) -> int:
+        """
+        读取 Batch API 的输出文件。
+
+        失败的请求会被忽略，下一轮运行时重新加入批次。
+
+        参数:
+            path (str): 输出 JSONL 文件路径。
+
+        返回:
+            int: 读取到的成功结果数。
+        """
+        count = 0
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"]
+                if content is None:
+                    continue
+                with self._lock:
+                    self._results[record["custom_id"]] = content
+                count += 1
+        return count
+
+    def results_path(self, requests_path: str) -> str:
+        """返回请求文件对应的结果文件路径，创建 BatchJob 时会自动读取该文件。"""
+        return requests_path.replace(".requests.jsonl", ".results.jsonl")
+
+    def submit(self, client, requests_path: str) -> str:
+        """
+        上传请求文件并创建 Batch API 任务。
+
+        参数:
+            client (openai.OpenAI): 使用的客户端。
+            requests_path (str): write_requests 返回的文件路径。
+
+        返回:
+            str: 批处理任务 ID。
+        """
+        with open(requests_path, "rb") as file:
+            uploaded = client.files.create(file=file, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def fetch(self, client, batch_id: str, requests_path: str) -> bool:
+        """
+        下载已完成任务的输出并读取。
+
+        参数:
+            client (openai.OpenAI): 使用的客户端。
+            batch_id (str): submit 返回的任务 ID。
+            requests_path (str): 该任务对应的请求文件路径。
+
+        返回:
+            bool: 任务已完成并读取了结果时为 True，仍在进行中时为 False。
+        """
+        batch = client.batches.retrieve(batch_id)
+        if batch.status != "completed" or not batch.output_file_id:
+            return False
+        path = self.results_path(requests_path)
+        content = client.files.content(batch.output_file_id)
+        with open(path, "wb") as file:
+            file.write(content.read())
+        self.ingest(path)
+        return True
+
+
+_current_job: ContextVar[Optional[BatchJob]] = ContextVar(
+    "translation_agent_batch_job", default=None
+)
+
+
+def current_batch_job() -> Optional[BatchJob]:
+    """返回当前上下文中的批处理任务，不在 batch_mode 范围内时返回 None。"""
+    return _current_job.get()
+
+
+@contextmanager
+def batch_mode(job: BatchJob) -> Iterator[BatchJob]:
+    """
+    在作用范围内通过 job 以批处理方式生成补全。
+
+    示例:
+        >>> job = BatchJob("jobs/manual")
+        >>> with batch_mode(job):
+        ...     try:
+        ...         translation = translate("English", "Spanish", text, "Mexico")
+        ...     except CompletionDeferred:
+        ...         path = job.write_requests()  # 提交后把输出保存为同名 .results.jsonl
+    """
+    token = _current_job.set(job)
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class CacheStats:
+    """
+    补全缓存的命中统计。
+
+    属性:
+        memory_hits (int): 内存 LRU 命中的次数。
+        disk_hits (int): SQLite 命中的次数。
+        misses (int): 未命中的次数。
+        evictions (int): 因容量或过期被删除的条目数。
+    """
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        """命中次数占总查询次数的比例，没有查询时为 0。"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CompletionCache:
+    """
+    按内容寻址的补全缓存，SQLite 持久化，前面有一层内存 LRU。
+
+    键是模型、系统消息、提示、温度和 json_mode 的 SHA-256 哈希，
+    因此相同的请求在不同进程和多次运行之间都可以复用。
+
+    参数:
+        path (str, 可选): SQLite 数据库文件路径。默认为 ":memory:"，即不持久化。
+        max_entries (int, 可选): 磁盘上保留的最大条目数，超出时删除最久未使用的条目。
+            默认为 100000。
+        ttl (float, 可选): 条目的存活时间（秒）。默认为 None，即永不过期。
+        memory_entries (int, 可选): 内存 LRU 的容量。默认为 1024，0 表示不使用。
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_entries: int = 100_000,
+        ttl: Optional[float] = None,
+        memory_entries: int = 1024,
+    ):
+        if path != ":memory:":
+            path = os.path.expanduser(path)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_accessed "
+            "ON completions (accessed)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_created "
+            "ON completions (created)"
+        )
+        self._conn.commit()
+        (self._count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM completions"
+        ).fetchone()
+
+    @staticmethod
+    def key(
+        model: str,
+        system_message: str,
+        prompt: str,
+        temperature: float,
+        json_mode: bool,
+    ) -> str:
+        """返回请求参数的 SHA-256 十六进制摘要。"""
+        payload = json.dumps(
+            [model, system_message, prompt, temperature, json_mode],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存。
+
+        参数:
+            key (str): 由 CompletionCache.key 生成的键。
+
+        返回:
+            Optional[str]: 缓存的补全，未命中或已过期时返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            value, created = row
+            if self._expired(created, now):
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key = ?", (key,)
+                )
+                self._conn.commit()
+                self._count -= 1
+                self.stats.evictions += 1
+                self.stats.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE completions SET accessed = ? WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self._remember(key, value, created)
+            self.stats.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """写入一个补全，并在超出容量时淘汰最久未使用的条目。"""
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if exists is None:
+                self._count += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions "
+                "(key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._remember(key, value, now)
+            self._evict(now)
+            self._conn.commit()
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM completions WHERE created < ?", (now - self.ttl,)
+            )
+            expired = max(cursor.rowcount, 0)
+            self._count -= expired
+            self.stats.evictions += expired
+
+        excess = self._count - self.max_entries
+        if excess > 0:
+            evicted = [
+                key
+                for (key,) in self._conn.execute(
+                    "SELECT key FROM completions ORDER BY accessed LIMIT ?",
+                    (excess,),
+                )
+            ]
+            self._conn.executemany(
+                "DELETE FROM completions WHERE key = ?",
+                [(key,) for key in evicted],
+            )
+            for key in evicted:
+                self._memory.pop(key, None)
+            self._count -= len(evicted)
+            self.stats.evictions += len(evicted)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        """删除所有缓存条目。"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+            self._count = 0
+
+    def close(self) -> None:
+        """关闭 SQLite 连接。"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from .cache import CompletionCache
+
+
+class CassetteMissError(KeyError):
+    """回放模式下磁带中没有该请求的记录。"""
+
+
+@dataclass(frozen=True)
+class CassetteEntry:
+    """
+    磁带中的一条记录。
+
+    属性:
+        key (str): 请求指纹，与 CompletionCache.key 相同。
+        content (str): 补全内容。
+        seconds (float): 录制时 API 请求的耗时（秒），包括重试。
+    """
+
+    key: str
+    content: str
+    seconds: float
+
+
+class Cassette:
+    """
+    录制和回放补全，用于离线、可重复地运行整个翻译流程。
+
+    录制模式下，每次实际发出的 API 请求都把请求指纹、补全内容和耗时追加到
+    gzip 压缩的 JSON Lines 文件中；回放模式下从文件中按指纹取出补全，并按
+    原来的耗时乘以 latency_scale 等待后返回，不访问网络。同一个请求出现
+    多次时按录制顺序依次回放，用完后重复最后一条。
+
+    指纹与 CompletionCache.key 相同，包括模型、系统消息、提示、温度和
+    json_mode；回放时这些参数需要与录制时一致。
+
+    参数:
+        path (str): 磁带文件路径，通常以 .jsonl.gz 结尾。
+        mode (str, 可选): "record" 或 "replay"。默认为 "replay"。
+        latency_scale (float, 可选): 回放时耗时的缩放比例，0 表示不等待。
+            默认为 1.0，即按原来的耗时等待。
+        passthrough (bool, 可选): 回放时找不到记录的请求是否实际发出。
+            默认为 False，即抛出 CassetteMissError。
+
+    异常:
+        ValueError: mode 不是 "record" 或 "replay"。
+        FileNotFoundError: 回放模式下磁带文件不存在。
+
+    示例:
+        >>> with Cassette("runs/baseline.jsonl.gz", mode="record") as tape:
+        ...     set_cassette(tape)
+        ...     translate("English", "Spanish", text, "Mexico")
+        >>> set_cassette(Cassette("runs/baseline.jsonl.gz", latency_scale=0.1))
+    """
+
+    MODES = ("record", "replay")
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        latency_scale: float = 1.0,
+        passthrough: bool = False,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的磁带模式：{mode}，可选值为 {self.MODES}")
+
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.passthrough = passthrough
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[CassetteEntry]] = defaultdict(deque)
+        self._file = None
+
+        if mode == "replay":
+            self._load()
+        else:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 追加写入新的 gzip 成员，已有的记录保持不变
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+
+    key = staticmethod(CompletionCache.key)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                entry = CassetteEntry(
+                    item["key"], item["content"], item["seconds"]
+                )
+                self._entries[entry.key].append(entry)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def lookup(self, key: str) -> Optional[CassetteEntry]:
+        """
+        取出指纹为 key 的下一条记录。
+
+        返回:
+            Optional[CassetteEntry]: 记录；没有记录且允许 passthrough 时返回 None。
+
+        异常:
+            CassetteMissError: 没有记录且不允许 passthrough。
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries:
+                # 保留最后一条，之后相同的请求重复回放它
+                return entries.popleft() if len(entries) > 1 else entries[0]
+        if self.passthrough:
+            return None
+        raise CassetteMissError(key)
+
+    def delay(self, entry: CassetteEntry) -> float:
+        """回放 entry 前需要等待的秒数。"""
+        return entry.seconds * self.latency_scale
+
+    def record(self, key: str, content: str, seconds: float) -> None:
+        """追加一条记录。"""
+        line = json.dumps(
+            {"key": key, "content": content, "seconds": round(seconds, 4)},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._entries[key].append(CassetteEntry(key, content, seconds))
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def close(self) -> None:
+        """结束录制并写完文件。"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,126 @@
+import math
+import re
+from typing import List, Tuple
+
+from .tokens import TokenizedText
+
+
+# 句子边界：中日文句末标点（不要求后跟空白）、拉丁文句末标点（必须后跟空白，
+# 避免切开 "3.14" 这类数字）以及换行。闭合引号和括号以及后面的空白归入前一句。
+_SENTENCE_BOUNDARY = re.compile(
+    r"[。！？；…]+[」』”’）》】\]\)\"']*\s*" r"|[.!?;]+[\"'”’)\]]*\s+" r"|\n+"
+)
+
+# 句子过长时退而在分句标点或空白处切分
+_CLAUSE_BOUNDARY = re.compile(r"[，、,：:]\s*|\s+")
+
+
+def _boundaries(
+    pattern: re.Pattern, text: str, start: int, end: int
+) -> List[int]:
+    """返回 [start, end) 内由 pattern 给出的切分位置，末尾总是 end。"""
+    positions = [
+        match.end()
+        for match in pattern.finditer(text, start, end)
+        if start < match.end() < end
+    ]
+    positions.append(end)
+    return positions
+
+
+def _segments(
+    tokenized: TokenizedText, max_tokens: int
+) -> List[Tuple[int, int, int]]:
+    """
+    把文本切成句子片段并计算每个片段的令牌数。
+
+    句子边界按顺序给出，因此令牌偏移量只需从头到尾走一遍。超过 max_tokens
+    的句子再按分句标点切分，仍然过长的部分在令牌边界上硬切。
+
+    返回:
+        List[Tuple[int, int, int]]: 每个片段的 (起始字符, 结束字符, 令牌数)。
+    """
+    text, offsets = tokenized.text, tokenized.offsets
+    segments = []
+    start = 0
+    token = 0
+    for end in _boundaries(_SENTENCE_BOUNDARY, text, 0, len(text)):
+        first = token
+        while token < len(offsets) and offsets[token] < end:
+            token += 1
+        weight = token - first
+
+        if weight <= max_tokens:
+            segments.append((start, end, weight))
+        else:
+            clause_start = start
+            for clause_end in _boundaries(_CLAUSE_BOUNDARY, text, start, end):
+                clause_weight = tokenized.count(clause_start, clause_end)
+                if clause_weight <= max_tokens:
+                    segments.append((clause_start, clause_end, clause_weight))
+                else:
+                    for a, b in tokenized.cut(
+                        clause_start, clause_end, max_tokens
+                    ):
+                        segments.append((a, b, tokenized.count(a, b)))
+                clause_start = clause_end
+        start = end
+    return segments
+
+
+def chunk_spans(
+    tokenized: TokenizedText, max_tokens: int
+) -> List[Tuple[int, int]]:
+    """
+    在句子边界上把文本切成令牌数相近、且都不超过 max_tokens 的块。
+
+    块数取满足上限所需的最少块数，每个块的理想大小是剩余令牌数除以剩余块数。
+    按顺序遍历句子片段，在越过理想大小时选择离它更近的那个句子边界切分，
+    因此各块大小接近，多块翻译中最慢的块不会明显拖长整体耗时。
+
+    参数:
+        tokenized (TokenizedText): 已编码的文本。
+        max_tokens (int): 每个块允许的最大令牌数。
+
+    返回:
+        List[Tuple[int, int]]: 每块的字符区间 [start, end)，首尾相接覆盖整个文本。
+    """
+    if not tokenized.text:
+        return []
+
+    segments = _segments(tokenized, max_tokens)
+    total = sum(weight for _, _, weight in segments)
+    num_chunks = max(1, math.ceil(total / max_tokens))
+
+    spans: List[Tuple[int, int]] = []
+    chunk_start, chunk_tokens, done = 0, 0, 0
+    for start, _end, weight in segments:
+        if chunk_tokens:
+            remaining = total - done
+            chunks_left = max(
+                num_chunks - len(spans), math.ceil(remaining / max_tokens)
+            )
+            ideal = remaining / chunks_left
+            over = chunk_tokens + weight - ideal
+            if chunk_tokens + weight > max_tokens or (
+                chunks_left > 1 and over > 0 and ideal - chunk_tokens < over
+            ):
+                spans.append((chunk_start, start))
+                done += chunk_tokens
+                chunk_start, chunk_tokens = start, 0
+        chunk_tokens += weight
+    spans.append((chunk_start, len(tokenized.text)))
+    return spans
+
+
+def chunk_text(tokenized: TokenizedText, max_tokens: int) -> List[str]:
+    """返回 chunk_spans 切分出的文本块，按顺序拼接后与原文完全一致。"""
+    return [
+        tokenized.text[start:end]
+        for start, end in chunk_spans(tokenized, max_tokens)
+    ]
+
+
+def sentence_boundaries(text: str) -> List[int]:
+    """返回 text 中所有句子边界的位置（不含开头，含末尾）。"""
+    return _boundaries(_SENTENCE_BOUNDARY, text, 0, len(text))
@@ -0,0 +1,427 @@
+"""
+并行翻译文件、目录或 glob 模式匹配的文件，重新运行时跳过已完成的文件。
+
+用法:
+    translation-agent -s English -t Spanish docs/ "notes/*.md" -o out/ [-j 4]
+
+输入可以是文件、目录（递归查找 --ext 指定扩展名的文件）或 glob 模式，译文按相对
+路径写入输出目录。多个文件由线程池并行翻译，每完成一个文件输出进度和按实测吞吐量
+估算的剩余时间。译文先写入临时文件再原子地替换，中断不会留下不完整的译文；输出目录
+中的清单记录每个译文对应的源文本和翻译设置，重新运行时跳过已经完成且仍然有效的文件。
+"""
+
+import argparse
+import contextvars
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, TextIO
+
+from . import utils
+
+
+# 输出目录中记录已完成译文的清单文件
+MANIFEST_NAME = ".translation-agent.json"
+
+# 目录输入默认查找的扩展名
+DEFAULT_EXTENSIONS = (".txt", ".md")
+
+
+@dataclass(frozen=True)
+class Job:
+    """
+    一个待翻译的文件。
+
+    属性:
+        source (str): 源文件路径。
+        relative (str): 译文相对于输出目录的路径，也是清单中的键。
+    """
+
+    source: str
+    relative: str
+
+
+def _glob_base(pattern: str) -> str:
+    """返回 glob 模式中第一个通配部分之前的目录。"""
+    parts = []
+    for part in pattern.replace(os.sep, "/").split("/"):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    else:
+        # 没有通配符，pattern 本身就是文件
+        parts = parts[:-1]
+    return "/".join(parts) or "."
+
+
+def _inside(path: str, directory: str) -> bool:
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def collect_jobs(
+    inputs: Sequence[str],
+    output_dir: str,
+    extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+) -> List[Job]:
+    """
+    展开输入的文件、目录和 glob 模式，返回按源路径排序的任务。
+
+    目录中的文件保留相对于该目录的路径，glob 匹配的文件保留相对于模式中第一个
+    通配部分之前的目录的路径，单独给出的文件只保留文件名。输出目录中的文件不会
+    被当作输入。
+
+    参数:
+        inputs (Sequence[str]): 文件、目录或 glob 模式。
+        output_dir (str): 输出目录。
+        extensions (Sequence[str], 可选): 目录输入查找的扩展名。
+
+    返回:
+        List[Job]: 待翻译的文件。
+
+    异常:
+        FileNotFoundError: 输入不存在或 glob 模式没有匹配的文件。
+        ValueError: 不同的源文件对应同一个输出路径。
+    """
+    found: Dict[str, str] = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = [
+                (os.path.join(root, name), item)
+                for root, _, names in os.walk(item)
+                for name in names
+                if name.endswith(tuple(extensions))
+            ]
+        elif os.path.isfile(item):
+            matches = [(item, os.path.dirname(item) or ".")]
+        else:
+            base = _glob_base(item)
+            matches = [
+                (path, base)
+                for path in glob.glob(item, recursive=True)
+                if os.path.isfile(path)
+            ]
+            if not matches:
+                raise FileNotFoundError(f"没有匹配的输入文件：{item}")
+
+        for path, base in matches:
+            if _inside(path, output_dir):
+                continue
+            relative = os.path.relpath(path, base)
+            found.setdefault(os.path.normpath(path), relative)
+
+    jobs = []
+    sources: Dict[str, str] = {}
+    for source, relative in sorted(found.items()):
+        if relative in sources:
+            raise ValueError(
+                f"{sources[relative]} 和 {source} 的译文都会写入 {relative}"
+            )
+        sources[relative] = source
+        jobs.append(Job(source, relative))
+    return jobs
+
+
+def write_atomic(path: str, text: str) -> None:
+    """先写入同一目录中的临时文件，再原子地替换 path。"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+class Manifest:
+    """
+    输出目录中译文的清单，记录每个已完成译文对应的源文本和设置的摘要；
+    失败的文件记录为 {"error": 错误信息}，重新运行时会再次翻译。
+
+    参数:
+        output_dir (str): 输出目录。
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.entries: Dict[str, object] = json.load(file)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def is_complete(self, output_dir: str, job: Job, digest: str) -> bool:
+        """译文存在且对应的源文本和设置都没有变化时返回 True。"""
+        return self.entries.get(job.relative) == digest and os.path.isfile(
+            os.path.join(output_dir, job.relative)
+        )
+
+    def mark_complete(self, job: Job, digest: str) -> None:
+        """记录 job 已完成并立即写回清单。"""
+        self.entries[job.relative] = digest
+        self._save()
+
+    def mark_failed(self, job: Job, error: str) -> None:
+        """记录 job 失败的原因并立即写回清单。"""
+        self.entries[job.relative] = {"error": error}
+        self._save()
+
+    def _save(self) -> None:
+        write_atomic(
+            self.path, json.dumps(self.entries, ensure_ascii=False, indent=1)
+        )
+
+
+def digest(source_text: str, settings: Dict[str, object]) -> str:
+    """源文本和翻译设置的 SHA-256 摘要，任一项变化都需要重新翻译。"""
+    payload = json.dumps([source_text, settings], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def format_duration(seconds: float) -> str:
+    """把秒数格式化为 m:ss 或 h:mm:ss。"""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class Progress:
+    """
+    按实测吞吐量（已完成的源文本字符数/秒）估算剩余时间。失败的文件不计入
+    吞吐量，它的字符也不再计入剩余的工作量。
+
+    参数:
+        total_files (int): 需要翻译的文件数。
+        total_chars (int): 需要翻译的源文本字符总数。
+        stream (TextIO, 可选): 进度输出的位置，None 表示不输出。
+    """
+
+    def __init__(
+        self,
+        total_files: int,
+        total_chars: int,
+        stream: Optional[TextIO] = sys.stderr,
+    ):
+        self.total_files = total_files
+        self.total_chars = total_chars
+        self.stream = stream
+        self.files = 0
+        self.chars = 0
+        self.started = time.perf_counter()
+
+    def eta(self) -> Optional[float]:
+        """剩余秒数，还没有完成任何文件时返回 None。"""
+        elapsed = time.perf_counter() - self.started
+        if self.chars == 0 or elapsed <= 0:
+            return None
+        return (self.total_chars - self.chars) / (self.chars / elapsed)
+
+    def update(self, job: Job, chars: int, error: Optional[str] = None):
+        """记录一个文件完成（或失败）并输出一行进度。"""
+        self.files += 1
+        if error is None:
+            self.chars += chars
+        else:
+            self.total_chars -= chars
+        if self.stream is None:
+            return
+        status = f"失败：{error}" if error is not None else "完成"
+        eta = self.eta()
+        remaining = "" if eta is None else f"，剩余约 {format_duration(eta)}"
+        percent = (
+            100 * self.chars / self.total_chars if self.total_chars else 100
+        )
+        print(
+            f"[{self.files}/{self.total_files}] {percent:.0f}% "
+            f"{job.relative} {status}{remaining}",
+            file=self.stream,
+            flush=True,
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="translation-agent",
+        description=__doc__.strip().splitlines()[0],
+    )
+    parser.add_argument("inputs", nargs="+", help="文件、目录或 glob 模式")
+    parser.add_argument("-s", "--source-lang", required=True, help="源语言")
+    parser.add_argument("-t", "--target-lang", required=True, help="目标语言")
+    parser.add_argument(
+        "-c", "--country", default="", help="目标语言的国家或地区"
+    )
+    parser.add_argument("-o", "--output-dir", required=True, help="输出目录")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=4, help="同时翻译的文件数"
+    )
+    parser.add_argument(
+        "--chunk-concurrency",
+        type=int,
+        default=1,
+        help="每个文件内同时翻译的块数",
+    )
+    parser.add_argument(
+        "--pipeline", choices=utils.PIPELINES, default="full", help="翻译流程"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=utils.MAX_TOKENS_PER_CHUNK,
+        help="每个块的最大令牌数",
+    )
+    parser.add_argument(
+        "--ext",
+        default=",".join(DEFAULT_EXTENSIONS),
+        help="目录输入查找的扩展名，以逗号分隔",
+    )
+    parser.add_argument(
+        "--cache",
+        help="补全缓存的 SQLite 路径，中断后重新运行时复用已完成的块",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="忽略清单，重新翻译所有文件"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="不输出进度"
+    )
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    命令行入口。
+
+    参数:
+        argv (Sequence[str], 可选): 命令行参数，默认为 sys.argv[1:]。
+
+    返回:
+        int: 退出码，所有文件都成功时为 0，有文件失败时为 1。
+    """
+    args = build_parser().parse_args(argv)
+    stream = None if args.quiet else sys.stderr
+
+    try:
+        jobs = collect_jobs(
+            args.inputs,
+            args.output_dir,
+            [ext.strip() for ext in args.ext.split(",") if ext.strip()],
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"translation-agent: {e}", file=sys.stderr)
+        return 2
+
+    if args.cache:
+        from .cache import CompletionCache
+
+        utils.set_completion_cache(CompletionCache(args.cache))
+
+    settings = {
+        "source_lang": args.source_lang,
+        "target_lang": args.target_lang,
+        "country": args.country,
+        "pipeline": args.pipeline,
+        "max_tokens": args.max_tokens,
+        "model": utils.default_model(),
+    }
+    manifest = Manifest(args.output_dir)
+    todo = []
+    unreadable = []
+    for job in jobs:
+        try:
+            with open(job.source, encoding="utf-8") as file:
+                text = file.read()
+        except (OSError, UnicodeDecodeError) as e:
+            # 无法读取的文件只记为失败，不影响其他文件
+            unreadable.append((job, f"{type(e).__name__}: {e}"))
+            continue
+        key = digest(text, settings)
+        if args.force or not manifest.is_complete(args.output_dir, job, key):
+            todo.append((job, text, key))
+
+    total = len(todo) + len(unreadable)
+    if stream is not None:
+        print(
+            f"共 {len(jobs)} 个文件，跳过已完成的 {len(jobs) - total} 个，"
+            f"翻译 {total} 个",
+            file=stream,
+        )
+    progress = Progress(total, sum(len(text) for _, text, _ in todo), stream)
+
+    failed = 0
+    for job, error in unreadable:
+        failed += 1
+        manifest.mark_failed(job, error)
+        progress.update(job, 0, error)
+
+    def translate_file(text: str) -> str:
+        return utils.translate(
+            args.source_lang,
+            args.target_lang,
+            text,
+            args.country,
+            max_tokens=args.max_tokens,
+            max_concurrency=args.chunk_concurrency,
+            pipeline=args.pipeline,
+        )
+
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        running = {
+            executor.submit(context.copy().run, translate_file, text): (
+                job,
+                text,
+                key,
+            )
+            for job, text, key in todo
+        }
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, text, key = running.pop(future)
+                    try:
+                        translation = future.result()
+                        write_atomic(
+                            os.path.join(args.output_dir, job.relative),
+                            translation,
+                        )
+                        manifest.mark_complete(job, key)
+                    except Exception as e:
+                        failed += 1
+                        error = f"{type(e).__name__}: {e}"
+                        manifest.mark_failed(job, error)
+                        progress.update(job, len(text), error)
+                    else:
+                        progress.update(job, len(text))
+        finally:
+            # 中断时不再启动排队中的文件，已完成的文件保留在清单中
+            for future in running:
+                future.cancel()
+
+    if stream is not None:
+        elapsed = time.perf_counter() - progress.started
+        print(
+            f"完成 {total - failed} 个，失败 {failed} 个，"
+            f"用时 {format_duration(elapsed)}",
+            file=stream,
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import importlib.util
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+
+# openai 和 httpx 的导入耗时较长，在第一次创建客户端时才导入
+if TYPE_CHECKING:
+    import asyncio
+
+    import httpx
+    import openai
+
+
+@dataclass(frozen=True)
+class ClientOptions:
+    """
+    OpenAI 客户端底层 HTTP 连接池的参数。
+
+    属性:
+        max_connections (int): 连接池的最大连接数，应不小于同时进行的请求数。
+        max_keepalive_connections (int): 保持空闲以便复用的最大连接数。
+        keepalive_expiry (float): 空闲连接保留的秒数。
+        timeout (float): 读取和写入超时（秒）。长补全需要足够大的值。
+        connect_timeout (float): 建立连接（包括 TLS 握手）的超时（秒）。
+        http2 (bool): 是否使用 HTTP/2，需要安装 httpx[http2]。
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 600.0
+    connect_timeout: float = 10.0
+    http2: bool = False
+
+    def limits(self) -> "httpx.Limits":
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> "httpx.Timeout":
+        import httpx
+
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+# 新建客户端使用的默认参数，通过 set_client_options 修改
+client_options = ClientOptions()
+
+_ClientKey = Tuple[
+    str,
+    str,
+    Optional[str],
+    Optional[str],
+    ClientOptions,
+    Optional["asyncio.AbstractEventLoop"],
+]
+
+_clients: Dict[_ClientKey, object] = {}
+_clients_lock = threading.Lock()
+
+
+def set_client_options(options: ClientOptions) -> None:
+    """
+    设置之后新建客户端使用的连接池参数。
+
+    已经创建的客户端不受影响；参数不同的客户端分别缓存。
+
+    参数:
+        options (ClientOptions): 连接池参数。
+    """
+    global client_options
+    client_options = options
+
+
+def _check_http2(options: ClientOptions) -> None:
+    if options.http2 and importlib.util.find_spec("h2") is None:
+        raise ImportError("使用 HTTP/2 需要安装 httpx[http2]")
+
+
+def _running_loop() -> Optional["asyncio.AbstractEventLoop"]:
+    import asyncio
+
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _get(
+    kind: str,
+    endpoint: str,
+    base_url: Optional[str],
+    api_key: Optional[str],
+    options: Optional[ClientOptions],
+):
+    options = options or client_options
+    # httpx 的异步连接池绑定在创建它的事件循环上，异步客户端按事件循环分别缓存
+    loop = _running_loop() if kind == "async" else None
+    key = (kind, endpoint, base_url, api_key, options, loop)
+    with _clients_lock:
+        if loop is not None:
+            # 已关闭的事件循环上的连接不能再使用，丢弃它们的客户端
+            for closed in [
+                cached
+                for cached in _clients
+                if cached[5] is not None and cached[5].is_closed()
+            ]:
+                del _clients[closed]
+
+        client = _clients.get(key)
+        if client is not None:
+            return client
+
+        _check_http2(options)
+        import openai
+
+        if kind == "async":
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=options.limits(),
+                timeout=options.timeouts(),
+                http2=options.http2,
+            )
+            factory = openai.AsyncOpenAI
+        else:
+            http_client = openai.DefaultHttpxClient(
+                limits=options.limits(),
+                timeout=options.timeouts(),
+                http2=options.http2,
+            )
+            factory = openai.OpenAI
+        # 重试由 retry.RetryPolicy 统一处理，关闭客户端自带的重试以免重复
+        client = _clients[key] = factory(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            timeout=options.timeouts(),
+            max_retries=0,
+        )
+        return client
+
+
+def get_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    endpoint: str = "",
+    options: Optional[ClientOptions] = None,
+) -> "openai.OpenAI":
+    """
+    返回按端点、base_url 和 API 密钥缓存的 OpenAI 客户端。
+
+    相同参数总是得到同一个客户端，因此重复加载模型或切换端点不会丢弃已经建立的
+    keep-alive 连接和 TLS 会话，各个线程共享同一个连接池。
+
+    参数:
+        api_key (str, 可选): API 密钥。
+        base_url (str, 可选): OpenAI 兼容接口的地址，None 表示 OpenAI 官方接口。
+        endpoint (str, 可选): 端点名称，仅用于区分缓存。
+        options (ClientOptions, 可选): 连接池参数，默认为 set_client_options 设置的值。
+
+    返回:
+        openai.OpenAI: 共享的客户端。
+    """
+    return _get("sync", endpoint, base_url, api_key, options)
+
+
+def get_async_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    endpoint: str = "",
+    options: Optional[ClientOptions] = None,
+) -> "openai.AsyncOpenAI":
+    """
+    get_client 的异步版本，返回共享的 AsyncOpenAI 客户端。
+
+    异步客户端的连接池只能在创建它的事件循环中使用，因此还按正在运行的事件循环
+    缓存：同一个事件循环中的调用共享一个客户端，每次 asyncio.run 得到新的客户端，
+    事件循环关闭后它的客户端被丢弃。
+    """
+    return _get("async", endpoint, base_url, api_key, options)
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple, Union
+
+
+@dataclass(frozen=True)
+class ContextWindow:
+    """
+    多块翻译中每个块的提示所包含的上下文范围。
+
+    默认情况下提示会嵌入整个源文档，提示令牌数随块数平方增长。
+    ContextWindow 将上下文限制在目标块附近，三个多块阶段共享同一个窗口。
+
+    属性:
+        chunks (Optional[int]): 目标块两侧各保留的相邻块数。None 表示不按块数限制。
+        tokens (Optional[int]): 目标块以外的上下文令牌预算，从最近的相邻块开始
+            左右交替加入，直到预算用完。None 表示不按令牌数限制。
+    """
+
+    chunks: Optional[int] = None
+    tokens: Optional[int] = None
+
+    def bounds(
+        self,
+        source_text_chunks: List[str],
+        i: int,
+        count_tokens: Callable[[str], int],
+    ) -> Tuple[int, int]:
+        """
+        计算第 i 块的上下文范围。
+
+        参数:
+            source_text_chunks (List[str]): 源文本块列表。
+            i (int): 目标块的索引。
+            count_tokens (Callable[[str], int]): 计算文本令牌数的函数，
+                仅在设置了 tokens 时使用。
+
+        返回:
+            Tuple[int, int]: 上下文块的起止索引 [start, end)。
+        """
+        start, end = 0, len(source_text_chunks)
+        if self.chunks is not None:
+            start = max(start, i - self.chunks)
+            end = min(end, i + self.chunks + 1)
+
+        if self.tokens is None:
+            return start, end
+
+        budget = self.tokens
+        left, right = i, i + 1
+        grew = True
+        while grew:
+            grew = False
+            if right < end:
+                cost = count_tokens(source_text_chunks[right])
+                if cost <= budget:
+                    budget -= cost
+                    right += 1
+                    grew = True
+            if left > start:
+                cost = count_tokens(source_text_chunks[left - 1])
+                if cost <= budget:
+                    budget -= cost
+                    left -= 1
+                    grew = True
+        return left, right
+
+
+def as_context_window(
+    context_window: Optional[Union[int, ContextWindow]],
+) -> Optional[ContextWindow]:
+    """将整数形式的相邻块数转换为 ContextWindow，其他值原样返回。"""
+    if isinstance(context_window, int):
+        return ContextWindow(chunks=context_window)
+    return context_window
@@ -0,0 +1,244 @@
+import contextvars
+import json
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    IO,
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import utils
+from .batchjob import CompletionDeferred
+from .packing import PACK_ITEMS, translate_packed
+
+
+Record = Union[str, Dict[str, Any]]
+
+
+def _record_text(record: Record, text_key: str) -> str:
+    if isinstance(record, str):
+        return record
+    return record[text_key]
+
+
+def _texts(records: List[Record], text_key: str) -> List[str]:
+    return [_record_text(record, text_key) for record in records]
+
+
+def _output_record(
+    record: Record, text_key: str, output_key: str, translation: str
+) -> Dict[str, Any]:
+    if isinstance(record, str):
+        return {text_key: record, output_key: translation}
+    return {**record, output_key: translation}
+
+
+def iter_translations(
+    source_lang: str,
+    target_lang: str,
+    records: Iterable[Record],
+    country: str = "",
+    max_workers: int = 4,
+    max_tokens: int = utils.MAX_TOKENS_PER_CHUNK,
+    context_window=None,
+    text_key: str = "text",
+    output_key: str = "translation",
+    pipeline: str = "full",
+    pack_tokens: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    并发翻译多条记录，按输入顺序逐条产出结果。
+
+    所有记录共享同一个大小为 max_workers 的线程池，因此同时进行的请求数不超过
+    max_workers；get_completion 上设置的缓存、翻译记忆和速率限制同样由所有记录共享。
+    records 被惰性读取，最多只有 2 * max_workers 条记录在处理中或等待产出，
+    内存占用与语料大小无关。
+
+    参数:
+        source_lang (str): 源语言。
+        target_lang (str): 目标语言。
+        records (Iterable[Record]): 字符串，或者在 text_key 下包含源文本的字典。
+        country (str, 可选): 目标语言指定的国家。
+        max_workers (int, 可选): 同时翻译的最大记录数。默认为 4。
+        max_tokens (int, 可选): 单条记录不切分时允许的最大令牌数。
+        context_window (可选): 长记录切分后每个块的上下文范围，含义与 translate 相同。
+        text_key (str, 可选): 源文本所在的键。默认为 "text"。
+        output_key (str, 可选): 译文写入的键。默认为 "translation"。
+        pipeline (str, 可选): 每条记录的翻译流程，含义与 translate 相同。
+        pack_tokens (int, 可选): 设置后启用打包：令牌数不超过 pack_tokens 的
+            相邻短记录合并为一个 JSON 模式的请求，每个请求的源文本令牌数不超过
+            pack_tokens，见 packing.translate_packed。打包的记录只经过一次翻译
+            调用，不使用 pipeline。默认为 None，即每条记录单独翻译。
+
+    返回:
+        Iterator[Dict[str, Any]]: 原记录加上 output_key 译文的字典，顺序与输入相同。
+
+    异常:
+        CompletionDeferred: 批处理模式下有记录等待结果。其余记录照常产出，
+            所有记录的请求都进入同一个批次。
+    """
+
+    def translate_record(text: str) -> str:
+        # 记录之间已经并行，记录内部的块顺序翻译，总并发由 max_workers 决定
+        return utils.translate(
+            source_lang,
+            target_lang,
+            text,
+            country,
+            max_tokens=max_tokens,
+            max_concurrency=1,
+            context_window=context_window,
+            pipeline=pipeline,
+        )
+
+    def translate_single(text: str) -> List[str]:
+        return [translate_record(text)]
+
+    def translate_pack(texts: List[str]) -> List[str]:
+        return translate_packed(
+            source_lang, target_lang, texts, country, max_tokens=pack_tokens
+        )
+
+    max_workers = max(1, max_workers)
+    context = contextvars.copy_context()
+    # 每个任务是 (记录列表, 返回对应译文列表的 future)，打包时一个任务包含多条记录
+    pending: Deque[Tuple[List[Record], Future]] = deque()
+    deferred: List[CompletionDeferred] = []
+
+    def finish() -> List[Dict[str, Any]]:
+        batch, future = pending.popleft()
+        try:
+            translations = future.result()
+        except CompletionDeferred as e:
+            # 批处理模式下跳过等待结果的记录，继续收集其余记录的请求
+            deferred.append(e)
+            return []
+        return [
+            _output_record(record, text_key, output_key, translation)
+            for record, translation in zip(batch, translations)
+        ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(func, batch: List[Record], arg) -> None:
+            future = executor.submit(context.copy().run, func, arg)
+            pending.append((batch, future))
+
+        pack: List[Record] = []
+        pack_used = 0
+
+        try:
+            for record in records:
+                text = _record_text(record, text_key)
+                tokens = utils.num_tokens_in_string(text) if pack_tokens else 0
+                packable = (
+                    pack_tokens is not None
+                    and tokens <= pack_tokens
+                    and tokens < max_tokens
+                )
+                if packable:
+                    # 短记录攒成一个令牌数不超过 pack_tokens 的请求
+                    if pack and (
+                        pack_used + tokens > pack_tokens
+                        or len(pack) >= PACK_ITEMS
+                    ):
+                        submit(translate_pack, pack, _texts(pack, text_key))
+                        pack, pack_used = [], 0
+                    pack.append(record)
+                    pack_used += tokens
+                else:
+                    if pack:
+                        submit(translate_pack, pack, _texts(pack, text_key))
+                        pack, pack_used = [], 0
+                    submit(translate_single, [record], text)
+
+                while len(pending) >= 2 * max_workers:
+                    yield from finish()
+
+            if pack:
+                submit(translate_pack, pack, _texts(pack, text_key))
+
+            while pending:
+                yield from finish()
+        finally:
+            # 出错或提前关闭时不再启动排队中的记录
+            for _, future in pending:
+                future.cancel()
+
+    if deferred:
+        raise CompletionDeferred.merge(deferred)
+
+
+def translate_many(
+    source_lang: str,
+    target_lang: str,
+    records: Iterable[Record],
+    sink: Union[str, IO[str]],
+    country: str = "",
+    max_workers: int = 4,
+    max_tokens: int = utils.MAX_TOKENS_PER_CHUNK,
+    context_window=None,
+    text_key: str = "text",
+    output_key: str = "translation",
+    pipeline: str = "full",
+    pack_tokens: Optional[int] = None,
+) -> int:
+    """
+    翻译多条记录，并按输入顺序逐行写入 JSONL。
+
+    每条记录完成（且它之前的记录都已写出）后立即写入并刷新，中途失败时
+    已写出的结果会保留。参数含义与 iter_translations 相同。批处理模式下
+    每一轮只写出已有全部结果的记录，最后一轮写出完整的结果。
+
+    参数:
+        sink (Union[str, IO[str]]): 输出的 JSONL 文件路径或可写的文本文件对象。
+
+    返回:
+        int: 写出的记录数。
+
+    示例:
+        >>> with open("data_points_samples.json", encoding="utf-8") as f:
+        ...     records = json.load(f)
+        >>> translate_many("英语", "中文", records, "translations.jsonl")
+    """
+
+    def write_all(file: IO[str]) -> int:
+        count = 0
+        for result in iter_translations(
+            source_lang,
+            target_lang,
+            records,
+            country,
+            max_workers=max_workers,
+            max_tokens=max_tokens,
+            context_window=context_window,
+            text_key=text_key,
+            output_key=output_key,
+            pipeline=pipeline,
+            pack_tokens=pack_tokens,
+        ):
+            file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            file.flush()
+            count += 1
+        return count
+
+    if isinstance(sink, str):
+        with open(sink, "w", encoding="utf-8") as file:
+            return write_all(file)
+    return write_all(sink)
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取 JSONL 文件，跳过空行，不会一次载入整个文件。"""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,10 @@
+def ic(*args):
+    """
+    icecream.ic 的延迟导入版本，用于输出调试信息。
+
+    icecream 的导入耗时较长，第一次调用时才导入；icecream.ic.disable() 等设置
+    同样对这里生效。
+    """
+    from icecream import ic as _ic
+
+    return _ic(*args)
@@ -0,0 +1,131 @@
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from .tokens import get_encoding
+
+
+# 反思提示要求模型在翻译无需改进时只输出这句话
+NO_CHANGES = "无需修改"
+
+# 模型没有完全照做时常见的"无需修改"说法
+_NO_CHANGES_PATTERN = re.compile(
+    r"^\W*(?:"
+    r"无需(?:任何)?(?:修改|改进|更改)"
+    r"|(?:没有|无)(?:任何)?(?:需要)?(?:修改|改进|建议)"
+    r"|no (?:further )?(?:changes|suggestions|improvements)"
+    r"(?: are)?(?: needed| required| necessary)?"
+    r")\W*$",
+    re.IGNORECASE,
+)
+
+# 判断是否有源文本原样留在译文中的单词：至少 4 个字母
+_WORD = re.compile(r"[^\W\d_]{4,}")
+
+
+def reflection_is_empty(reflection: str) -> bool:
+    """
+    反思没有给出任何修改建议时返回 True，此时可以跳过改进调用。
+
+    参数:
+        reflection (str): 反思阶段的输出。
+
+    返回:
+        bool: 反思为空或只表示无需修改。
+    """
+    text = reflection.strip()
+    return not text or bool(_NO_CHANGES_PATTERN.match(text))
+
+
+def dominant_script(text: str) -> Optional[str]:
+    """
+    返回文本中字母字符最多的书写系统，例如 "LATIN"、"CJK"、"CYRILLIC"。
+
+    没有字母字符时返回 None。
+    """
+    scripts = Counter(
+        unicodedata.name(ch, "").split(" ")[0] for ch in text if ch.isalpha()
+    )
+    if not scripts:
+        return None
+    return scripts.most_common(1)[0][0]
+
+
+def leftover_ratio(source_text: str, translation: str) -> float:
+    """源文本中原样出现在译文里的单词比例，用于发现漏译的部分。"""
+    words = {word.lower() for word in _WORD.findall(source_text)}
+    if not words:
+        return 0.0
+    translated = translation.lower()
+    return sum(word in translated for word in words) / len(words)
+
+
+@dataclass
+class ReflectionGate:
+    """
+    在本地判断一个块的初始翻译是否需要反思和改进。
+
+    标题、短列表、数字等短块往往一次就能翻译正确，通过检查后直接接受初始翻译，
+    省去反思和改进两次调用。超过 max_tokens 的块总是进行反思。
+
+    属性:
+        max_tokens (int): 可以跳过反思的最大源文本令牌数。
+        min_length_ratio (float): 译文与源文本令牌数之比的下限，过短可能有遗漏。
+        max_length_ratio (float): 令牌数之比的上限，过长可能有多余内容。
+        max_leftover_ratio (float): 译文与源文本书写系统相同时，允许原样保留的
+            源文本单词比例，超过时视为可能未翻译。
+        encoding_name (str): 计算令牌数使用的编码。
+    """
+
+    max_tokens: int = 32
+    min_length_ratio: float = 0.25
+    max_length_ratio: float = 4.0
+    max_leftover_ratio: float = 0.5
+    encoding_name: str = "cl100k_base"
+
+    def review_reason(
+        self, source_text: str, translation: str
+    ) -> Optional[str]:
+        """
+        返回需要反思的原因，可以跳过反思时返回 None。
+
+        参数:
+            source_text (str): 块的源文本。
+            translation (str): 块的初始翻译。
+
+        返回:
+            Optional[str]: "empty"、"long"、"length" 或 "untranslated"，
+                或者 None。
+        """
+        if not translation.strip():
+            return "empty"
+
+        encoding = get_encoding(self.encoding_name)
+        source_tokens = len(encoding.encode(source_text))
+        if source_tokens > self.max_tokens:
+            return "long"
+
+        # 只有数字和符号的块没有可以改进的措辞
+        if not any(ch.isalpha() for ch in source_text):
+            return None
+
+        # 很短的块令牌数之比不稳定，不做长度检查
+        if source_tokens > 3:
+            ratio = len(encoding.encode(translation)) / source_tokens
+            if not self.min_length_ratio <= ratio <= self.max_length_ratio:
+                return "length"
+
+        if (
+            dominant_script(source_text) == dominant_script(translation)
+            and leftover_ratio(source_text, translation)
+            > self.max_leftover_ratio
+        ):
+            return "untranslated"
+
+        return None
+
+    def needs_review(self, source_text: str, translation: str) -> bool:
+        """初始翻译需要反思和改进时返回 True。"""
+        return self.review_reason(source_text, translation) is not None
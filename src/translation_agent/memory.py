@@ -0,0 +1,496 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+
+from .chunking import sentence_boundaries
+
+
+# 梅森素数 2^61 - 1，用作 MinHash 置换的模数
+_PRIME = (1 << 61) - 1
+
+
+@dataclass
+class MemoryMatch:
+    """
+    翻译记忆中的一个匹配。
+
+    属性:
+        source (str): 记忆中的源文本片段。
+        translation (str): 该片段已接受的翻译。
+        score (float): 与查询片段的相似度（字符 n-gram 的 Jaccard 系数），1.0 为完全相同。
+    """
+
+    source: str
+    translation: str
+    score: float
+
+
+def normalize_segment(text: str) -> str:
+    """去掉首尾空白并把连续空白合并为一个空格，作为精确匹配的依据。"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def split_sentences(text: str) -> List[Tuple[str, str, str]]:
+    """
+    在 chunking 的句子边界上切分 text。
+
+    返回:
+        List[Tuple[str, str, str]]: 每个句子的 (前导空白, 句子, 尾随空白)，
+            按顺序拼接后与 text 完全一致。只含空白的片段句子部分为空字符串。
+    """
+    sentences = []
+    start = 0
+    for end in sentence_boundaries(text):
+        piece = text[start:end]
+        core = piece.strip()
+        if not core:
+            sentences.append((piece, "", ""))
+        else:
+            head = piece[: len(piece) - len(piece.lstrip())]
+            tail = piece[len(piece.rstrip()) :]
+            sentences.append((head, core, tail))
+        start = end
+    return sentences
+
+
+def _stable_hash(text: str) -> int:
+    """跨进程稳定的 64 位哈希（内置 hash() 在每个进程中带有随机盐）。"""
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class TranslationMemory:
+    """
+    支持精确匹配和模糊匹配的翻译记忆，数据保存在 SQLite 中。
+
+    每个片段（整段文本、多块翻译中的一个块或批量翻译中的一条记录）按语言对
+    和目标国家保存，为某个国家审校过的翻译不会在另一个国家的翻译中复用。
+    块通常很长，跨文档重复的往往只是其中的句子，因此 learn 在源文本和翻译
+    能逐句对齐时同时保存每个句子。这些句子对只是按句子数猜出来的，不算已接受
+    的翻译：exact 和 recall 不返回它们，只有 references 把它们作为参考。
+    精确匹配比较规范化后文本的哈希；模糊匹配使用字符 n-gram 的 MinHash 签名和
+    LSH 分桶，查询只需按桶索引取出候选，再计算真实相似度，因此在数百万片段下仍然可用。
+
+    参数:
+        path (str, 可选): SQLite 数据库文件路径。默认为 ":memory:"。
+        threshold (float, 可选): 模糊匹配的最低相似度。默认为 0.6。
+        ngram (int, 可选): 字符 n-gram 的长度。默认为 3。
+        num_perm (int, 可选): MinHash 置换个数。默认为 64。
+        bands (int, 可选): LSH 分带数，必须整除 num_perm。默认为 16。
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        threshold: float = 0.6,
+        ngram: int = 3,
+        num_perm: int = 64,
+        bands: int = 16,
+    ):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm 必须是 bands 的整数倍")
+
+        if path != ":memory:":
+            path = os.path.expanduser(path)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = random.Random(0)
+        self._perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "id INTEGER PRIMARY KEY, lang_pair TEXT NOT NULL, "
+            "source_hash TEXT NOT NULL, source TEXT NOT NULL, "
+            "translation TEXT NOT NULL, aligned INTEGER NOT NULL DEFAULT 0, "
+            "UNIQUE (lang_pair, source_hash))"
+        )
+        columns = [
+            row[1] for row in self._conn.execute("PRAGMA table_info(segments)")
+        ]
+        if "aligned" not in columns:
+            # 旧版本创建的数据库没有 aligned 列，其中的片段都视为已接受的翻译
+            self._conn.execute(
+                "ALTER TABLE segments "
+                "ADD COLUMN aligned INTEGER NOT NULL DEFAULT 0"
+            )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "bucket INTEGER NOT NULL, segment_id INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _lang_pair(
+        source_lang: str, target_lang: str, country: str = ""
+    ) -> str:
+        # 不指定国家时保持旧版本的键，已有的数据库仍然可以命中
+        if country == "":
+            return f"{source_lang}\t{target_lang}"
+        return f"{source_lang}\t{target_lang}\t{country}"
+
+    @staticmethod
+    def _source_hash(segment: str) -> str:
+        return hashlib.sha256(segment.encode("utf-8")).hexdigest()
+
+    def _shingles(self, segment: str) -> FrozenSet[str]:
+        text = segment.lower()
+        if len(text) <= self.ngram:
+            return frozenset([text])
+        return frozenset(
+            text[i : i + self.ngram] for i in range(len(text) - self.ngram + 1)
+        )
+
+    def _buckets(self, lang_pair: str, shingles: FrozenSet[str]) -> List[int]:
+        hashes = [_stable_hash(shingle) for shingle in shingles]
+        signature = [
+            min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms
+        ]
+        buckets = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows : (band + 1) * self.rows]
+            key = f"{lang_pair}\t{band}\t" + ",".join(map(str, rows))
+            # SQLite 的 INTEGER 是有符号 64 位整数
+            buckets.append(_stable_hash(key) - (1 << 63))
+        return buckets
+
+    def add(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        translation: str,
+        country: str = "",
+    ) -> None:
+        """
+        写入或更新一个片段的翻译。
+
+        参数:
+            source_lang (str): 源语言。
+            target_lang (str): 目标语言。
+            source (str): 源文本片段。
+            translation (str): 已接受的翻译。
+            country (str, 可选): 翻译所针对的目标国家。默认为 ""，即不指定。
+        """
+        self._store(
+            source_lang, target_lang, source, translation, country, False
+        )
+
+    def _store(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        translation: str,
+        country: str,
+        aligned: bool,
+    ) -> None:
+        segment = normalize_segment(source)
+        if not segment or not translation:
+            return
+
+        lang_pair = self._lang_pair(source_lang, target_lang, country)
+        source_hash = self._source_hash(segment)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, aligned FROM segments "
+                "WHERE lang_pair = ? AND source_hash = ?",
+                (lang_pair, source_hash),
+            ).fetchone()
+            if row is not None:
+                # 猜出的句子对不覆盖已接受的翻译
+                if aligned and not row[1]:
+                    return
+                self._conn.execute(
+                    "UPDATE segments SET translation = ?, aligned = ? "
+                    "WHERE id = ?",
+                    (translation, int(aligned), row[0]),
+                )
+                self._conn.commit()
+                return
+
+            cursor = self._conn.execute(
+                "INSERT INTO segments "
+                "(lang_pair, source_hash, source, translation, aligned) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (lang_pair, source_hash, segment, translation, int(aligned)),
+            )
+            # 分桶只按语言对，模糊匹配可以参考为其他国家审校过的翻译
+            buckets = self._buckets(
+                self._lang_pair(source_lang, target_lang),
+                self._shingles(segment),
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (bucket, segment_id) VALUES (?, ?)",
+                [(bucket, cursor.lastrowid) for bucket in buckets],
+            )
+            self._conn.commit()
+
+    def exact(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        country: str = "",
+    ) -> Optional[str]:
+        """
+        查找与 source 完全相同（忽略空白差异）的片段的已接受翻译，不包括
+        learn 猜出的句子对。
+
+        参数:
+            source_lang (str): 源语言。
+            target_lang (str): 目标语言。
+            source (str): 源文本片段。
+            country (str, 可选): 翻译所针对的目标国家。默认为 ""，即不指定。
+
+        返回:
+            Optional[str]: 已接受的翻译，没有时返回 None。
+        """
+        return self._lookup(
+            source_lang, target_lang, source, country, aligned=False
+        )
+
+    def _lookup(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        country: str,
+        aligned: bool,
+    ) -> Optional[str]:
+        """aligned 为 True 时，猜出的句子对也算命中。"""
+        segment = normalize_segment(source)
+        if not segment:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translation FROM segments "
+                "WHERE lang_pair = ? AND source_hash = ? AND aligned <= ?",
+                (
+                    self._lang_pair(source_lang, target_lang, country),
+                    self._source_hash(segment),
+                    int(aligned),
+                ),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def learn(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        translation: str,
+        country: str = "",
+    ) -> None:
+        """
+        写入整个片段的翻译；源文本和翻译切分出的句子数相同时，把每对句子
+        也写入，但只供 references 参考。
+
+        参数:
+            source_lang (str): 源语言。
+            target_lang (str): 目标语言。
+            source (str): 源文本片段。
+            translation (str): 已接受的翻译。
+            country (str, 可选): 翻译所针对的目标国家。默认为 ""，即不指定。
+        """
+        self.add(source_lang, target_lang, source, translation, country)
+
+        sources = [core for _, core, _ in split_sentences(source) if core]
+        targets = [core for _, core, _ in split_sentences(translation) if core]
+        if 1 < len(sources) == len(targets):
+            for sentence, sentence_translation in zip(sources, targets):
+                self._store(
+                    source_lang,
+                    target_lang,
+                    sentence,
+                    sentence_translation,
+                    country,
+                    True,
+                )
+
+    def recall(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        country: str = "",
+    ) -> Optional[str]:
+        """
+        查找 source 的已接受翻译：先按整个片段精确匹配，否则在每个句子都
+        作为已接受的片段精确命中时，按原文的空白把句子的翻译拼接起来。
+
+        参数:
+            source_lang (str): 源语言。
+            target_lang (str): 目标语言。
+            source (str): 源文本片段。
+            country (str, 可选): 翻译所针对的目标国家。默认为 ""，即不指定。
+
+        返回:
+            Optional[str]: 已接受的翻译，没有时返回 None。
+        """
+        translation = self.exact(source_lang, target_lang, source, country)
+        if translation is not None:
+            return translation
+
+        sentences = split_sentences(source)
+        if sum(1 for _, core, _ in sentences if core) < 2:
+            return None
+        parts = []
+        for head, core, tail in sentences:
+            if not core:
+                parts.append(head)
+                continue
+            sentence_translation = self.exact(
+                source_lang, target_lang, core, country
+            )
+            if sentence_translation is None:
+                return None
+            parts += [head, sentence_translation, tail]
+        return "".join(parts)
+
+    def references(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        limit: int = 5,
+        country: str = "",
+    ) -> List[MemoryMatch]:
+        """
+        查找可供翻译 source 参考的片段：每个句子精确命中的翻译（相似度为 1.0，
+        包括 learn 猜出的句子对）以及与整个片段或各个句子相似的片段。
+
+        参数:
+            source_lang (str): 源语言。
+            target_lang (str): 目标语言。
+            source (str): 查询的源文本片段。
+            limit (int, 可选): 最多返回的匹配数。默认为 5。
+            country (str, 可选): 翻译所针对的目标国家，精确命中的句子只取
+                这个国家的翻译。默认为 ""，即不指定。
+
+        返回:
+            List[MemoryMatch]: 按相似度降序排列、源文本互不相同的匹配。
+        """
+        sentences = [core for _, core, _ in split_sentences(source) if core]
+        matches = self.fuzzy(source_lang, target_lang, source, limit)
+        if len(sentences) > 1:
+            for sentence in sentences:
+                translation = self._lookup(
+                    source_lang, target_lang, sentence, country, aligned=True
+                )
+                if translation is not None:
+                    matches.append(MemoryMatch(sentence, translation, 1.0))
+                else:
+                    matches += self.fuzzy(
+                        source_lang, target_lang, sentence, limit
+                    )
+
+        unique = {}
+        for match in sorted(matches, key=lambda m: m.score, reverse=True):
+            unique.setdefault(match.source, match)
+        return list(unique.values())[:limit]
+
+    def fuzzy(
+        self,
+        source_lang: str,
+        target_lang: str,
+        source: str,
+        limit: int = 3,
+        max_candidates: int = 50,
+    ) -> List[MemoryMatch]:
+        """
+        查找与 source 相似但不完全相同的片段，包括为任何国家保存的翻译和
+        learn 猜出的句子对。
+
+        参数:
+            source_lang (str): 源语言。
+            target_lang (str): 目标语言。
+            source (str): 查询的源文本片段。
+            limit (int, 可选): 最多返回的匹配数。默认为 3。
+            max_candidates (int, 可选): 最多对多少个 LSH 候选计算真实相似度。
+                默认为 50。
+
+        返回:
+            List[MemoryMatch]: 相似度不低于 threshold 的匹配，按相似度降序排列。
+        """
+        segment = normalize_segment(source)
+        if not segment:
+            return []
+
+        lang_pair = self._lang_pair(source_lang, target_lang)
+        source_hash = self._source_hash(segment)
+        shingles = self._shingles(segment)
+        buckets = self._buckets(lang_pair, shingles)
+
+        with self._lock:
+            hits: Counter = Counter()
+            for bucket in buckets:
+                for (segment_id,) in self._conn.execute(
+                    "SELECT segment_id FROM buckets WHERE bucket = ?",
+                    (bucket,),
+                ):
+                    hits[segment_id] += 1
+
+            # 在越多分带中碰撞的片段越可能相似，优先计算
+            candidate_ids = [
+                segment_id
+                for segment_id, _ in hits.most_common(max_candidates)
+            ]
+            rows = self._fetch(candidate_ids)
+
+        matches = []
+        for row_hash, row_source, row_translation in rows:
+            if row_hash == source_hash:
+                continue
+            other = self._shingles(row_source)
+            score = len(shingles & other) / len(shingles | other)
+            if score >= self.threshold:
+                matches.append(MemoryMatch(row_source, row_translation, score))
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[:limit]
+
+    def _fetch(self, segment_ids: Sequence[int]) -> List[tuple]:
+        if not segment_ids:
+            return []
+        placeholders = ",".join("?" * len(segment_ids))
+        return self._conn.execute(
+            "SELECT source_hash, source, translation FROM segments "
+            f"WHERE id IN ({placeholders})",
+            list(segment_ids),
+        ).fetchall()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM segments"
+            ).fetchone()
+        return count
+
+    def close(self) -> None:
+        """关闭 SQLite 连接。"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,201 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# 请求延迟直方图默认的桶上界（秒）
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+
+@dataclass
+class Histogram:
+    """
+    固定桶的直方图，与 Prometheus 的 histogram 类型对应。
+
+    属性:
+        buckets (Tuple[float, ...]): 各个桶的上界，按升序排列。
+        counts (List[int]): 落在每个桶内的观测数，最后一项为超过所有上界的观测。
+        count (int): 观测总数。
+        sum (float): 观测值之和。
+    """
+
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    count: int = 0
+    sum: float = 0.0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        """记录一个观测值。"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """返回 (上界, 不超过该上界的观测数) 列表，最后一项的上界为 "+Inf"。"""
+        total = 0
+        result = []
+        bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """
+    模型的价格，单位为美元每百万令牌。
+
+    属性:
+        prompt (float): 提示令牌的价格。
+        completion (float): 补全令牌的价格。
+        cached_prompt (float, 可选): 命中提示缓存的提示令牌价格，
+            默认与 prompt 相同。
+    """
+
+    prompt: float
+    completion: float
+    cached_prompt: Optional[float] = None
+
+    def cost(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+    ) -> float:
+        """按令牌数估算一次请求的费用（美元）。"""
+        cached_price = (
+            self.prompt if self.cached_prompt is None else self.cached_prompt
+        )
+        return (
+            (prompt_tokens - cached_tokens) * self.prompt
+            + cached_tokens * cached_price
+            + completion_tokens * self.completion
+        ) / 1_000_000
+
+
+# 估算费用使用的价格表，以请求时指定的模型名称查找；
+# 价格会变化，可以用 set_model_price 更新或补充
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    "gpt-4-turbo": ModelPrice(prompt=10.0, completion=30.0),
+    "gpt-4o": ModelPrice(prompt=2.5, completion=10.0, cached_prompt=1.25),
+    "gpt-4o-mini": ModelPrice(
+        prompt=0.15, completion=0.6, cached_prompt=0.075
+    ),
+}
+
+
+def set_model_price(model: str, price: Optional[ModelPrice]) -> None:
+    """
+    设置 model 的价格，price 为 None 时删除，该模型的费用按 0 计。
+
+    示例:
+        >>> set_model_price("llama3-70b-8192", ModelPrice(prompt=0.59, completion=0.79))
+    """
+    if price is None:
+        MODEL_PRICES.pop(model, None)
+    else:
+        MODEL_PRICES[model] = price
+
+
+def estimate_cost(
+    model: Optional[str],
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int = 0,
+) -> float:
+    """按价格表估算一次请求的费用（美元），价格表中没有该模型时返回 0。"""
+    price = MODEL_PRICES.get(model) if model else None
+    if price is None:
+        return 0.0
+    return price.cost(prompt_tokens, completion_tokens, cached_tokens)
+
+
+# Prometheus 计数器：(指标名, StageStats 中的字段, 说明)
+_COUNTERS = (
+    ("requests_total", "calls", "API requests sent."),
+    ("cache_hits_total", "cached", "Completions served from the cache."),
+    ("skipped_total", "skipped", "Calls skipped by gating."),
+    ("retries_total", "retries", "Retried API requests."),
+    ("prompt_tokens_total", "prompt_tokens", "Prompt tokens reported."),
+    (
+        "completion_tokens_total",
+        "completion_tokens",
+        "Completion tokens reported.",
+    ),
+    (
+        "cached_tokens_total",
+        "cached_tokens",
+        "Prompt tokens served from the provider prompt cache.",
+    ),
+    ("cost_usd_total", "cost", "Estimated cost in US dollars."),
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _samples(
+    name: str, stages: Iterable[Tuple[str, Any]], attribute: str
+) -> List[str]:
+    return [
+        f'{name}{{stage="{_escape(stage)}"}} {getattr(stats, attribute)}'
+        for stage, stats in stages
+    ]
+
+
+def prometheus_text(stats: Any, prefix: str = "translation_agent") -> str:
+    """
+    把 PipelineStats 导出为 Prometheus 文本格式，每个阶段一个 stage 标签。
+
+    参数:
+        stats (PipelineStats): 要导出的统计。
+        prefix (str, 可选): 指标名称的前缀。
+
+    返回:
+        str: Prometheus 文本格式（0.0.4）的指标。
+
+    示例:
+        >>> set_global_stats(PipelineStats())
+        >>> print(prometheus_text(global_stats()))
+        # HELP translation_agent_requests_total API requests sent.
+        # TYPE translation_agent_requests_total counter
+        translation_agent_requests_total{stage="initial"} 12
+        ...
+    """
+    stages = sorted(stats.snapshot().items())
+    lines: List[str] = []
+
+    for suffix, attribute, help_text in _COUNTERS:
+        name = f"{prefix}_{suffix}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(_samples(name, stages, attribute))
+
+    name = f"{prefix}_request_seconds"
+    lines.append(f"# HELP {name} API request latency.")
+    lines.append(f"# TYPE {name} histogram")
+    for stage, stage_stats in stages:
+        label = f'stage="{_escape(stage)}"'
+        for bound, count in stage_stats.latency.cumulative():
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f"{name}_sum{{{label}}} {stage_stats.latency.sum}")
+        lines.append(f"{name}_count{{{label}}} {stage_stats.latency.count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,205 @@
+import json
+from typing import List, Optional, Sequence, Tuple
+
+from . import utils
+from .debug import ic
+from .stats import stage_label
+
+
+# 一个打包请求中源文本的默认令牌预算
+PACK_TOKENS = 1000
+
+# 一个打包请求中的默认最大片段数
+PACK_ITEMS = 50
+
+
+def pack_segments(
+    token_counts: Sequence[int],
+    max_tokens: int = PACK_TOKENS,
+    max_items: int = PACK_ITEMS,
+) -> List[List[int]]:
+    """
+    按顺序把片段分组，每组的令牌数之和不超过 max_tokens。
+
+    单个超过预算的片段单独成组。
+
+    参数:
+        token_counts (Sequence[int]): 每个片段的令牌数。
+        max_tokens (int, 可选): 每组的令牌预算。
+        max_items (int, 可选): 每组的最大片段数。
+
+    返回:
+        List[List[int]]: 每组片段的索引，按原顺序排列。
+    """
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, tokens in enumerate(token_counts):
+        if current and (
+            used + tokens > max_tokens or len(current) >= max_items
+        ):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _packed_prompt(
+    source_lang: str, target_lang: str, texts: Sequence[str], country: str
+) -> Tuple[str, str]:
+    """构建打包翻译的系统消息和提示，返回 (system_message, prompt)。"""
+
+    system_message = (
+        f"您是一位专注于从 {source_lang} 到 {target_lang} 的专业翻译专家。"
+    )
+
+    segments = json.dumps(
+        [{"id": i, "text": text} for i, text in enumerate(texts)],
+        ensure_ascii=False,
+        indent=1,
+    )
+
+    prompt = f"""这是一组从 {source_lang} 到 {target_lang} 的翻译任务。下面由 XML 标签 <SEGMENTS> 和 </SEGMENTS> 界定的 JSON 数组中，每个元素包含编号 "id" 和要翻译的文本 "text"。
+{utils._country_requirement(target_lang, country)}请把每个 text 分别翻译成 {target_lang}。各段相互独立，不要合并、拆分或遗漏任何一段，也不要提供除翻译外的任何解释。
+
+<SEGMENTS>
+{segments}
+</SEGMENTS>
+
+以 JSON 对象输出结果，只包含一个字段 "translations"：它是一个数组，每个元素包含对应的 "id" 和译文 "translation"。
+不要输出 JSON 之外的任何内容。"""
+
+    return system_message, prompt
+
+
+def unpack_translations(content: str, count: int) -> List[Optional[str]]:
+    """
+    校验打包请求的 JSON 输出，并按编号放回原位置。
+
+    缺失、重复、编号越界或译文为空的条目对应位置为 None。
+
+    参数:
+        content (str): 模型输出的 JSON 文本。
+        count (int): 请求中的片段数。
+
+    返回:
+        List[Optional[str]]: 每个片段的译文。
+    """
+    results: List[Optional[str]] = [None] * count
+    try:
+        items = json.loads(content)["translations"]
+    except (KeyError, TypeError, ValueError):
+        return results
+    if not isinstance(items, list):
+        return results
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("id")
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        translation = item.get("translation")
+        if (
+            isinstance(index, int)
+            and 0 <= index < count
+            and results[index] is None
+            and isinstance(translation, str)
+            and translation.strip()
+        ):
+            results[index] = translation
+    return results
+
+
+def _translate_pack(
+    source_lang: str, target_lang: str, texts: List[str], country: str
+) -> List[str]:
+    """
+    用一次 JSON 模式的请求翻译 texts，无效的条目逐条重新翻译。
+
+    译文只是草稿质量，与 "draft" 流程一样不写回翻译记忆，以免之后的完整
+    翻译直接复用。
+    """
+
+    system_message, prompt = _packed_prompt(
+        source_lang, target_lang, texts, country
+    )
+    with stage_label("packed"):
+        content = utils.get_completion(prompt, system_message, json_mode=True)
+
+    translations = unpack_translations(content, len(texts))
+    missing = [i for i, item in enumerate(translations) if item is None]
+    if missing:
+        ic(f"打包请求中有 {len(missing)} 个条目无效，逐条重新翻译")
+    for i in missing:
+        translations[i] = utils.one_chunk_initial_translation(
+            source_lang, target_lang, texts[i], country
+        )
+    return translations
+
+
+def translate_packed(
+    source_lang: str,
+    target_lang: str,
+    texts: Sequence[str],
+    country: str = "",
+    max_tokens: int = PACK_TOKENS,
+    max_items: int = PACK_ITEMS,
+    max_concurrency: int = utils.MAX_CONCURRENCY,
+) -> List[str]:
+    """
+    把多个短片段打包进少量 JSON 模式的请求中翻译。
+
+    每个请求包含令牌数之和不超过 max_tokens 的一组片段，模型以 JSON 数组返回
+    每个片段的译文，校验后按编号放回原位置；缺失或无效的条目逐条单独翻译。
+    翻译记忆中已有的片段直接复用，不进入请求。每个片段只经过一次翻译调用，
+    不进行反思和改进，相当于 "draft" 流程，因此新的译文同样不写回翻译记忆。
+    适合标题、短句等大量短文本。
+
+    参数:
+        source_lang (str): 源语言。
+        target_lang (str): 目标语言。
+        texts (Sequence[str]): 要翻译的片段。
+        country (str, 可选): 目标语言指定的国家。
+        max_tokens (int, 可选): 每个请求中源文本的令牌预算。
+        max_items (int, 可选): 每个请求中的最大片段数。
+        max_concurrency (int, 可选): 同时进行的最大请求数。
+
+    返回:
+        List[str]: 与 texts 一一对应的译文。
+
+    示例:
+        >>> translate_packed("English", "Spanish", ["Home", "Settings", "Log out"])
+        ['Inicio', 'Configuración', 'Cerrar sesión']
+    """
+
+    translations: List[Optional[str]] = [
+        utils._memory_exact(source_lang, target_lang, text, country)
+        for text in texts
+    ]
+    todo = [i for i, item in enumerate(translations) if item is None]
+
+    packs = pack_segments(
+        [utils.num_tokens_in_string(texts[i]) for i in todo],
+        max_tokens,
+        max_items,
+    )
+
+    def translate_pack(p: int) -> List[str]:
+        return _translate_pack(
+            source_lang,
+            target_lang,
+            [texts[todo[j]] for j in packs[p]],
+            country,
+        )
+
+    for pack, results in zip(
+        packs, utils._map_chunks(translate_pack, len(packs), max_concurrency)
+    ):
+        for j, translation in zip(pack, results):
+            translations[todo[j]] = translation
+
+    return translations
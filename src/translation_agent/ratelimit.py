@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    按分钟补充的令牌桶。
+
+    reserve 立即扣除所需的额度并返回需要等待的秒数，额度可以暂时为负，
+    之后的调用按顺序排在后面。调用方在锁外等待，因此等待期间其他调用不会被阻塞。
+
+    参数:
+        per_minute (float): 每分钟补充的额度。
+        capacity (float, 可选): 桶的容量，即允许的突发额度。默认为 per_minute。
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.capacity = per_minute if capacity is None else capacity
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._level = min(
+            self.capacity, self._level + elapsed * self.per_minute / 60.0
+        )
+        self._updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """扣除 amount 的额度，返回额度恢复为非负前需要等待的秒数。"""
+        self._refill(now)
+        self._level -= amount
+        if self._level >= 0:
+            return 0.0
+        return -self._level * 60.0 / self.per_minute
+
+    def refund(self, amount: float) -> None:
+        """退回多扣的额度（amount 为负时补扣）。"""
+        self._level = min(self.capacity, self._level + amount)
+
+
+class RateLimiter:
+    """
+    同时限制每分钟请求数（RPM）和每分钟令牌数（TPM）的速率限制器。
+
+    锁只在计算准入时持有，等待在锁外进行，所以并发请求在额度允许时可以同时进行，
+    而不是像按调用加锁那样被完全串行化。
+
+    参数:
+        rpm (float, 可选): 每分钟最大请求数。None 表示不限制。
+        tpm (float, 可选): 每分钟最大令牌数（提示加补全）。None 表示不限制。
+    """
+
+    def __init__(
+        self, rpm: Optional[float] = None, tpm: Optional[float] = None
+    ):
+        self._lock = threading.Lock()
+        self.rpm: Optional[float] = None
+        self.tpm: Optional[float] = None
+        self._requests: Optional[TokenBucket] = None
+        self._tokens: Optional[TokenBucket] = None
+        self.configure(rpm, tpm)
+
+    def configure(
+        self, rpm: Optional[float] = None, tpm: Optional[float] = None
+    ) -> None:
+        """修改限制；限制不变的桶保留当前的额度。"""
+        with self._lock:
+            if rpm != self.rpm:
+                self._requests = TokenBucket(rpm) if rpm else None
+            if tpm != self.tpm:
+                self._tokens = TokenBucket(tpm) if tpm else None
+            self.rpm, self.tpm = rpm, tpm
+
+    def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens is not None and tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        为一个请求申请额度，必要时等待。
+
+        参数:
+            tokens (int, 可选): 预计消耗的令牌数，仅在设置了 tpm 时使用。
+
+        返回:
+            float: 实际等待的秒数。
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """acquire 的异步版本，等待时不阻塞事件循环。"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """
+        用响应中的实际令牌数修正之前预估的额度。
+
+        参数:
+            estimated (int): acquire 时使用的预估令牌数。
+            actual (int, 可选): 响应 usage 中的 total_tokens，未知时为 None。
+        """
+        if actual is None or self._tokens is None:
+            return
+        with self._lock:
+            self._tokens.refund(estimated - actual)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(
+    endpoint: str, rpm: Optional[float] = None, tpm: Optional[float] = None
+) -> RateLimiter:
+    """
+    返回 endpoint 专用的速率限制器，不存在时创建，存在时更新它的限制。
+
+    同一个端点的所有会话和调用共享同一个桶，不同端点互不影响。
+
+    参数:
+        endpoint (str): 端点标识，例如端点名称加 base_url。
+        rpm (float, 可选): 每分钟最大请求数。
+        tpm (float, 可选): 每分钟最大令牌数。
+
+    返回:
+        RateLimiter: 该端点的速率限制器。
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            limiter = _limiters[endpoint] = RateLimiter(rpm, tpm)
+            return limiter
+    limiter.configure(rpm, tpm)
+    return limiter
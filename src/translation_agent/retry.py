@@ -0,0 +1,312 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from .stats import record_retry
+
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """
+    端点连续失败，断路器处于打开状态，请求未发出。
+
+    属性:
+        retry_in (float): 建议等待多少秒后再尝试。
+    """
+
+    def __init__(self, message: str, retry_in: float = 0.0):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    读取错误响应中的 retry-after-ms 或 Retry-After 头，返回建议等待的秒数。
+
+    Retry-After 可以是秒数，也可以是 HTTP 日期。没有响应或头时返回 None。
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - time.time())
+
+
+@dataclass
+class RetryPolicy:
+    """
+    补全请求的重试策略：指数退避加随机抖动，优先遵循服务端的 Retry-After。
+
+    属性:
+        max_attempts (int): 包括第一次在内的最大尝试次数。
+        initial_delay (float): 第一次重试前的基础等待秒数。
+        max_delay (float): 单次等待的上限（秒），同样限制 Retry-After。
+        multiplier (float): 每次重试基础等待的倍数。
+        jitter (float): 随机抖动比例，0 表示不抖动，1 表示在 [0, 基础等待] 中均匀取值。
+    """
+
+    max_attempts: int = 5
+    initial_delay: float = 1.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+    jitter: float = 1.0
+
+    def retryable(self, error: BaseException) -> bool:
+        """限流、超时、连接错误和 5xx 可以重试，其余错误直接抛出。"""
+        import openai
+
+        if isinstance(
+            error,
+            (
+                openai.RateLimitError,
+                openai.APITimeoutError,
+                openai.APIConnectionError,
+                openai.InternalServerError,
+            ),
+        ):
+            return True
+        status = getattr(error, "status_code", None)
+        return isinstance(status, int) and (status == 409 or status >= 500)
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        """
+        第 attempt 次尝试（从 1 开始）失败后应等待的秒数。
+
+        参数:
+            attempt (int): 已失败的尝试次数。
+            error (BaseException): 该次尝试的错误。
+
+        返回:
+            float: 等待秒数。
+        """
+        suggested = retry_after(error)
+        if suggested is not None:
+            return min(suggested, self.max_delay)
+        base = min(
+            self.max_delay,
+            self.initial_delay * self.multiplier ** (attempt - 1),
+        )
+        return base * (1 - self.jitter * random.random())
+
+
+class CircuitBreaker:
+    """
+    按端点统计连续失败的断路器。
+
+    连续失败 failure_threshold 次后打开，此后 before_call 抛出 CircuitOpenError，
+    call_with_retry 等到打开状态结束再发出请求，避免在端点不可用时继续消耗重试；
+    reset_timeout 秒后进入半开状态，放行一个试探请求，成功则关闭，失败则重新打开。
+    带 Retry-After 的 429 是提供商的限流而不是端点故障，不计入连续失败。
+
+    参数:
+        failure_threshold (int, 可选): 打开前允许的连续失败次数。默认为 5。
+        reset_timeout (float, 可选): 打开后多久允许试探（秒）。默认为 30。
+    """
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """断路器当前的状态："closed"、"open" 或 "half-open"。"""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> None:
+        """请求前调用；断路器打开时抛出 CircuitOpenError。"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_timeout - (
+                time.monotonic() - self._opened_at
+            )
+            if remaining > 0:
+                raise CircuitOpenError("端点连续失败，暂停发送请求", remaining)
+            if self._probing:
+                raise CircuitOpenError(
+                    "端点正在试探恢复，暂停发送请求",
+                    min(self.reset_timeout, 1.0),
+                )
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        """
+        请求以不反映端点状态的方式结束（限流、请求本身的错误或中断）时调用，
+        不改变失败计数，只结束可能正在进行的试探，让下一个请求重新试探。
+        """
+        with self._lock:
+            self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    """返回 endpoint 专用的断路器，不存在时创建。"""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker()
+        return breaker
+
+
+def _throttled(error: BaseException) -> bool:
+    """带 Retry-After 的 429：提供商在限流，端点本身正常。"""
+    status = getattr(error, "status_code", None)
+    return status == 429 and retry_after(error) is not None
+
+
+def _admit(breaker: Optional[CircuitBreaker]) -> Optional[float]:
+    """断路器放行时返回 None，否则返回需要等待的秒数。"""
+    if breaker is None:
+        return None
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        return e.retry_in
+    return None
+
+
+def _record_error(
+    breaker: Optional[CircuitBreaker], error: BaseException, retryable: bool
+) -> None:
+    """把失败计入断路器；限流和不可重试的错误不计入，只结束试探。"""
+    if breaker is None:
+        return
+    if retryable and not _throttled(error):
+        breaker.record_failure()
+    else:
+        breaker.release()
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """
+    按 policy 调用 func，可重试的错误在等待后重新调用。
+
+    只有 func 本身被重复执行，调用方已经得到的其他结果不受影响。断路器打开时
+    等到打开状态结束（或其他请求的试探有了结果）再发出请求，不抛出 CircuitOpenError。
+
+    参数:
+        func (Callable[[], T]): 发出一次请求的函数。
+        policy (RetryPolicy): 重试策略。
+        breaker (CircuitBreaker, 可选): 该端点的断路器。
+        sleep (Callable[[float], None], 可选): 等待函数，便于测试替换。
+
+    返回:
+        T: func 的返回值。
+    """
+    attempt = 0
+    while True:
+        # 断路器打开时等到打开状态结束，等待不消耗尝试次数
+        wait = _admit(breaker)
+        if wait is not None:
+            sleep(wait)
+            continue
+        attempt += 1
+        try:
+            result = func()
+        except Exception as e:
+            retryable = policy.retryable(e)
+            _record_error(breaker, e, retryable)
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            delay = policy.delay(attempt, e)
+            record_retry(e, delay)
+            sleep(delay)
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+async def acall_with_retry(
+    func: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker] = None,
+) -> T:
+    """call_with_retry 的异步版本，等待时不阻塞事件循环。"""
+    attempt = 0
+    while True:
+        wait = _admit(breaker)
+        if wait is not None:
+            await asyncio.sleep(wait)
+            continue
+        attempt += 1
+        try:
+            result = await func()
+        except Exception as e:
+            retryable = policy.retryable(e)
+            _record_error(breaker, e, retryable)
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            delay = policy.delay(attempt, e)
+            record_retry(e, delay)
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # 包括任务被取消
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
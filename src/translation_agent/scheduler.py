@@ -0,0 +1,175 @@
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .batchjob import CompletionDeferred
+
+
+# 队列结束标记，优先级最低，保证在所有任务之后被取出
+_STOP = (float("inf"), 0, -1, -1)
+
+
+@dataclass
+class ChunkTiming:
+    """
+    单个块在各阶段的耗时记录。
+
+    属性:
+        index (int): 块的索引。
+        size (int): 用于排序的块大小（字符数）。
+        stages (Dict[str, Tuple[float, float]]): 阶段名称到 (开始, 结束) 的映射，
+            时间为相对于调度开始的秒数。
+    """
+
+    index: int
+    size: int
+    stages: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> float:
+        """该块最后一个阶段的结束时间。"""
+        return max((end for _, end in self.stages.values()), default=0.0)
+
+    def duration(self, stage: str) -> float:
+        """返回指定阶段的耗时（秒）。"""
+        start, end = self.stages[stage]
+        return end - start
+
+
+class DataflowScheduler:
+    """
+    按块推进的数据流调度器。
+
+    每个块在完成上一个阶段后立即进入下一个阶段，而不是等待所有块完成同一阶段。
+    就绪任务中优先执行更靠后的阶段以尽早完成已开始的块，同一阶段中优先执行较长的块，
+    以缩短整体的尾部延迟。
+
+    参数:
+        stages (Sequence[Tuple[str, Callable[[int], Any]]]): 按顺序排列的
+            (阶段名称, 函数) 列表。函数接收块索引并返回该阶段的结果，
+            可以通过 results 读取同一块在前面阶段的结果。
+        max_concurrency (int, 可选): 同时执行的最大任务数。默认为 1。
+        in_order (bool, 可选): 同一阶段中优先执行索引较小的块，而不是较长的块，
+            适合需要按顺序尽早输出结果的场景。默认为 False。
+        on_complete (Callable[[int], None], 可选): 某个块完成最后一个阶段后
+            在工作线程中调用，参数为块索引。
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Tuple[str, Callable[[int], Any]]],
+        max_concurrency: int = 1,
+        in_order: bool = False,
+        on_complete: Optional[Callable[[int], None]] = None,
+    ):
+        self.stages = list(stages)
+        self.max_concurrency = max(1, max_concurrency)
+        self.in_order = in_order
+        self.on_complete = on_complete
+        self.results: Dict[str, List[Any]] = {}
+        self.timings: List[ChunkTiming] = []
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """停止调度尚未开始的任务，正在执行的任务会继续完成。"""
+        self._cancelled = True
+
+    def run(self, sizes: Sequence[int]) -> Dict[str, List[Any]]:
+        """
+        对每个块运行所有阶段。
+
+        参数:
+            sizes (Sequence[int]): 每个块的大小，用于最长优先排序。
+
+        返回:
+            Dict[str, List[Any]]: 阶段名称到按块顺序排列的结果列表的映射。
+        """
+        num_chunks = len(sizes)
+        self.results = {name: [None] * num_chunks for name, _ in self.stages}
+        self.timings = [ChunkTiming(i, sizes[i]) for i in range(num_chunks)]
+        if num_chunks == 0:
+            return self.results
+
+        ready: queue.PriorityQueue = queue.PriorityQueue()
+        lock = threading.Lock()
+        errors: List[BaseException] = []
+        deferred: List[CompletionDeferred] = []
+        pending = [num_chunks]
+        num_workers = min(self.max_concurrency, num_chunks)
+        started = time.perf_counter()
+
+        for i, size in enumerate(sizes):
+            ready.put((0, i if self.in_order else -size, i, 0))
+
+        def worker() -> None:
+            while True:
+                item = ready.get()
+                if item == _STOP:
+                    return
+                _, order, i, stage = item
+                name, func = self.stages[stage]
+                last = stage + 1 == len(self.stages)
+
+                waiting = False
+                if not errors and not self._cancelled:
+                    start = time.perf_counter() - started
+                    try:
+                        self.results[name][i] = func(i)
+                    except CompletionDeferred as e:
+                        # 批处理模式下该块等待结果，其余块继续执行
+                        waiting = True
+                        with lock:
+                            deferred.append(e)
+                    except BaseException as e:
+                        with lock:
+                            errors.append(e)
+                    end = time.perf_counter() - started
+                    self.timings[i].stages[name] = (start, end)
+                    if (
+                        last
+                        and not waiting
+                        and not errors
+                        and self.on_complete is not None
+                    ):
+                        self.on_complete(i)
+
+                with lock:
+                    if (
+                        not errors
+                        and not waiting
+                        and not self._cancelled
+                        and not last
+                    ):
+                        # 越靠后的阶段优先级越高，尽快完成已开始的块
+                        ready.put((-(stage + 1), order, i, stage + 1))
+                        pending[0] += 1
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        for _ in range(num_workers):
+                            ready.put(_STOP)
+
+        if num_workers == 1:
+            worker()
+        else:
+            # 工作线程在调用方上下文的副本中运行
+            context = contextvars.copy_context()
+            threads = [
+                threading.Thread(
+                    target=context.copy().run, args=(worker,), daemon=True
+                )
+                for _ in range(num_workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+        if deferred:
+            raise CompletionDeferred.merge(deferred)
+
+        return self.results
@@ -0,0 +1,360 @@
+import copy
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from .metrics import Histogram, estimate_cost
+from .tracing import add_event, annotate, span
+
+
+@dataclass
+class StageStats:
+    """
+    一个阶段（或一个块）的补全统计。
+
+    属性:
+        calls (int): 实际发出的 API 请求数（重试算作一次）。
+        cached (int): 缓存命中、没有发出请求的补全数。
+        skipped (int): 被 gating 判定为不需要而省去的调用数。
+        retries (int): 请求失败后重试的次数。
+        seconds (float): API 请求耗时之和（秒），并发请求的耗时会叠加。
+        prompt_tokens (int): 提供商报告的提示令牌数之和。
+        completion_tokens (int): 提供商报告的补全令牌数之和。
+        cached_tokens (int): 提示中命中提供商提示缓存的令牌数之和。
+        cost (float): 按 MODEL_PRICES 估算的费用（美元）。
+        latency (Histogram): API 请求耗时的分布。
+    """
+
+    calls: int = 0
+    cached: int = 0
+    skipped: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    latency: Histogram = field(default_factory=Histogram)
+
+
+class PipelineStats:
+    """
+    按阶段和块汇总的补全次数、令牌用量、耗时和费用。
+
+    阶段标签来自 stage_label，翻译流程中的标签为 "initial"、"reflect"、
+    "improve" 和 "fused"；没有标签的补全记在 "completion" 下。多块翻译的
+    补全同时按块索引记在 chunks 中。
+
+    属性:
+        stages (Dict[str, StageStats]): 每个阶段的统计。
+        chunks (Dict[int, StageStats]): 多块翻译中每个块各阶段合计的统计。
+        wall_seconds (float): collect_stats 作用范围的总耗时（秒），退出时写入。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageStats] = {}
+        self.chunks: Dict[int, StageStats] = {}
+        self.wall_seconds = 0.0
+
+    def _targets(self, stage: str, chunk: Optional[int]) -> List[StageStats]:
+        """返回需要更新的统计项，调用方持有锁。"""
+        targets = [self.stages.setdefault(stage, StageStats())]
+        if chunk is not None:
+            targets.append(self.chunks.setdefault(chunk, StageStats()))
+        return targets
+
+    def record(
+        self,
+        stage: str,
+        seconds: float,
+        cached: bool = False,
+        chunk: Optional[int] = None,
+    ) -> None:
+        """记录一次补全。"""
+        with self._lock:
+            for stats in self._targets(stage, chunk):
+                if cached:
+                    stats.cached += 1
+                else:
+                    stats.calls += 1
+                    stats.seconds += seconds
+                    stats.latency.observe(seconds)
+
+    def record_skip(self, stage: str) -> None:
+        """记录一次被省去的调用。"""
+        with self._lock:
+            self.stages.setdefault(stage, StageStats()).skipped += 1
+
+    def record_retry(self, stage: str, chunk: Optional[int] = None) -> None:
+        """记录一次重试。"""
+        with self._lock:
+            for stats in self._targets(stage, chunk):
+                stats.retries += 1
+
+    def record_usage(
+        self,
+        stage: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+        cost: float = 0.0,
+        chunk: Optional[int] = None,
+    ) -> None:
+        """记录一次请求的令牌用量和估算费用。"""
+        with self._lock:
+            for stats in self._targets(stage, chunk):
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+                stats.cached_tokens += cached_tokens
+                stats.cost += cost
+
+    def snapshot(self) -> Dict[str, StageStats]:
+        """返回各阶段统计的副本，供导出时使用。"""
+        with self._lock:
+            return copy.deepcopy(self.stages)
+
+    def _total(self, attribute: str) -> Any:
+        return sum(getattr(stats, attribute) for stats in self.stages.values())
+
+    @property
+    def calls(self) -> int:
+        """所有阶段发出的 API 请求总数。"""
+        return self._total("calls")
+
+    @property
+    def cached(self) -> int:
+        """所有阶段的缓存命中总数。"""
+        return self._total("cached")
+
+    @property
+    def saved(self) -> int:
+        """所有阶段被省去的调用总数。"""
+        return self._total("skipped")
+
+    @property
+    def retries(self) -> int:
+        """所有阶段的重试总数。"""
+        return self._total("retries")
+
+    @property
+    def prompt_tokens(self) -> int:
+        """所有阶段的提示令牌总数。"""
+        return self._total("prompt_tokens")
+
+    @property
+    def completion_tokens(self) -> int:
+        """所有阶段的补全令牌总数。"""
+        return self._total("completion_tokens")
+
+    @property
+    def cached_tokens(self) -> int:
+        """所有阶段命中提示缓存的令牌总数。"""
+        return self._total("cached_tokens")
+
+    @property
+    def cost(self) -> float:
+        """所有阶段的估算费用（美元）。"""
+        return self._total("cost")
+
+    def as_dict(self) -> Dict[str, Any]:
+        """返回便于记录或序列化为 JSON 的字典。"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "cached": self.cached,
+                "saved": self.saved,
+                "retries": self.retries,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cost": self.cost,
+                "wall_seconds": self.wall_seconds,
+                "stages": {
+                    stage: asdict(stats)
+                    for stage, stats in self.stages.items()
+                },
+                "chunks": {
+                    chunk: asdict(stats)
+                    for chunk, stats in self.chunks.items()
+                },
+            }
+
+
+_current_stats: ContextVar[Optional[PipelineStats]] = ContextVar(
+    "translation_agent_pipeline_stats", default=None
+)
+
+_current_stage: ContextVar[str] = ContextVar(
+    "translation_agent_stage", default="completion"
+)
+
+_current_chunk: ContextVar[Optional[int]] = ContextVar(
+    "translation_agent_chunk", default=None
+)
+
+# 进程范围的统计，所有补全都会记入，供服务导出指标；默认不启用
+_global_stats: Optional[PipelineStats] = None
+
+
+def set_global_stats(stats: Optional[PipelineStats]) -> None:
+    """
+    设置进程范围的统计，之后的所有补全都会记入其中，None 表示不启用。
+
+    与 collect_stats 不同，进程范围的统计不限于某个作用范围，适合在服务中
+    用 prometheus_text 或 as_dict 定期导出。
+
+    示例:
+        >>> set_global_stats(PipelineStats())
+        >>> print(prometheus_text(global_stats()))
+    """
+    global _global_stats
+    _global_stats = stats
+
+
+def global_stats() -> Optional[PipelineStats]:
+    """返回进程范围的统计，未启用时返回 None。"""
+    return _global_stats
+
+
+def _sinks() -> List[PipelineStats]:
+    """返回当前需要记录的 PipelineStats。"""
+    return [
+        stats
+        for stats in (_current_stats.get(), _global_stats)
+        if stats is not None
+    ]
+
+
+@contextmanager
+def collect_stats() -> Iterator[PipelineStats]:
+    """
+    在作用范围内统计每个阶段的补全次数和耗时。
+
+    使用 contextvars 传递，translate 内部的线程池、调度器和异步任务都会记录到
+    同一个 PipelineStats 中。
+
+    示例:
+        >>> with collect_stats() as stats:
+        ...     translation = translate(
+        ...         "English", "Spanish", text, "Mexico", pipeline="fused"
+        ...     )
+        >>> stats.calls, stats.stages["fused"].seconds, stats.wall_seconds
+    """
+    stats = PipelineStats()
+    token = _current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.wall_seconds = time.perf_counter() - started
+        _current_stats.reset(token)
+
+
+@contextmanager
+def stage_label(stage: str, chunk: Optional[int] = None) -> Iterator[None]:
+    """
+    把作用范围内的补全记在 stage 阶段下，chunk 为多块翻译中的块索引。
+
+    在 tracing.trace 范围内同时记录一个名为 "call" 的 Span。
+    """
+    stage_token = _current_stage.set(stage)
+    chunk_token = _current_chunk.set(chunk)
+    try:
+        with span("call", stage=stage, chunk=chunk):
+            yield
+    finally:
+        _current_chunk.reset(chunk_token)
+        _current_stage.reset(stage_token)
+
+
+def current_stage() -> str:
+    """返回当前补全所属的阶段标签，不在 stage_label 范围内时为 "completion"。"""
+    return _current_stage.get()
+
+
+def record_completion(seconds: float, cached: bool = False) -> None:
+    """
+    把一次补全记入当前的 PipelineStats，不在 collect_stats 范围内且没有启用
+    进程范围的统计时不做任何事。
+
+    参数:
+        seconds (float): API 请求耗时（秒），缓存命中时为 0。
+        cached (bool, 可选): 是否为缓存命中。
+    """
+    for stats in _sinks():
+        stats.record(
+            _current_stage.get(), seconds, cached, _current_chunk.get()
+        )
+    annotate(seconds=seconds, cached=cached)
+
+
+def record_skip(stage: str) -> None:
+    """把 stage 阶段省去的一次调用记入当前的 PipelineStats。"""
+    for stats in _sinks():
+        stats.record_skip(stage)
+    add_event("skip", stage=stage)
+
+
+def record_retry(
+    error: Optional[BaseException] = None, delay: Optional[float] = None
+) -> None:
+    """
+    把当前阶段的一次重试记入当前的 PipelineStats。
+
+    参数:
+        error (BaseException, 可选): 导致重试的错误。
+        delay (float, 可选): 重试前等待的秒数。
+    """
+    for stats in _sinks():
+        stats.record_retry(_current_stage.get(), _current_chunk.get())
+    add_event(
+        "retry",
+        error=type(error).__name__ if error is not None else None,
+        delay=delay,
+    )
+
+
+def _token_count(value: Any) -> int:
+    """用量字段不是整数（提供商未返回）时按 0 计。"""
+    return value if isinstance(value, int) else 0
+
+
+def record_usage(usage: Any, model: Optional[str] = None) -> None:
+    """
+    把一次请求的令牌用量和估算费用记入当前阶段。
+
+    cached_tokens 取自 usage.prompt_tokens_details.cached_tokens，即提供商的
+    提示缓存复用的前缀令牌数；不支持提示缓存的提供商不返回该字段，按 0 计。
+
+    参数:
+        usage: 补全响应的 usage 字段，可以为 None。
+        model (str, 可选): 请求的模型，用于在 MODEL_PRICES 中查找价格。
+    """
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    prompt_tokens = _token_count(getattr(usage, "prompt_tokens", None))
+    completion_tokens = _token_count(getattr(usage, "completion_tokens", None))
+    cached_tokens = _token_count(getattr(details, "cached_tokens", None))
+    cost = estimate_cost(
+        model, prompt_tokens, completion_tokens, cached_tokens
+    )
+    annotate(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cached_tokens=cached_tokens,
+        cost=cost,
+    )
+    for stats in _sinks():
+        stats.record_usage(
+            _current_stage.get(),
+            prompt_tokens,
+            completion_tokens,
+            cached_tokens,
+            cost,
+            _current_chunk.get(),
+        )
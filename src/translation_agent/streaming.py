@@ -0,0 +1,141 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+
+# 流式请求的参数：要求在最后一个块中返回 usage，用于记录用量和修正 TPM 额度
+STREAM_OPTIONS = {"stream": True, "stream_options": {"include_usage": True}}
+
+
+@dataclass
+class CompletionStream:
+    """
+    流式补全的接收端。
+
+    在 stream_completions 的作用范围内，get_completion 以 STREAM_OPTIONS 调用 API，
+    每收到一段文本就调用 on_delta。同时进行的多个补全共享同一个接收端，
+    它们的增量会交错到达，因此 on_delta 需要是线程安全的。
+
+    请求在流式传输中途失败时，这次尝试已经转发的文本会传给 on_discard，之后的
+    重试会从头重新转发，接收方应把这段文本从已显示的内容中去掉。
+
+    属性:
+        on_delta (Callable[[str], None]): 接收文本增量的回调。缓存命中时
+            整个补全作为一个增量传入。
+        on_discard (Callable[[str], None], 可选): 接收失败尝试已转发文本的回调。
+        time_to_first_token (List[float]): 每个流式补全从发出请求到收到第一段
+            文本的秒数，按完成顺序记录。
+    """
+
+    on_delta: Callable[[str], None]
+    on_discard: Optional[Callable[[str], None]] = None
+    time_to_first_token: List[float] = field(default_factory=list)
+
+    def _discard(self, parts: List[str]) -> None:
+        if parts and self.on_discard is not None:
+            self.on_discard("".join(parts))
+
+    def _receive(self, delta: Optional[str], started: float, parts: List[str]):
+        if not delta:
+            return
+        if not parts:
+            self.time_to_first_token.append(time.perf_counter() - started)
+        parts.append(delta)
+        self.on_delta(delta)
+
+    def consume(self, response: Iterable, started: float) -> Tuple[str, Any]:
+        """
+        读取流式响应，转发每段增量，返回完整的补全文本和用量。
+
+        参数:
+            response (Iterable): 以 STREAM_OPTIONS 调用 chat.completions.create 的返回值。
+            started (float): 发出请求时的 time.perf_counter() 值。
+
+        返回:
+            Tuple[str, Any]: 拼接后的补全文本，以及最后一个块中的 usage；
+                提供商不支持 stream_options 时 usage 为 None。
+        """
+        parts: List[str] = []
+        usage = None
+        try:
+            for chunk in response:
+                if chunk.choices:
+                    self._receive(
+                        chunk.choices[0].delta.content, started, parts
+                    )
+                usage = getattr(chunk, "usage", None) or usage
+        except BaseException:
+            self._discard(parts)
+            raise
+        return "".join(parts), usage
+
+    async def aconsume(
+        self, response: AsyncIterable, started: float
+    ) -> Tuple[str, Any]:
+        """consume 的异步版本。"""
+        parts: List[str] = []
+        usage = None
+        try:
+            async for chunk in response:
+                if chunk.choices:
+                    self._receive(
+                        chunk.choices[0].delta.content, started, parts
+                    )
+                usage = getattr(chunk, "usage", None) or usage
+        except BaseException:
+            self._discard(parts)
+            raise
+        return "".join(parts), usage
+
+
+_current_stream: ContextVar[Optional[CompletionStream]] = ContextVar(
+    "translation_agent_completion_stream", default=None
+)
+
+
+def current_stream() -> Optional[CompletionStream]:
+    """返回当前上下文中的流式接收端，不在 stream_completions 范围内时返回 None。"""
+    return _current_stream.get()
+
+
+@contextmanager
+def stream_completions(
+    on_delta: Callable[[str], None],
+    on_discard: Optional[Callable[[str], None]] = None,
+) -> Iterator[CompletionStream]:
+    """
+    在作用范围内以流式方式生成补全，并把文本增量传给 on_delta。
+
+    使用 contextvars 传递，因此只影响当前线程或协程；translate 内部的线程池和
+    调度器会把调用方的上下文带入工作线程。
+
+    参数:
+        on_delta (Callable[[str], None]): 接收文本增量的回调。
+        on_discard (Callable[[str], None], 可选): 请求中途失败时接收该次尝试
+            已转发文本的回调，见 CompletionStream。
+
+    返回:
+        Iterator[CompletionStream]: 作用范围内使用的接收端，可读取首个令牌延迟。
+
+    示例:
+        >>> with stream_completions(lambda delta: print(delta, end="")) as stream:
+        ...     translation = translate("English", "Spanish", text, "Mexico")
+        >>> stream.time_to_first_token
+    """
+    stream = CompletionStream(on_delta, on_discard)
+    token = _current_stream.set(stream)
+    try:
+        yield stream
+    finally:
+        _current_stream.reset(token)
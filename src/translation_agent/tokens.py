@@ -0,0 +1,70 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+
+if TYPE_CHECKING:
+    import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base") -> "tiktoken.Encoding":
+    """
+    返回缓存的 tiktoken 编码器，避免每次计数都重新查找。
+
+    tiktoken 在第一次调用时才导入，不计入 import translation_agent 的耗时。
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+class TokenizedText:
+    """
+    只编码一次的文本及其令牌的字符偏移量。
+
+    令牌数、任意字符区间的令牌数以及按令牌数切分都基于同一次编码的偏移量，
+    不需要对子串重新分词。
+
+    参数:
+        text (str): 要编码的文本。
+        encoding_name (str, 可选): tiktoken 编码名称。默认为 "cl100k_base"。
+        encoding (tiktoken.Encoding, 可选): 直接使用的编码器，优先于 encoding_name。
+    """
+
+    def __init__(
+        self,
+        text: str,
+        encoding_name: str = "cl100k_base",
+        encoding: Optional["tiktoken.Encoding"] = None,
+    ):
+        if encoding is None:
+            encoding = get_encoding(encoding_name)
+        self.text = text
+        self.tokens = encoding.encode(text)
+        # offsets[k] 是第 k 个令牌在 text 中的起始字符位置，单调不减
+        _, self.offsets = encoding.decode_with_offsets(self.tokens)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def count(self, start: int, end: int) -> int:
+        """返回起始位置落在字符区间 [start, end) 中的令牌数。"""
+        first = bisect_left(self.offsets, start)
+        return bisect_left(self.offsets, end) - first
+
+    def cut(self, start: int, end: int, size: int) -> List[Tuple[int, int]]:
+        """
+        在令牌边界上把字符区间 [start, end) 切成每段最多 size 个令牌的区间。
+        """
+        spans = []
+        first = bisect_left(self.offsets, start)
+        last = bisect_left(self.offsets, end)
+        position = start
+        for k in range(first + size, last, size):
+            boundary = self.offsets[k]
+            if boundary > position:
+                spans.append((position, boundary))
+                position = boundary
+        spans.append((position, end))
+        return spans
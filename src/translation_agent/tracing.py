@@ -0,0 +1,363 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# 每个 Span 的编号，进程内唯一
+_span_ids = itertools.count(1)
+
+
+@dataclass
+class Span:
+    """
+    翻译流程中的一段操作。
+
+    翻译流程产生的 Span 名称：
+        "translate": 一次 translate 或 atranslate 调用。
+        "chunking": 源文本切分，attributes 中有 chunks 和 tokens。
+        "stage": 按阶段执行时的一个阶段，attributes 中有 stage，
+            output 为该阶段的结果（多块翻译时为每块结果的列表）。
+        "call": 一个块在一个阶段中的补全调用，attributes 中有 stage、chunk、
+            seconds、cached 以及提供商报告的令牌数；重试和 gating 省去的调用
+            记为 events 中的 "retry" 和 "skip"。
+
+    属性:
+        name (str): 名称。
+        attributes (Dict[str, Any]): 属性，值为字符串、数字或布尔值。
+        parent_id (int, 可选): 父 Span 的编号。
+        span_id (int): 编号。
+        start (float): 开始时间（time.perf_counter）。
+        end (float, 可选): 结束时间，尚未结束时为 None。
+        events (List[Tuple[str, float, Dict[str, Any]]]): (名称, 时间, 属性) 列表。
+        error (BaseException, 可选): 以异常结束时的异常。
+        output (Any): 阶段的结果，只在进程内使用，不会导出。
+    """
+
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    parent_id: Optional[int] = None
+    span_id: int = field(default_factory=lambda: next(_span_ids))
+    start: float = field(default_factory=time.perf_counter)
+    end: Optional[float] = None
+    events: List[Tuple[str, float, Dict[str, Any]]] = field(
+        default_factory=list
+    )
+    error: Optional[BaseException] = None
+    output: Any = None
+
+    @property
+    def duration(self) -> float:
+        """耗时（秒），尚未结束时计算到当前时间。"""
+        end = time.perf_counter() if self.end is None else self.end
+        return end - self.start
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """设置属性，忽略值为 None 的项。"""
+        self.attributes.update(_present(attributes))
+
+
+class Tracer:
+    """
+    接收 Span 事件的回调接口，子类按需重写其中的方法。
+
+    回调在执行操作的线程或任务中同步调用，应当尽快返回；回调中抛出的异常会
+    中断翻译。
+    """
+
+    def on_span_start(self, span: Span) -> None:
+        """Span 开始时调用。"""
+
+    def on_span_end(self, span: Span) -> None:
+        """Span 结束时调用，此时 end、error 和 output 已经写入。"""
+
+    def on_event(
+        self, span: Span, name: str, attributes: Dict[str, Any]
+    ) -> None:
+        """Span 中发生事件（如重试）时调用。"""
+
+
+_current_tracers: ContextVar[Tuple[Tracer, ...]] = ContextVar(
+    "translation_agent_tracers", default=()
+)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "translation_agent_span", default=None
+)
+
+
+def _present(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value for key, value in attributes.items() if value is not None
+    }
+
+
+@contextmanager
+def trace(*tracers: Tracer) -> Iterator[None]:
+    """
+    在作用范围内把翻译流程的 Span 事件发送给 tracers。
+
+    使用 contextvars 传递，translate 内部的线程池、调度器和异步任务中的事件都
+    会发送给同一组 tracers。嵌套使用时外层的 tracers 同样会收到事件。
+
+    示例:
+        >>> profiler = Profiler()
+        >>> with trace(profiler):
+        ...     translation = translate("English", "Spanish", text, "Mexico")
+        >>> profiler.print_report()
+    """
+    token = _current_tracers.set(_current_tracers.get() + tracers)
+    try:
+        yield
+    finally:
+        _current_tracers.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    在作用范围内记录一个 Span，没有 tracer 时不做任何事并产出 None。
+
+    参数:
+        name (str): Span 的名称。
+        **attributes: Span 的属性，值为 None 的项被忽略。
+    """
+    tracers = _current_tracers.get()
+    if not tracers:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name,
+        _present(attributes),
+        parent.span_id if parent is not None else None,
+    )
+    for tracer in tracers:
+        tracer.on_span_start(current)
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end = time.perf_counter()
+        for tracer in tracers:
+            tracer.on_span_end(current)
+
+
+def annotate(**attributes: Any) -> None:
+    """给当前的 Span 设置属性，不在 Span 中时不做任何事。"""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attributes(**attributes)
+
+
+def record_output(output: Any) -> None:
+    """把阶段的结果记在当前的 Span 上，供 Tracer 在 on_span_end 中读取。"""
+    current = _current_span.get()
+    if current is not None:
+        current.output = output
+
+
+def add_event(name: str, **attributes: Any) -> None:
+    """在当前的 Span 中记录一个事件，不在 Span 中时不做任何事。"""
+    current = _current_span.get()
+    if current is None:
+        return
+    attributes = _present(attributes)
+    current.events.append((name, time.perf_counter(), attributes))
+    for tracer in _current_tracers.get():
+        tracer.on_event(current, name, attributes)
+
+
+def _otel_value(value: Any) -> Any:
+    """OpenTelemetry 的属性只接受字符串、布尔值和数字。"""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    把 Span 转发给 OpenTelemetry，名称加上 "translation_agent." 前缀。
+
+    最外层的 Span 挂在调用方当前的 OpenTelemetry 上下文下，服务中的翻译请求
+    会出现在所在请求的 trace 里。需要安装 opentelemetry-api，导出方式由
+    应用配置的 TracerProvider 决定。
+
+    参数:
+        tracer (opentelemetry.trace.Tracer, 可选): 使用的 OpenTelemetry
+            tracer，默认为 get_tracer("translation_agent")。
+
+    异常:
+        ImportError: 没有安装 opentelemetry-api。
+
+    示例:
+        >>> with trace(OpenTelemetryTracer()):
+        ...     translation = translate("English", "Spanish", text, "Mexico")
+    """
+
+    def __init__(self, tracer: Any = None):
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError as e:
+            raise ImportError(
+                "OpenTelemetryTracer 需要 opentelemetry-api，"
+                "请先安装：pip install opentelemetry-api"
+            ) from e
+
+        self._otel = otel_trace
+        self._tracer = tracer or otel_trace.get_tracer("translation_agent")
+        self._lock = threading.Lock()
+        self._spans: Dict[int, Any] = {}
+
+    def on_span_start(self, span: Span) -> None:
+        with self._lock:
+            parent = self._spans.get(span.parent_id)
+        context = (
+            self._otel.set_span_in_context(parent)
+            if parent is not None
+            else None
+        )
+        otel_span = self._tracer.start_span(
+            f"translation_agent.{span.name}",
+            context=context,
+            attributes={
+                key: _otel_value(value)
+                for key, value in span.attributes.items()
+            },
+        )
+        with self._lock:
+            self._spans[span.span_id] = otel_span
+
+    def on_event(
+        self, span: Span, name: str, attributes: Dict[str, Any]
+    ) -> None:
+        with self._lock:
+            otel_span = self._spans.get(span.span_id)
+        if otel_span is not None:
+            otel_span.add_event(
+                name,
+                {key: _otel_value(value) for key, value in attributes.items()},
+            )
+
+    def on_span_end(self, span: Span) -> None:
+        with self._lock:
+            otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, _otel_value(value))
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(
+                self._otel.Status(self._otel.StatusCode.ERROR)
+            )
+        otel_span.end()
+
+
+def _describe(span: Span) -> str:
+    """Span 的名称及其阶段和块，用于报告。"""
+    details = [
+        f"{key}={span.attributes[key]}"
+        for key in ("stage", "chunk")
+        if key in span.attributes
+    ]
+    return " ".join([span.name, *details])
+
+
+class Profiler(Tracer):
+    """
+    记录一次运行中结束的所有 Span，并找出决定总耗时的关键路径。
+
+    关键路径从最长的顶层 Span 开始，每一层从最后结束的子 Span 向前回溯：
+    依次选取在上一个选中的子 Span 开始前结束的、最晚结束的子 Span。
+    路径上的 Span 串行决定了总耗时，缩短其他 Span 不会让运行更快。
+
+    示例:
+        >>> profiler = Profiler()
+        >>> with trace(profiler):
+        ...     translation = translate("English", "Spanish", text, "Mexico")
+        >>> profiler.print_report()
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def on_span_end(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def _children(self) -> Dict[Optional[int], List[Span]]:
+        with self._lock:
+            spans = list(self.spans)
+        known = {span.span_id for span in spans}
+        children: Dict[Optional[int], List[Span]] = {}
+        for span in spans:
+            parent = span.parent_id if span.parent_id in known else None
+            children.setdefault(parent, []).append(span)
+        return children
+
+    def critical_path(self) -> List[Tuple[int, Span]]:
+        """
+        返回关键路径上的 (深度, Span) 列表，按开始时间排列。
+
+        没有记录任何 Span 时返回空列表。
+        """
+        children = self._children()
+        roots = children.get(None, [])
+        if not roots:
+            return []
+
+        path: List[Tuple[int, Span]] = []
+
+        def walk(span: Span, depth: int) -> None:
+            path.append((depth, span))
+            chosen = []
+            until = span.end
+            candidates = sorted(
+                children.get(span.span_id, []),
+                key=lambda child: child.end,
+                reverse=True,
+            )
+            for child in candidates:
+                if child.end <= until:
+                    chosen.append(child)
+                    until = child.start
+            for child in reversed(chosen):
+                walk(child, depth + 1)
+
+        walk(max(roots, key=lambda root: root.duration), 0)
+        return path
+
+    def report(self) -> str:
+        """
+        返回关键路径的文本报告。
+
+        每行依次为相对开始时间、耗时、占总耗时的比例和 Span 的描述。
+        """
+        path = self.critical_path()
+        if not path:
+            return "没有记录到任何 Span。"
+
+        root = path[0][1]
+        total = root.duration or 1e-9
+        lines = [f"关键路径（总耗时 {root.duration:.3f} 秒）："]
+        for depth, span in path:
+            lines.append(
+                f"{span.start - root.start:9.3f}s {span.duration:9.3f}s "
+                f"{span.duration / total:7.1%}  {'  ' * depth}{_describe(span)}"
+            )
+        return "\n".join(lines)
+
+    def print_report(self) -> None:
+        """打印关键路径的文本报告。"""
+        print(self.report())
@@ -1,31 +1,461 @@
+import contextvars
+import json
 import os
-from typing import List, Union
-
-import openai
-import tiktoken
-from dotenv import load_dotenv
-from icecream import ic
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
+import queue
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-# 读取本地 .env 文件
-load_dotenv()
-# 初始化 OpenAI API 客户端
-client = openai.OpenAI(api_key=os.getenv("GROQ_API_KEY"),
-                       base_url=os.getenv("OpenAI_Compatibility_BASE_URL"),
-            )
+from .batchjob import CompletionDeferred, current_batch_job
+from .cache import CompletionCache
+from .cassette import Cassette, CassetteEntry
+from .chunking import chunk_spans
+from .clients import get_client
+from .context import ContextWindow, as_context_window
+from .debug import ic
+from .gating import NO_CHANGES, ReflectionGate, reflection_is_empty
+from .memory import MemoryMatch, TranslationMemory
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy, breaker_for, call_with_retry
+from .scheduler import ChunkTiming, DataflowScheduler
+from .stats import record_completion, record_skip, record_usage, stage_label
+from .streaming import STREAM_OPTIONS, current_stream
+from .tokens import TokenizedText, get_encoding
+from .tracing import annotate, record_output, span
+
+
+if TYPE_CHECKING:
+    import openai
+
+# OpenAI API 客户端，第一次使用时由 default_client 创建；也可以直接赋值替换
+client: "openai.OpenAI"
 
 # 定义每个文本块的最大令牌数
 MAX_TOKENS_PER_CHUNK = (
     1000  # 如果文本的令牌数超过这个数值，我们将把它分成多个小块，一次翻译一个小块
 )
 
+# 多块翻译时每个阶段同时进行的最大请求数，1 表示逐块顺序调用
+MAX_CONCURRENCY = 1
+
+# 多块翻译的调度方式："stage" 在每个阶段之间等待所有块完成，
+# "dataflow" 让每个块在完成上一阶段后立即进入下一阶段
+SCHEDULES = ("stage", "dataflow")
+
+# 每个块的翻译流程："draft" 只做初始翻译；"fused" 在初始翻译后用一次调用
+# 同时完成反思和改进；"full" 依次进行初始翻译、反思和改进三次调用
+PIPELINES = ("draft", "fused", "full")
+
+# 每种流程中每个块依次经过的阶段，最后一个阶段产出最终翻译
+_PIPELINE_STAGES = {
+    "draft": ("initial",),
+    "fused": ("initial", "fused"),
+    "full": ("initial", "reflect", "improve"),
+}
+_FINAL_STAGES = {
+    pipeline: stages[-1] for pipeline, stages in _PIPELINE_STAGES.items()
+}
+
+# 可选的补全缓存，通过 set_completion_cache 启用
+completion_cache: Optional[CompletionCache] = None
+
+# 可选的录制/回放磁带，通过 set_cassette 启用
+cassette: Optional[Cassette] = None
+
+# 可选的翻译记忆，通过 set_translation_memory 启用
+translation_memory: Optional[TranslationMemory] = None
+
+# 可选的速率限制器，通过 set_rate_limiter 启用
+rate_limiter: Optional[RateLimiter] = None
+
+# 补全请求的重试策略，通过 set_retry_policy 修改或关闭
+retry_policy: Optional[RetryPolicy] = RetryPolicy()
+
+# 可选的反思门控，通过 set_reflection_gate 启用
+reflection_gate: Optional[ReflectionGate] = None
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def load_env() -> None:
+    """
+    读取本地 .env 文件，只在第一次调用时读取，已经设置的环境变量不会被覆盖。
+
+    导入 translation_agent 时不读取 .env，第一次创建客户端或解析默认模型时
+    才调用，因此可以在导入之后再设置环境变量。
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def default_model() -> Optional[str]:
+    """返回环境变量 OpenAI_Compatibility_MODEL 指定的默认模型。"""
+    load_env()
+    return os.getenv("OpenAI_Compatibility_MODEL")
+
+
+def default_client_settings() -> Dict[str, Optional[str]]:
+    """
+    返回创建默认客户端的 api_key 和 base_url，分别来自环境变量 GROQ_API_KEY
+    和 OpenAI_Compatibility_BASE_URL；utils 和 async_utils 共用。
+    """
+    load_env()
+    return {
+        "api_key": os.getenv("GROQ_API_KEY"),
+        "base_url": os.getenv("OpenAI_Compatibility_BASE_URL"),
+    }
+
+
+def default_client() -> "openai.OpenAI":
+    """
+    返回 get_completion 使用的客户端，第一次调用时按环境变量 GROQ_API_KEY 和
+    OpenAI_Compatibility_BASE_URL 创建。
+
+    连接池由 clients 中的注册表共享；给 utils.client 赋值可以替换客户端。
+    """
+    global client
+    if "client" not in globals():
+        client = get_client(**default_client_settings())
+    return client
+
+
+def __getattr__(name: str):
+    # 访问 utils.client 时才创建客户端
+    if name == "client":
+        return default_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def set_completion_cache(cache: Optional[CompletionCache]) -> None:
+    """
+    为 get_completion 设置补全缓存。
+
+    参数:
+        cache (Optional[CompletionCache]): 要使用的缓存，传入 None 则关闭缓存。
+    """
+    global completion_cache
+    completion_cache = cache
+
+
+def set_cassette(tape: Optional[Cassette]) -> None:
+    """
+    为 get_completion 和 aget_completion 设置录制/回放磁带。
+
+    录制模式下实际发出的 API 请求会写入磁带；回放模式下补全从磁带中取出，
+    不访问网络。补全缓存命中和批处理中的补全不经过磁带。
+
+    参数:
+        tape (Optional[Cassette]): 要使用的磁带，传入 None 则关闭。
+    """
+    global cassette
+    cassette = tape
+
+
+def set_translation_memory(memory: Optional[TranslationMemory]) -> None:
+    """
+    设置翻译记忆。
+
+    启用后，完全相同的片段直接复用记忆中的翻译，相似片段作为参考加入初始翻译提示，
+    one_chunk_translate_text 和 multichunk_translation 的最终翻译会自动写回记忆。
+
+    参数:
+        memory (Optional[TranslationMemory]): 要使用的翻译记忆，传入 None 则关闭。
+    """
+    global translation_memory
+    translation_memory = memory
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """
+    为 get_completion 设置速率限制器。
+
+    所有线程和协程共享同一个限制器，可以用 ratelimit.limiter_for 按端点获取。
+
+    参数:
+        limiter (Optional[RateLimiter]): 要使用的限制器，传入 None 则不限制。
+    """
+    global rate_limiter
+    rate_limiter = limiter
+
+
+def set_retry_policy(policy: Optional[RetryPolicy]) -> None:
+    """
+    为 get_completion 设置重试策略。
+
+    限流（429）、超时、连接错误和 5xx 会按策略退避后重试，优先遵循响应中的
+    Retry-After；同一端点连续失败时由断路器暂停发送请求。
+
+    参数:
+        policy (Optional[RetryPolicy]): 要使用的策略，传入 None 则不重试。
+    """
+    global retry_policy
+    retry_policy = policy
+
+
+def set_reflection_gate(gate: Optional[ReflectionGate]) -> None:
+    """
+    设置反思门控。
+
+    启用后，每个块的初始翻译先经过本地检查，通过检查的块直接接受初始翻译，
+    不再调用反思和改进（"fused" 流程中不再调用融合）。无论是否启用，反思表示
+    无需修改时都会跳过改进调用。省去的调用数记录在 collect_stats 的结果中。
+
+    参数:
+        gate (Optional[ReflectionGate]): 要使用的门控，传入 None 则关闭。
+    """
+    global reflection_gate
+    reflection_gate = gate
+
+
+def _skip_review(source_text: str, translation_1: str) -> bool:
+    """门控判定初始翻译无需反思时返回 True。"""
+    gate = reflection_gate
+    return gate is not None and not gate.needs_review(source_text, translation_1)
+
+
+def _call_with_retry(request: Callable[[], T]) -> T:
+    """按当前的重试策略调用 request，使用 client 所在端点的断路器。"""
+    policy = retry_policy
+    if policy is None:
+        return request()
+    return call_with_retry(
+        request, policy, breaker_for(str(default_client().base_url))
+    )
+
+
+def _check_pipeline(pipeline: str) -> None:
+    if pipeline not in PIPELINES:
+        raise ValueError(f"未知的翻译流程：{pipeline}，可选值为 {PIPELINES}")
+
+
+def _estimate_tokens(system_message: str, prompt: str) -> int:
+    """预估一次补全消耗的令牌数：提示令牌数，再加上同样多的补全令牌。"""
+    return 2 * (
+        num_tokens_in_string(system_message) + num_tokens_in_string(prompt)
+    )
+
+
+def _usage_tokens(usage) -> Optional[int]:
+    """返回 usage 中的 total_tokens，没有时返回 None。"""
+    total = getattr(usage, "total_tokens", None)
+    return total if isinstance(total, int) else None
+
+
+def _memory_exact(
+    source_lang: str, target_lang: str, source_text: str, country: str = ""
+) -> Optional[str]:
+    """
+    返回翻译记忆中为 country 保存的 source_text 的已接受翻译：整段精确命中，
+    或者每个句子都精确命中。
+    """
+    memory = translation_memory
+    if memory is None:
+        return None
+    return memory.recall(source_lang, target_lang, source_text, country)
+
+
+def _memory_lookup(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+) -> List[Optional[str]]:
+    """
+    对每个块查找一次翻译记忆，结果传给各阶段，命中的块跳过所有补全。
+    """
+    return [
+        _memory_exact(source_lang, target_lang, chunk, country)
+        for chunk in source_text_chunks
+    ]
+
+
+def _memory_references(
+    source_lang: str, target_lang: str, source_text: str, country: str = ""
+) -> str:
+    """
+    返回翻译记忆中各句子的已接受翻译和相似片段组成的参考段落，没有翻译记忆
+    或没有可参考的片段时返回空字符串。
+    """
+    memory = translation_memory
+    if memory is None:
+        return ""
+
+    matches: List[MemoryMatch] = memory.references(
+        source_lang, target_lang, source_text, country=country
+    )
+    if not matches:
+        return ""
+
+    references = "\n\n".join(
+        f"{source_lang}: {match.source}\n{target_lang}: {match.translation}"
+        for match in matches
+    )
+    return f"""以下是翻译记忆中与源文本相似的片段及其已接受的翻译，由 XML 标签 <REFERENCES> 和 </REFERENCES> 界定。请参考其中的术语和风格，但只翻译源文本。
+
+<REFERENCES>
+{references}
+</REFERENCES>
+
+"""
+
+
+def _memory_write_back(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_chunks: List[str],
+    country: str = "",
+) -> None:
+    """将为 country 完成的最终翻译写回翻译记忆，能逐句对齐的块同时写入每个句子。"""
+    memory = translation_memory
+    if memory is None:
+        return
+    for source_text, translation in zip(source_text_chunks, translation_chunks):
+        memory.learn(
+            source_lang, target_lang, source_text, translation, country
+        )
+
+
+class _CompletionCall:
+    """
+    一次补全中与 I/O 无关的步骤，get_completion 和 aget_completion 共用：
+    查找和写入补全缓存、批处理作业和磁带，构建请求参数，记录用量并结算速率
+    限制。两个版本只各自负责等待回放、速率限制、请求和重试。
+    """
+
+    def __init__(
+        self,
+        prompt: str,
+        system_message: str,
+        model: Optional[str],
+        temperature: float,
+        json_mode: bool,
+    ):
+        self.prompt = prompt
+        self.system_message = system_message
+        self.model = model if model is not None else default_model()
+        self.temperature = temperature
+        self.json_mode = json_mode
+        self.stream = current_stream()
+        self.cache = completion_cache
+        self.tape = cassette
+        args = (self.model, system_message, prompt, temperature, json_mode)
+        self.key = self.cache.key(*args) if self.cache is not None else None
+        self.tape_key = self.tape.key(*args) if self.tape is not None else None
+
+    def lookup(self) -> Optional[str]:
+        """返回补全缓存或批处理作业中的补全，需要继续回放或请求时返回 None。"""
+        if self.cache is not None:
+            cached = self.cache.get(self.key)
+            if cached is not None:
+                if self.stream is not None:
+                    self.stream.on_delta(cached)
+                record_completion(0.0, cached=True)
+                return cached
+
+        # 在 batch_mode 范围内从批处理结果中取补全，没有结果时推迟
+        job = current_batch_job()
+        if job is not None:
+            content = job.complete(
+                self.model,
+                self.system_message,
+                self.prompt,
+                self.temperature,
+                self.json_mode,
+            )
+            if self.cache is not None:
+                self.cache.set(self.key, content)
+            return content
+        return None
+
+    def replay(self) -> Optional[CassetteEntry]:
+        """回放模式下返回磁带中录制的补全，调用方按 tape.delay 等待后交给 replayed。"""
+        if self.tape is None or self.tape.recording:
+            return None
+        return self.tape.lookup(self.tape_key)
+
+    def replayed(self, entry: CassetteEntry, elapsed: float) -> str:
+        if self.stream is not None:
+            self.stream.on_delta(entry.content)
+        record_completion(elapsed)
+        if self.cache is not None:
+            self.cache.set(self.key, entry.content)
+        return entry.content
+
+    def reserve(self) -> Tuple[Optional[RateLimiter], int]:
+        """返回速率限制器和要申请的令牌数，只有设置了 TPM 时才需要预估令牌数。"""
+        limiter = rate_limiter
+        estimated = 0
+        if limiter is not None and limiter.tpm:
+            estimated = _estimate_tokens(self.system_message, self.prompt)
+        return limiter, estimated
+
+    def create_kwargs(self) -> Dict[str, Any]:
+        """chat.completions.create 的参数。"""
+        kwargs: Dict[str, Any] = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "top_p": 1,
+            "messages": [
+                {"role": "system", "content": self.system_message},
+                {"role": "user", "content": self.prompt},
+            ],
+        }
+        if self.json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        # 在 stream_completions 范围内以流式方式接收补全
+        if self.stream is not None:
+            kwargs.update(STREAM_OPTIONS)
+        return kwargs
+
+    @staticmethod
+    def read(response) -> Tuple[str, Any]:
+        """返回非流式响应的 (补全, usage)。"""
+        return response.choices[0].message.content, getattr(
+            response, "usage", None
+        )
+
+    def settle(
+        self, limiter: Optional[RateLimiter], estimated: int, usage
+    ) -> None:
+        """记录 usage，并按实际令牌数结算 reserve 申请的额度。"""
+        record_usage(usage, self.model)
+        if limiter is not None:
+            limiter.settle(estimated, _usage_tokens(usage))
+
+    def finish(self, content: str, elapsed: float) -> str:
+        """记录请求的耗时，并把补全写入正在录制的磁带和补全缓存。"""
+        record_completion(elapsed)
+        if content is None:
+            return content
+        if self.tape is not None and self.tape.recording:
+            self.tape.record(self.tape_key, content, elapsed)
+        if self.cache is not None:
+            self.cache.set(self.key, content)
+        return content
 
 
 def get_completion(
     prompt: str,
     system_message: str = "你是一个提供帮助的助手。",
-    model: str = os.getenv("OpenAI_Compatibility_MODEL"),
+    model: Optional[str] = None,
     temperature: float = 0.3,
     json_mode: bool = False,
 ) -> Union[str, dict]:
@@ -37,7 +467,7 @@ def get_completion(
         system_message (str, 可选): 为助手设置上下文的系统消息。
             默认为 "你是一个提供帮助的助手。"。
         model (str, 可选): 用于生成补全的 OpenAI 模型的名称。
-            默认为 "llama-3.1-70b-versatile"。
+            默认为 default_model()，即环境变量 OpenAI_Compatibility_MODEL。
         temperature (float, 可选): 控制生成文本的随机性的采样温度。
             默认为 0.3。
         json_mode (bool, 可选): 是否以 JSON 格式返回响应。
@@ -49,33 +479,66 @@ def get_completion(
             如果 json_mode 为 False，则返回生成的文本作为一个字符串。
     """
 
-    if json_mode:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            top_p=1,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
-        )
-        return response.choices[0].message.content
-    else:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            top_p=1,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
-        )
-        return response.choices[0].message.content
+    call = _CompletionCall(
+        prompt, system_message, model, temperature, json_mode
+    )
+    content = call.lookup()
+    if content is not None:
+        return content
+
+    # 回放模式下从磁带中取补全，按录制时的耗时（乘以缩放比例）等待
+    entry = call.replay()
+    if entry is not None:
+        started = time.perf_counter()
+        time.sleep(call.tape.delay(entry))
+        return call.replayed(entry, time.perf_counter() - started)
+
+    def request() -> str:
+        limiter, estimated = call.reserve()
+        if limiter is not None:
+            limiter.acquire(estimated)
+
+        client = default_client()
+        started = time.perf_counter()
+        response = client.chat.completions.create(**call.create_kwargs())
+        if call.stream is not None:
+            content, usage = call.stream.consume(response, started)
+        else:
+            content, usage = call.read(response)
+        call.settle(limiter, estimated, usage)
+        return content
+
+    # 失败时只重试这一次调用，已完成的其他补全不受影响
+    started = time.perf_counter()
+    content = _call_with_retry(request)
+    return call.finish(content, time.perf_counter() - started)
+
+
+def _one_chunk_initial_prompt(
+    source_lang: str, target_lang: str, source_text: str, country: str = ""
+) -> Tuple[str, str]:
+    """构建单块初始翻译的系统消息和提示，返回 (system_message, prompt)。"""
+
+    # 设置系统信息，指明翻译方向
+    system_message = f"您是一位专业的语言学家，专注于从 {source_lang} 到 {target_lang} 的翻译。"
+
+    # 翻译记忆中相似片段的参考，没有时为空字符串
+    references = _memory_references(
+        source_lang, target_lang, source_text, country
+    )
+
+    # 构建翻译提示，指定翻译任务和源文本
+    translation_prompt = f"""这是一段从 {source_lang} 到 {target_lang} 的翻译，请为这段文本提供 {target_lang} 的翻译。
+{_country_requirement(target_lang, country)}不要提供除翻译外的任何解释或文本。
+{references}{source_lang}: {source_text}
+
+{target_lang}:"""
+
+    return system_message, translation_prompt
 
 
 def one_chunk_initial_translation(
-    source_lang: str, target_lang: str, source_text: str
+    source_lang: str, target_lang: str, source_text: str, country: str = ""
 ) -> str:
     """
     使用大型语言模型将整个文本作为一个块进行翻译。
@@ -84,47 +547,34 @@ def one_chunk_initial_translation(
         source_lang (str): 文本的源语言。
         target_lang (str): 翻译的目标语言。
         source_text (str): 要翻译的文本。
+        country (str, 可选): 为目标语言指定的国家，指定时提示中要求符合
+            该国家的语言风格。默认为空字符串。
 
     返回:
         str: 翻译后的文本。
     """
 
-    # 设置系统信息，指明翻译方向
-    system_message = f"您是一位专业的语言学家，专注于从 {source_lang} 到 {target_lang} 的翻译。"
-
-    # 构建翻译提示，指定翻译任务和源文本
-    translation_prompt = f"""这是一段从 {source_lang} 到 {target_lang} 的翻译，请为这段文本提供 {target_lang} 的翻译。
-不要提供除翻译外的任何解释或文本。
-{source_lang}: {source_text}
-
-{target_lang}:"""
+    system_message, translation_prompt = _one_chunk_initial_prompt(
+        source_lang, target_lang, source_text, country
+    )
 
     # 调用 get_completion 函数获取翻译结果
-    translation = get_completion(translation_prompt, system_message=system_message)
+    with stage_label("initial"):
+        translation = get_completion(
+            translation_prompt, system_message=system_message
+        )
 
     return translation
 
 
-def one_chunk_reflect_on_translation(
+def _one_chunk_reflect_prompt(
     source_lang: str,
     target_lang: str,
     source_text: str,
     translation_1: str,
     country: str = "",
-) -> str:
-    """
-    利用大型语言模型反思翻译过程，将整个文本视为一个单一的块。
-
-    参数:
-        source_lang (str): 文本的源语言。
-        target_lang (str): 翻译的目标语言。
-        source_text (str): 原文。
-        translation_1 (str): 源文本的初始翻译。
-        country (str): 目标语言对应的国家。
-
-    返回:
-        str: 语言模型对翻译的反思，提供建设性的批评和改进建议。
-    """
+) -> Tuple[str, str]:
+    """构建单块反思的系统消息和提示，返回 (system_message, prompt)。"""
 
     system_message = f"您是专注于从 {source_lang} 翻译到 {target_lang} 的专家语言学家。您将获得一个源文本及其翻译，目标是改进翻译。"
 
@@ -150,7 +600,7 @@ def one_chunk_reflect_on_translation(
 
 为改进翻译写一份具体、有用和建设性的建议清单。
 每条建议应针对翻译的一个具体部分。
-只输出建议，不要输出其他任何内容。"""
+只输出建议，不要输出其他任何内容。如果翻译已经没有需要改进之处，只输出“无需修改”。"""
 
     else:
         reflection_prompt = f"""您的任务是仔细阅读从 {source_lang} 到 {target_lang} 的源文本和翻译，并给出建设性的批评和有用的建议来改进翻译。
@@ -173,33 +623,52 @@ def one_chunk_reflect_on_translation(
 
 为改进翻译写一份具体、有用和建设性的建议清单。
 每条建议应针对翻译的一个具体部分。
-只输出建议，不要输出其他任何内容。"""
+只输出建议，不要输出其他任何内容。如果翻译已经没有需要改进之处，只输出“无需修改”。"""
 
-    reflection = get_completion(reflection_prompt, system_message=system_message)
-    return reflection
+    return system_message, reflection_prompt
 
 
-def one_chunk_improve_translation(
+def one_chunk_reflect_on_translation(
     source_lang: str,
     target_lang: str,
     source_text: str,
     translation_1: str,
-    reflection: str,
+    country: str = "",
 ) -> str:
     """
-    利用反思来改进翻译，将整个文本作为一个单一的块进行处理。
+    利用大型语言模型反思翻译过程，将整个文本视为一个单一的块。
 
     参数:
         source_lang (str): 文本的源语言。
         target_lang (str): 翻译的目标语言。
-        source_text (str): 源语言的原始文本。
+        source_text (str): 原文。
         translation_1 (str): 源文本的初始翻译。
-        reflection (str): 专家对改进翻译的建议和建设性批评。
+        country (str): 目标语言对应的国家。
 
     返回:
-        str: 根据专家的建议改进后的翻译。
+        str: 语言模型对翻译的反思，提供建设性的批评和改进建议。
     """
 
+    system_message, reflection_prompt = _one_chunk_reflect_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+
+    with stage_label("reflect"):
+        reflection = get_completion(
+            reflection_prompt, system_message=system_message
+        )
+    return reflection
+
+
+def _one_chunk_improve_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    reflection: str,
+) -> Tuple[str, str]:
+    """构建单块改进翻译的系统消息和提示，返回 (system_message, prompt)。"""
+
     system_message = f"您是专注于从 {source_lang} 到 {target_lang} 的翻译编辑专家。"
 
     prompt = f"""您的任务是仔细阅读并编辑从 {source_lang} 到 {target_lang} 的翻译，同时考虑专家的建议和建设性批评。
@@ -228,381 +697,1326 @@ def one_chunk_improve_translation(
 
 只输出新的翻译，不要输出其他任何内容。"""
 
-    translation_2 = get_completion(prompt, system_message)
-
-    return translation_2
+    return system_message, prompt
 
 
-def one_chunk_translate_text(
-    source_lang: str, 
-    target_lang: str, 
-    source_text: str, 
-    country: str = ""
+def one_chunk_improve_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    reflection: str,
 ) -> str:
     """
-    将单一文本块从源语言翻译到目标语言。
-
-    该函数执行一个两步翻译过程：
-    1. 获取源文本的初始翻译。
-    2. 反思初始翻译并生成改进后的翻译。
+    利用反思来改进翻译，将整个文本作为一个单一的块进行处理。
 
     参数:
         source_lang (str): 文本的源语言。
         target_lang (str): 翻译的目标语言。
-        source_text (str): 要翻译的文本。
-        country (str): 为目标语言指定的国家。
+        source_text (str): 源语言的原始文本。
+        translation_1 (str): 源文本的初始翻译。
+        reflection (str): 专家对改进翻译的建议和建设性批评。
 
     返回:
-        str: 源文本的改进翻译。
+        str: 根据专家的建议改进后的翻译。
     """
-    # 获取源文本的初始翻译
-    translation_1 = one_chunk_initial_translation(
-        source_lang, target_lang, source_text
-    )
 
-    # 反思初始翻译，并生成改进建议
-    reflection = one_chunk_reflect_on_translation(
-        source_lang, target_lang, source_text, translation_1, country
-    )
-
-    # 根据反思建议改进翻译
-    translation_2 = one_chunk_improve_translation(
+    system_message, prompt = _one_chunk_improve_prompt(
         source_lang, target_lang, source_text, translation_1, reflection
     )
 
-    return translation_2
+    with stage_label("improve"):
+        translation_2 = get_completion(prompt, system_message)
 
+    return translation_2
 
-def num_tokens_in_string(
-    input_str: str, 
-    encoding_name: str = "cl100k_base"
-) -> int:
-    """
-    使用指定的编码计算给定字符串中的令牌数量。
 
-    参数:
-        input_str (str): 要被分词的输入字符串。
-        encoding_name (str, 可选): 要使用的编码名称。默认为 "cl100k_base"，
-            这是最常用的编码器（由 GPT-4 使用）。
+# 融合调用的输出要求，JSON 模式要求提示中出现 "JSON"
+_FUSED_OUTPUT = """以 JSON 对象输出结果，只包含两个字段："critique" 为改进建议清单（字符串），"translation" 为根据这些建议改进后的翻译（字符串）。
+不要输出 JSON 之外的任何内容。"""
 
-    返回:
-        int: 输入字符串中的令牌数量。
 
-    示例:
-        >>> text = "你好，你好吗？"
-        >>> num_tokens = num_tokens_in_string(text)
-        >>> print(num_tokens)
-        5
-    """
-    # 获取指定名称的编码器
-    encoding = tiktoken.get_encoding(encoding_name)
-    # 计算并返回输入字符串的令牌数量
-    num_tokens = len(encoding.encode(input_str))
-    return num_tokens
+def _country_requirement(target_lang: str, country: str) -> str:
+    """返回对目标国家语言风格的要求，未指定国家时为空字符串。"""
+    if country == "":
+        return ""
+    return f"翻译的最终风格和语调应符合在 {country} 通常说的 {target_lang}。\n"
 
 
-def multichunk_initial_translation(
-    source_lang: str, 
-    target_lang: str, 
-    source_text_chunks: List[str]
-) -> List[str]:
+def _parse_fused(content: str, translation_1: str) -> str:
     """
-    将文本分成多个块从源语言翻译到目标语言。
+    从融合调用的 JSON 输出中取出改进后的翻译。
+
+    输出不是有效的 JSON 或缺少 translation 字段时保留初始翻译。
+    """
+    try:
+        translation = json.loads(content).get("translation")
+    except (AttributeError, TypeError, ValueError):
+        translation = None
+    if not isinstance(translation, str) or not translation.strip():
+        ic("融合调用没有返回有效的翻译，保留初始翻译")
+        return translation_1
+    return translation
+
+
+def _one_chunk_fused_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+) -> Tuple[str, str]:
+    """构建单块融合反思与改进的系统消息和提示，返回 (system_message, prompt)。"""
+
+    system_message = f"您是专注于从 {source_lang} 到 {target_lang} 翻译的专家语言学家和编辑。您将获得一个源文本及其翻译，需要先给出批评，再据此改进翻译。"
+
+    prompt = f"""您的任务是仔细阅读从 {source_lang} 到 {target_lang} 的源文本和翻译，先写出改进翻译的具体建议，再根据这些建议重写翻译。
+{_country_requirement(target_lang, country)}
+源文本和初始翻译由 XML 标签 <SOURCE_TEXT></SOURCE_TEXT> 和 <TRANSLATION></TRANSLATION> 界定，如下所示：
+
+<SOURCE_TEXT>
+{source_text}
+</SOURCE_TEXT>
+
+<TRANSLATION>
+{translation_1}
+</TRANSLATION>
+
+在写建议和重写翻译时，注意是否有方法改进翻译的：
+(i) 准确性（通过纠正增加的错误、误译、遗漏或未翻译的文本），
+(ii) 流畅性（应用 {target_lang} 的语法、拼写和标点规则，并确保没有不必要的重复），
+(iii) 风格（确保翻译反映源文本的风格并考虑任何文化背景），
+(iv) 术语（确保术语的使用一致并反映源文本的领域；并且只确保使用等效的 {target_lang} 成语）。
+
+{_FUSED_OUTPUT}"""
+
+    return system_message, prompt
+
+
+def one_chunk_fused_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+) -> str:
+    """
+    用一次调用完成反思和改进，将整个文本作为一个单一的块进行处理。
+
+    模型以 JSON 模式同时输出批评和改进后的翻译，省去反思与改进之间的一次往返。
 
     参数:
         source_lang (str): 文本的源语言。
         target_lang (str): 翻译的目标语言。
-        source_text_chunks (List[str]: 要翻译的文本块列表。
+        source_text (str): 源语言的原始文本。
+        translation_1 (str): 源文本的初始翻译。
+        country (str): 目标语言对应的国家。
 
     返回:
-        List[str]: 翻译后的文本块列表。
+        str: 改进后的翻译；模型输出无效时返回初始翻译。
+    """
+
+    system_message, prompt = _one_chunk_fused_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+
+    with stage_label("fused"):
+        content = get_completion(prompt, system_message, json_mode=True)
+
+    return _parse_fused(content, translation_1)
+
+
+# 流程中需要补全的一步：(阶段, 调用该阶段函数的位置参数)
+_Step = Tuple[str, tuple]
+
+
+def _step(stage: str, *args: Any) -> _Step:
+    return stage, args
+
+
+def _run_steps(
+    steps: Generator[_Step, Any, T], functions: Dict[str, Callable[..., Any]]
+) -> T:
+    """
+    执行 steps 产出的每一步：用 functions 中对应阶段的函数计算结果并送回 steps，
+    函数抛出的异常抛回 steps，使其中的 span 记录到错误。
+
+    同步和异步版本共用同一个 steps，流程的决策只写一次，async_utils 中的
+    _arun_steps 只把调用换成 await。
+
+    返回:
+        T: steps 的返回值。
+    """
+    try:
+        stage, args = next(steps)
+        while True:
+            try:
+                result = functions[stage](*args)
+            except BaseException as e:
+                stage, args = steps.throw(e)
+            else:
+                stage, args = steps.send(result)
+    except StopIteration as e:
+        return e.value
+
+
+def _one_chunk_steps(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str,
+    pipeline: str,
+) -> Generator[_Step, Any, str]:
+    """one_chunk_translate_text 的流程，见 _run_steps。"""
+    _check_pipeline(pipeline)
+
+    # 翻译记忆中有完全相同的片段时直接复用
+    reused = _memory_exact(source_lang, target_lang, source_text, country)
+    if reused is not None:
+        return reused
+
+    # 获取源文本的初始翻译
+    with span("stage", stage="initial"):
+        translation_1 = yield _step(
+            "initial",
+            source_lang,
+            target_lang,
+            source_text,
+            country,
+        )
+        record_output(translation_1)
+
+    # 草稿不写回翻译记忆，以免之后的完整翻译直接复用较低质量的译文
+    if pipeline == "draft":
+        return translation_1
+
+    # 门控检查通过时直接接受初始翻译
+    skip_review = _skip_review(source_text, translation_1)
+
+    if pipeline == "fused":
+        with span("stage", stage="fused"):
+            if skip_review:
+                record_skip("fused")
+                translation_2 = translation_1
+            else:
+                translation_2 = yield _step(
+                    "fused",
+                    source_lang,
+                    target_lang,
+                    source_text,
+                    translation_1,
+                    country,
+                )
+            record_output(translation_2)
+    else:
+        # 反思初始翻译，并生成改进建议
+        with span("stage", stage="reflect"):
+            if skip_review:
+                record_skip("reflect")
+                reflection = NO_CHANGES
+            else:
+                reflection = yield _step(
+                    "reflect",
+                    source_lang,
+                    target_lang,
+                    source_text,
+                    translation_1,
+                    country,
+                )
+            record_output(reflection)
+
+        # 根据反思建议改进翻译，反思无需修改时保留初始翻译
+        with span("stage", stage="improve"):
+            if reflection_is_empty(reflection):
+                record_skip("improve")
+                translation_2 = translation_1
+            else:
+                translation_2 = yield _step(
+                    "improve",
+                    source_lang,
+                    target_lang,
+                    source_text,
+                    translation_1,
+                    reflection,
+                )
+            record_output(translation_2)
+
+    _memory_write_back(
+        source_lang, target_lang, [source_text], [translation_2], country
+    )
+
+    return translation_2
+
+
+def one_chunk_translate_text(
+    source_lang: str, 
+    target_lang: str, 
+    source_text: str, 
+    country: str = "",
+    pipeline: str = "full",
+) -> str:
+    """
+    将单一文本块从源语言翻译到目标语言。
+
+    该函数执行一个两步翻译过程：
+    1. 获取源文本的初始翻译。
+    2. 反思初始翻译并生成改进后的翻译。
+
+    参数:
+        source_lang (str): 文本的源语言。
+        target_lang (str): 翻译的目标语言。
+        source_text (str): 要翻译的文本。
+        country (str): 为目标语言指定的国家。
+        pipeline (str, 可选): "full" 分别调用反思和改进；"fused" 用一次调用
+            完成反思和改进；"draft" 只返回初始翻译。默认为 "full"。
+
+    返回:
+        str: 源文本的改进翻译。
+    """
+    return _run_steps(
+        _one_chunk_steps(
+            source_lang, target_lang, source_text, country, pipeline
+        ),
+        {
+            "initial": one_chunk_initial_translation,
+            "reflect": one_chunk_reflect_on_translation,
+            "improve": one_chunk_improve_translation,
+            "fused": one_chunk_fused_translation,
+        },
+    )
+
+
+def num_tokens_in_string(
+    input_str: str, 
+    encoding_name: str = "cl100k_base"
+) -> int:
+    """
+    使用指定的编码计算给定字符串中的令牌数量。
+
+    参数:
+        input_str (str): 要被分词的输入字符串。
+        encoding_name (str, 可选): 要使用的编码名称。默认为 "cl100k_base"，
+            这是最常用的编码器（由 GPT-4 使用）。
+
+    返回:
+        int: 输入字符串中的令牌数量。
+
+    示例:
+        >>> text = "你好，你好吗？"
+        >>> num_tokens = num_tokens_in_string(text)
+        >>> print(num_tokens)
+        5
+    """
+    # 获取指定名称的编码器（已缓存）
+    encoding = get_encoding(encoding_name)
+    # 计算并返回输入字符串的令牌数量
+    num_tokens = len(encoding.encode(input_str))
+    return num_tokens
+
+
+@lru_cache(maxsize=1024)
+def _chunk_tokens(chunk: str) -> int:
+    """缓存每个块的令牌数，供上下文窗口的令牌预算反复使用。"""
+    return num_tokens_in_string(chunk)
+
+
+def _shared_context(
+    source_text_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+) -> str:
+    """
+    返回第 i 块提示中作为上下文的源文本，不带任何标签。
+
+    未指定 context_window 时为完整源文本，所有块和阶段完全相同；否则只包含
+    窗口内的相邻块，同一个块的各个阶段相同。
+    """
+    start, end = 0, len(source_text_chunks)
+    if context_window is not None:
+        start, end = context_window.bounds(
+            source_text_chunks, i, _chunk_tokens
+        )
+    return "".join(source_text_chunks[start:end])
+
+
+def _multichunk_system_message(source_lang: str, target_lang: str) -> str:
+    """多块翻译所有阶段共用的系统消息。"""
+    return f"您是专注于从 {source_lang} 到 {target_lang} 翻译和编辑的专家语言学家。您将分块翻译一篇较长的源文本，每次只处理其中的一块。"
+
+
+def _multichunk_prompt(
+    source_lang: str,
+    source_text_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow],
+    task: str,
+) -> str:
     """
+    按利于提示缓存的顺序拼接第 i 块的提示。
 
-    system_message = f"您是一位专注于从 {source_lang} 到 {target_lang} 的专业翻译专家。"
+    提供商的提示缓存只复用完全相同的前缀，所以各个块和各个阶段共用的源文本
+    放在最前面，随后是阶段的任务说明，块本身、翻译和建议等每块不同的内容
+    放在最后。
 
-    translation_prompt = """您的任务是提供文本部分的专业翻译，从 {source_lang} 到 {target_lang}。
+    参数:
+        source_lang (str): 源语言。
+        source_text_chunks (List[str]): 分块的源文本。
+        i (int): 要处理的块的索引。
+        context_window (ContextWindow, 可选): 上下文范围。
+        task (str): 阶段的任务说明和块相关的内容。
 
-源文本如下，由 XML 标签 <SOURCE_TEXT> 和 </SOURCE_TEXT> 界定。只翻译源文本中由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定的部分。
-您可以使用其余的源文本作为上下文，但不要翻译其他文本。除了指定部分的翻译外，不要输出任何其他内容。
+    返回:
+        str: 完整的提示。
+    """
+    return f"""下面是一篇 {source_lang} 源文本，由 XML 标签 <SOURCE_TEXT> 和 </SOURCE_TEXT> 界定。源文本已被分成多个块，每次只处理其中的一块，其余的源文本仅作为上下文。
 
 <SOURCE_TEXT>
-{tagged_text}
+{_shared_context(source_text_chunks, i, context_window)}
 </SOURCE_TEXT>
 
-再次强调，只翻译文本的这一部分，如 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 之间所示：
-<TRANSLATE_THIS>
-{chunk_to_translate}
-</TRANSLATE_THIS>
+{task}
+
+本次处理的是第 {i + 1} 块（共 {len(source_text_chunks)} 块），由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定：
+<TRANSLATE_THIS>
+{source_text_chunks[i]}
+</TRANSLATE_THIS>
+"""
+
+
+def _map_chunks(
+    func: Callable[[int], T],
+    num_chunks: int,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> List[T]:
+    """
+    对每个块索引调用 func，最多同时执行 max_concurrency 个调用。
+
+    参数:
+        func (Callable[[int], T]): 接收块索引并返回该块结果的函数。
+        num_chunks (int): 块的数量。
+        max_concurrency (int, 可选): 最大并发数。小于等于 1 时顺序执行。
+
+    返回:
+        List[T]: 按块顺序排列的结果列表。
+
+    异常:
+        CompletionDeferred: 批处理模式下有块等待结果。所有块都会先执行完，
+            使同一阶段的请求进入同一个批次。
+    """
+    deferred: List[CompletionDeferred] = []
+
+    def call(i: int) -> Optional[T]:
+        try:
+            return func(i)
+        except CompletionDeferred as e:
+            deferred.append(e)
+            return None
+
+    if max_concurrency <= 1 or num_chunks <= 1:
+        results = [call(i) for i in range(num_chunks)]
+    else:
+        # 每个任务在调用方上下文的副本中运行，使 stream_completions 等设置对工作线程可见
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(
+            max_workers=min(max_concurrency, num_chunks)
+        ) as executor:
+            results = list(
+                executor.map(
+                    lambda i: context.copy().run(call, i), range(num_chunks)
+                )
+            )
+
+    if deferred:
+        raise CompletionDeferred.merge(deferred)
+    return results
+
+
+def _multichunk_initial_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+) -> Tuple[str, str]:
+    """构建第 i 块的系统消息和提示，返回 (system_message, prompt)。"""
+
+    system_message = _multichunk_system_message(source_lang, target_lang)
+
+    task = f"""您的任务是提供文本部分的专业翻译，从 {source_lang} 到 {target_lang}。
+只翻译由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定的部分。您可以使用其余的源文本作为上下文，但不要翻译其他文本。"""
+
+    # 将要翻译第 i 块，翻译记忆的参考译文每块不同，放在块之后
+    prompt = _multichunk_prompt(
+        source_lang, source_text_chunks, i, context_window, task
+    )
+    prompt += f"""
+{_memory_references(source_lang, target_lang, source_text_chunks[i])}只输出您被要求翻译的部分的翻译，不要输出其他任何内容。
+"""
+
+    return system_message, prompt
+
+
+def _initial_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """翻译第 i 块；reused 是翻译记忆中该块的翻译，有时直接复用。"""
+    if reused is not None:
+        return reused
+
+    system_message, prompt = _multichunk_initial_prompt(
+        source_lang, target_lang, source_text_chunks, i, context_window
+    )
+
+    with stage_label("initial", i):
+        return get_completion(prompt, system_message=system_message)
+
+
+def multichunk_initial_translation(
+    source_lang: str, 
+    target_lang: str, 
+    source_text_chunks: List[str],
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
+) -> List[str]:
+    """
+    将文本分成多个块从源语言翻译到目标语言。
+
+    参数:
+        source_lang (str): 文本的源语言。
+        target_lang (str): 翻译的目标语言。
+        source_text_chunks (List[str]: 要翻译的文本块列表。
+        max_concurrency (int, 可选): 同时翻译的最大块数。
+        context_window (ContextWindow, 可选): 每个块的提示中包含的上下文范围。
+            默认为 None，即包含整个源文本。
+        reused_chunks (List[Optional[str]], 可选): 每个块在翻译记忆中的翻译，
+            见 _memory_lookup。默认为 None，即在这里查找。
+
+    返回:
+        List[str]: 翻译后的文本块列表。
+    """
+
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks
+        )
+
+    def translate_chunk(i: int) -> str:
+        return _initial_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    translation_chunks = _map_chunks(
+        translate_chunk, len(source_text_chunks), max_concurrency
+    )
+
+    return translation_chunks
+
+
+def _multichunk_reflect_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str,
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+) -> Tuple[str, str]:
+    """构建第 i 块的系统消息和提示，返回 (system_message, prompt)。"""
+
+    system_message = _multichunk_system_message(source_lang, target_lang)
+
+    task = f"""您的任务是仔细阅读由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定的部分及其从 {source_lang} 到 {target_lang} 的翻译，并给出建设性的批评和有用的建议来改进翻译。
+{_country_requirement(target_lang, country)}您可以使用其余的源文本作为翻译部分的上下文。
+
+在写建议时，注意是否有方法改进翻译的：
+(i) 准确性（通过纠正增加的错误、误译、遗漏或未翻译的文本），
+(ii) 流畅性（应用 {target_lang} 的语法、拼写和标点规则，并确保没有不必要的重复），
+(iii) 风格（确保翻译反映源文本的风格并考虑任何文化背景），
+(iv) 术语（确保术语的使用一致并反映源文本的领域；并只确保使用等效的 {target_lang} 成语）。
+
+为改进翻译写一份具体、有用和建设性的建议清单。
+每条建议应针对翻译的一个具体部分。
+只输出建议，不要输出其他任何内容。如果翻译已经没有需要改进之处，只输出“无需修改”。"""
+
+    # 将翻译第 i 块
+    prompt = _multichunk_prompt(
+        source_lang, source_text_chunks, i, context_window, task
+    )
+    prompt += f"""
+指定部分的翻译如下，由 <TRANSLATION> 和 </TRANSLATION> 界定：
+<TRANSLATION>
+{translation_1_chunks[i]}
+</TRANSLATION>"""
+
+    return system_message, prompt
+
+
+def _skip_reflect_chunk(
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    i: int,
+    reused: Optional[str],
+) -> Optional[str]:
+    """第 i 块不需要反思时返回它的反思结果，否则返回 None。"""
+    if reused is not None:
+        return ""
+    if _skip_review(source_text_chunks[i], translation_1_chunks[i]):
+        record_skip("reflect")
+        return NO_CHANGES
+    return None
+
+
+def _reflect_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str,
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """
+    反思第 i 块的翻译；复用翻译记忆的块（reused 不为 None）不需要反思，
+    返回空字符串，通过门控检查的块返回 NO_CHANGES。
+    """
+    skipped = _skip_reflect_chunk(
+        source_text_chunks, translation_1_chunks, i, reused
+    )
+    if skipped is not None:
+        return skipped
+
+    system_message, prompt = _multichunk_reflect_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        translation_1_chunks,
+        country,
+        i,
+        context_window,
+    )
+
+    with stage_label("reflect", i):
+        return get_completion(prompt, system_message)
+
+
+def multichunk_reflect_on_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
+) -> List[str]:
+    """
+    提供对部分翻译的建设性批评和改进建议。
+
+    参数:
+        source_lang (str): 文本的源语言。
+        target_lang (str): 翻译的目标语言。
+        source_text_chunks (List[str]): 分块的源文本。
+        translation_1_chunks (List[str]): 与源文本块相对应的翻译块。
+        country (str): 为目标语言指定的国家。
+        max_concurrency (int, 可选): 同时反思的最大块数。
+        context_window (ContextWindow, 可选): 每个块的提示中包含的上下文范围。
+        reused_chunks (List[Optional[str]], 可选): 每个块在翻译记忆中的翻译，
+            命中的块不反思。默认为 None，即在这里查找。
+
+    返回:
+        List[str]: 包含对每个翻译块改进建议的反思列表。
+    """
+
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks, country
+        )
+
+    def reflect_chunk(i: int) -> str:
+        return _reflect_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
+
+    reflection_chunks = _map_chunks(
+        reflect_chunk, len(source_text_chunks), max_concurrency
+    )
+
+    return reflection_chunks
+
+
+def _multichunk_improve_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+) -> Tuple[str, str]:
+    """构建第 i 块的系统消息和提示，返回 (system_message, prompt)。"""
+
+    system_message = _multichunk_system_message(source_lang, target_lang)
+
+    task = f"""您的任务是仔细阅读并改进由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定的部分从 {source_lang} 到 {target_lang} 的翻译，同时考虑专家的建议和建设性批评。您可以使用其余的源文本作为上下文，但只需提供指定部分的翻译。
+
+考虑到专家的建议，请重写翻译以改进它，注意是否有方法改进翻译的：
+
+(i) 准确性（通过纠正增加的错误、误译、遗漏或未翻译的文本），
+(ii) 流畅性（应用 {target_lang} 的语法、拼写和标点规则，并确保没有不必要的重复），
+(iii) 风格（确保翻译反映源文本的风格），
+(iv) 术语（在上下文中不合适或使用不一致），或
+(v) 其他错误。
+
+只输出指定部分的新翻译，不要输出其他任何内容。"""
+
+    # 将翻译第 i 块
+    prompt = _multichunk_prompt(
+        source_lang, source_text_chunks, i, context_window, task
+    )
+    prompt += f"""
+指定部分的翻译如下，由 <TRANSLATION> 和 </TRANSLATION> 界定：
+<TRANSLATION>
+{translation_1_chunks[i]}
+</TRANSLATION>
+
+专家对指定部分的翻译建议如下，由 <EXPERT_SUGGESTIONS> 和 </EXPERT_SUGGESTIONS> 界定：
+<EXPERT_SUGGESTIONS>
+{reflection_chunks[i]}
+</EXPERT_SUGGESTIONS>"""
 
-只输出您被要求翻译的部分的翻译，不要输出其他任何内容。
-"""
+    return system_message, prompt
 
-    translation_chunks = []
-    for i in range(len(source_text_chunks)):
-        # 将要翻译第 i 块
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
-        )
 
-        prompt = translation_prompt.format(
-            source_lang=source_lang,
-            target_lang=target_lang,
-            tagged_text=tagged_text,
-            chunk_to_translate=source_text_chunks[i],
-        )
+def _skip_improve_chunk(
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    i: int,
+    reused: Optional[str],
+) -> Optional[str]:
+    """第 i 块不需要改进时返回保持不变的初始翻译，否则返回 None。"""
+    if reused is not None:
+        return translation_1_chunks[i]
+    if reflection_is_empty(reflection_chunks[i]):
+        record_skip("improve")
+        return translation_1_chunks[i]
+    return None
+
+
+def _improve_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    reflection_chunks: List[str],
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """
+    改进第 i 块的翻译；复用翻译记忆的块（reused 不为 None）和反思无需修改的块
+    保持初始翻译不变。
+    """
+    skipped = _skip_improve_chunk(
+        translation_1_chunks, reflection_chunks, i, reused
+    )
+    if skipped is not None:
+        return skipped
 
-        translation = get_completion(prompt, system_message=system_message)
-        translation_chunks.append(translation)
+    system_message, prompt = _multichunk_improve_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        translation_1_chunks,
+        reflection_chunks,
+        i,
+        context_window,
+    )
 
-    return translation_chunks
+    with stage_label("improve", i):
+        return get_completion(prompt, system_message)
 
 
-def multichunk_reflect_on_translation(
+def multichunk_improve_translation(
     source_lang: str,
     target_lang: str,
     source_text_chunks: List[str],
     translation_1_chunks: List[str],
-    country: str = "",
+    reflection_chunks: List[str],
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
 ) -> List[str]:
     """
-    提供对部分翻译的建设性批评和改进建议。
+    通过考虑专家的建议来改进源语言到目标语言的文本翻译。
 
     参数:
         source_lang (str): 文本的源语言。
         target_lang (str): 翻译的目标语言。
-        source_text_chunks (List[str]): 分块的源文本。
-        translation_1_chunks (List[str]): 与源文本块相对应的翻译块。
-        country (str): 为目标语言指定的国家。
+        source_text_chunks (List[str]): 分成块的源文本。
+        translation_1_chunks (List[str]): 每个块的初始翻译。
+        reflection_chunks (List[str]): 专家对每个翻译块的改进建议。
+        max_concurrency (int, 可选): 同时改进的最大块数。
+        context_window (ContextWindow, 可选): 每个块的提示中包含的上下文范围。
+        reused_chunks (List[Optional[str]], 可选): 每个块在翻译记忆中的翻译，
+            命中的块不改进。默认为 None，即在这里查找。
 
     返回:
-        List[str]: 包含对每个翻译块改进建议的反思列表。
+        List[str]: 每个块的改进翻译。
     """
 
-    system_message = f"您是专注于从 {source_lang} 到 {target_lang} 翻译的专家语言学家。您将获得源文本及其翻译，目标是改进翻译。"
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks
+        )
 
-    if country != "":
-        reflection_prompt = """您的任务是仔细阅读源文本和该文本的部分翻译，从 {source_lang} 翻译到 {target_lang}，并给出建设性的批评和有用的建议来改进翻译。
-翻译的最终风格和语调应符合在 {country} 通常说的 {target_lang}。
+    def improve_chunk(i: int) -> str:
+        return _improve_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            reflection_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
 
-源文本如下，由 XML 标签 <SOURCE_TEXT> 和 </SOURCE_TEXT> 界定，已翻译的部分在源文本中由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定。您可以使用其余的源文本作为翻译部分的上下文。
+    translation_2_chunks = _map_chunks(
+        improve_chunk, len(source_text_chunks), max_concurrency
+    )
 
-<SOURCE_TEXT>
-{tagged_text}
-</SOURCE_TEXT>
+    return translation_2_chunks
 
-再次强调，只有文本的部分正在被翻译，再次显示在 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 之间：
-<TRANSLATE_THIS>
-{chunk_to_translate}
-</TRANSLATE_THIS>
 
-指定部分的翻译如下，由 <TRANSLATION> 和 </TRANSLATION> 界定：
-<TRANSLATION>
-{translation_1_chunk}
-</TRANSLATION>
+def _multichunk_fused_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str,
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+) -> Tuple[str, str]:
+    """构建第 i 块融合反思与改进的系统消息和提示，返回 (system_message, prompt)。"""
 
-在写建议时，注意是否有方法改进翻译的：
+    system_message = _multichunk_system_message(source_lang, target_lang)
+
+    task = f"""您的任务是仔细阅读由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定的部分及其从 {source_lang} 到 {target_lang} 的翻译，先写出改进翻译的具体建议，再根据这些建议重写翻译。
+{_country_requirement(target_lang, country)}您可以使用其余的源文本作为上下文，但只需提供指定部分的翻译。
+
+在写建议和重写翻译时，注意是否有方法改进翻译的：
 (i) 准确性（通过纠正增加的错误、误译、遗漏或未翻译的文本），
 (ii) 流畅性（应用 {target_lang} 的语法、拼写和标点规则，并确保没有不必要的重复），
 (iii) 风格（确保翻译反映源文本的风格并考虑任何文化背景），
 (iv) 术语（确保术语的使用一致并反映源文本的领域；并只确保使用等效的 {target_lang} 成语）。
 
-为改进翻译写一份具体、有用和建设性的建议清单。
-每条建议应针对翻译的一个具体部分。
-只输出建议，不要输出其他任何内容。"""
-
-    else:
-        reflection_prompt = """您的任务是仔细阅读源文本和该文本的部分翻译，从 {source_lang} 翻译到 {target_lang}，并给出建设性的批评和有用的建议来改进翻译。
-
-源文本如下，由 XML 标签 <SOURCE_TEXT> 和 </SOURCE_TEXT> 界定，已翻译的部分在源文本中由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定。您可以使用其余的源文本作为翻译部分的上下文。
-
-<SOURCE_TEXT>
-{tagged_text}
-</SOURCE_TEXT>
-
-再次强调，只有文本的部分正在被翻译，再次显示在 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 之间：
-<TRANSLATE_THIS>
-{chunk_to_translate}
-</TRANSLATE_THIS>
+{_FUSED_OUTPUT}"""
 
+    # 将翻译第 i 块
+    prompt = _multichunk_prompt(
+        source_lang, source_text_chunks, i, context_window, task
+    )
+    prompt += f"""
 指定部分的翻译如下，由 <TRANSLATION> 和 </TRANSLATION> 界定：
 <TRANSLATION>
-{translation_1_chunk}
-</TRANSLATION>
+{translation_1_chunks[i]}
+</TRANSLATION>"""
 
-在写建议时，注意是否有方法改进翻译的：
-(i) 准确性（通过纠正增加的错误、误译、遗漏或未翻译的文本），
-(ii) 流畅性（应用 {target_lang} 的语法、拼写和标点规则，并确保没有不必要的重复），
-(iii) 风格（确保翻译反映源文本的风格并考虑任何文化背景），
-(iv) 术语（确保术语的使用一致并反映源文本的领域；并只确保使用等效的 {target_lang} 成语）。
+    return system_message, prompt
 
-为改进翻译写一份具体、有用和建设性的建议清单。
-每条建议应针对翻译的一个具体部分。
-只输出建议，不要输出其他任何内容。"""
-
-    reflection_chunks = []
-    for i in range(len(source_text_chunks)):
-        # 将翻译第 i 块
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
-        )
-        if country != "":
-            prompt = reflection_prompt.format(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                tagged_text=tagged_text,
-                chunk_to_translate=source_text_chunks[i],
-                translation_1_chunk=translation_1_chunks[i],
-                country=country,
-            )
-        else:
-            prompt = reflection_prompt.format(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                tagged_text=tagged_text,
-                chunk_to_translate=source_text_chunks[i],
-                translation_1_chunk=translation_1_chunks[i],
-            )
 
-        reflection = get_completion(prompt, system_message)
-        reflection_chunks.append(reflection)
+def _skip_fused_chunk(
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    i: int,
+    reused: Optional[str],
+) -> Optional[str]:
+    """第 i 块不需要反思和改进时返回保持不变的初始翻译，否则返回 None。"""
+    if reused is not None:
+        return translation_1_chunks[i]
+    if _skip_review(source_text_chunks[i], translation_1_chunks[i]):
+        record_skip("fused")
+        return translation_1_chunks[i]
+    return None
+
+
+def _fused_chunk(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    translation_1_chunks: List[str],
+    country: str,
+    i: int,
+    context_window: Optional[ContextWindow] = None,
+    reused: Optional[str] = None,
+) -> str:
+    """
+    用一次调用反思并改进第 i 块；复用翻译记忆的块（reused 不为 None）和
+    通过门控检查的块保持初始翻译不变。
+    """
+    skipped = _skip_fused_chunk(
+        source_text_chunks, translation_1_chunks, i, reused
+    )
+    if skipped is not None:
+        return skipped
 
-    return reflection_chunks
+    system_message, prompt = _multichunk_fused_prompt(
+        source_lang,
+        target_lang,
+        source_text_chunks,
+        translation_1_chunks,
+        country,
+        i,
+        context_window,
+    )
 
+    with stage_label("fused", i):
+        content = get_completion(prompt, system_message, json_mode=True)
 
-def multichunk_improve_translation(
+    return _parse_fused(content, translation_1_chunks[i])
+
+
+def multichunk_fused_translation(
     source_lang: str,
     target_lang: str,
     source_text_chunks: List[str],
     translation_1_chunks: List[str],
-    reflection_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    reused_chunks: Optional[List[Optional[str]]] = None,
 ) -> List[str]:
     """
-    通过考虑专家的建议来改进源语言到目标语言的文本翻译。
+    对每个块用一次调用完成反思和改进。
 
     参数:
         source_lang (str): 文本的源语言。
         target_lang (str): 翻译的目标语言。
         source_text_chunks (List[str]): 分成块的源文本。
         translation_1_chunks (List[str]): 每个块的初始翻译。
-        reflection_chunks (List[str]): 专家对每个翻译块的改进建议。
+        country (str): 为目标语言指定的国家。
+        max_concurrency (int, 可选): 同时处理的最大块数。
+        context_window (ContextWindow, 可选): 每个块的提示中包含的上下文范围。
+        reused_chunks (List[Optional[str]], 可选): 每个块在翻译记忆中的翻译，
+            命中的块不处理。默认为 None，即在这里查找。
 
     返回:
         List[str]: 每个块的改进翻译。
     """
 
-    system_message = f"您是专注于从 {source_lang} 到 {target_lang} 翻译编辑的专家语言学家。"
-
-    improvement_prompt = """您的任务是仔细阅读并改进从 {source_lang} 到 {target_lang} 的翻译，同时考虑专家的建议和建设性批评。下面提供了源文本、初始翻译和专家的建议。
+    if reused_chunks is None:
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks, country
+        )
 
-源文本如下，由 XML 标签 <SOURCE_TEXT> 和 </SOURCE_TEXT> 界定，已翻译的部分在源文本中由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 界定。您可以使用其余的源文本作为上下文，但只需提供由 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 指示部分的翻译。
+    def fuse_chunk(i: int) -> str:
+        return _fused_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_1_chunks,
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
 
-<SOURCE_TEXT>
-{tagged_text}
-</SOURCE_TEXT>
+    return _map_chunks(fuse_chunk, len(source_text_chunks), max_concurrency)
 
-再次强调，只有文本的部分正在被翻译，再次显示在 <TRANSLATE_THIS> 和 </TRANSLATE_THIS> 之间：
-<TRANSLATE_THIS>
-{chunk_to_translate}
-</TRANSLATE_THIS>
 
-指定部分的翻译如下，由 <TRANSLATION> 和 </TRANSLATION> 界定：
-<TRANSLATION>
-{translation_1_chunk}
-</TRANSLATION>
+def _dataflow_scheduler(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+    **options,
+) -> DataflowScheduler:
+    """
+    构建按 pipeline 执行各阶段的 DataflowScheduler。
 
-专家对指定部分的翻译建议如下，由 <EXPERT_SUGGESTIONS> 和 </EXPERT_SUGGESTIONS> 界定：
-<EXPERT_SUGGESTIONS>
-{reflection_chunk}
-</EXPERT_SUGGESTIONS>
+    最终翻译位于 scheduler.results[_FINAL_STAGES[pipeline]]。
+    """
 
-考虑到专家的建议，请重写翻译以改进它，注意是否有方法改进翻译的：
+    reused_chunks = _memory_lookup(
+        source_lang, target_lang, source_text_chunks, country
+    )
 
-(i) 准确性（通过纠正增加的错误、误译、遗漏或未翻译的文本），
-(ii) 流畅性（应用 {target_lang} 的语法、拼写和标点规则，并确保没有不必要的重复），
-(iii) 风格（确保翻译反映源文本的风格），
-(iv) 术语（在上下文中不合适或使用不一致），或
-(v) 其他错误。
+    def translate_chunk(i: int) -> str:
+        return _initial_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
 
-只输出指定部分的新翻译，不要输出其他任何内容。"""
+    def reflect_chunk(i: int) -> str:
+        return _reflect_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            scheduler.results["initial"],
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
+        )
 
-    translation_2_chunks = []
-    for i in range(len(source_text_chunks)):
-        # 将翻译第 i 块
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
+    def improve_chunk(i: int) -> str:
+        return _improve_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            scheduler.results["initial"],
+            scheduler.results["reflect"],
+            i,
+            context_window,
+            reused_chunks[i],
         )
 
-        prompt = improvement_prompt.format(
-            source_lang=source_lang,
-            target_lang=target_lang,
-            tagged_text=tagged_text,
-            chunk_to_translate=source_text_chunks[i],
-            translation_1_chunk=translation_1_chunks[i],
-            reflection_chunk=reflection_chunks[i],
+    def fuse_chunk(i: int) -> str:
+        return _fused_chunk(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            scheduler.results["initial"],
+            country,
+            i,
+            context_window,
+            reused_chunks[i],
         )
 
-        translation_2 = get_completion(prompt, system_message)
-        translation_2_chunks.append(translation_2)
+    steps = {
+        "initial": translate_chunk,
+        "reflect": reflect_chunk,
+        "improve": improve_chunk,
+        "fused": fuse_chunk,
+    }
+    stages = [(stage, steps[stage]) for stage in _PIPELINE_STAGES[pipeline]]
 
-    return translation_2_chunks
+    scheduler = DataflowScheduler(stages, max_concurrency, **options)
+    return scheduler
 
 
-def multichunk_translation(
-    source_lang, target_lang, source_text_chunks, country: str = ""
-):
+def multichunk_dataflow_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+) -> Tuple[List[str], List[ChunkTiming]]:
     """
-    基于初始翻译和反思，改进多个文本块的翻译。
+    使用按块推进的数据流调度完成多块翻译。
+
+    与 multichunk_translation 的阶段屏障不同，每个块在初始翻译完成后立即进行反思，
+    反思完成后立即进行改进，较长的块优先调度。
 
     参数:
         source_lang (str): 文本块的源语言。
         target_lang (str): 翻译的目标语言。
         source_text_chunks (List[str]): 需要翻译的源文本块列表。
-        translation_1_chunks (List[str]): 每个源文本块的初始翻译列表。
-        reflection_chunks (List[str]): 对初始翻译的反思列表。
-        country (str): 目标语言指定的国家
+        country (str): 目标语言指定的国家。
+        max_concurrency (int, 可选): 同时进行的最大请求数。
+        context_window (ContextWindow, 可选): 每个块的提示中包含的上下文范围。
+        pipeline (str, 可选): 每个块的翻译流程，见 PIPELINES。
+
     返回:
-        List[str]: 每个源文本块的改进翻译列表。
+        Tuple[List[str], List[ChunkTiming]]: 每个块的改进翻译列表，
+            以及每个块各阶段的耗时记录。
     """
 
-    translation_1_chunks = multichunk_initial_translation(
-        source_lang, target_lang, source_text_chunks
-    )
-
-    reflection_chunks = multichunk_reflect_on_translation(
+    scheduler = _dataflow_scheduler(
         source_lang,
         target_lang,
         source_text_chunks,
-        translation_1_chunks,
         country,
+        max_concurrency,
+        context_window,
+        pipeline,
     )
+    results = scheduler.run([len(chunk) for chunk in source_text_chunks])
+
+    return results[_FINAL_STAGES[pipeline]], scheduler.timings
+
 
-    translation_2_chunks = multichunk_improve_translation(
+def multichunk_translation_stream(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+) -> Iterator[str]:
+    """
+    按顺序逐块产出多块翻译的改进结果。
+
+    使用数据流调度，索引较小的块优先执行；第 i 块及其之前的所有块都完成后立即产出第 i 块，
+    并释放该块的中间结果，因此调用方可以边翻译边写出，长文本的内存占用不会随进度累积。
+    提前关闭生成器会停止调度尚未开始的请求。
+
+    参数:
+        source_lang (str): 文本块的源语言。
+        target_lang (str): 翻译的目标语言。
+        source_text_chunks (List[str]): 需要翻译的源文本块列表。
+        country (str): 目标语言指定的国家。
+        max_concurrency (int, 可选): 同时进行的最大请求数。
+        context_window (ContextWindow, 可选): 每个块的提示中包含的上下文范围。
+        pipeline (str, 可选): 每个块的翻译流程，见 PIPELINES。
+
+    返回:
+        Iterator[str]: 按块顺序产出的改进翻译。
+    """
+
+    _check_pipeline(pipeline)
+    final_stage = _FINAL_STAGES[pipeline]
+    completed: queue.Queue = queue.Queue()
+    scheduler = _dataflow_scheduler(
         source_lang,
         target_lang,
         source_text_chunks,
-        translation_1_chunks,
-        reflection_chunks,
+        country,
+        max_concurrency,
+        context_window,
+        pipeline,
+        in_order=True,
+        on_complete=completed.put,
     )
+    errors: List[BaseException] = []
+
+    def run() -> None:
+        try:
+            scheduler.run([len(chunk) for chunk in source_text_chunks])
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            completed.put(None)
+
+    thread = threading.Thread(
+        target=contextvars.copy_context().run, args=(run,), daemon=True
+    )
+    thread.start()
+
+    finished = set()
+    next_index = 0
+    try:
+        while next_index < len(source_text_chunks):
+            i = completed.get()
+            if i is None:
+                break
+            finished.add(i)
+            while next_index in finished:
+                translation_2 = scheduler.results[final_stage][next_index]
+                if pipeline != "draft":
+                    _memory_write_back(
+                        source_lang,
+                        target_lang,
+                        source_text_chunks[next_index : next_index + 1],
+                        [translation_2],
+                        country,
+                    )
+                # 该块已产出，释放它在各阶段的结果
+                for results in scheduler.results.values():
+                    results[next_index] = None
+                finished.discard(next_index)
+                next_index += 1
+                yield translation_2
+    finally:
+        scheduler.cancel()
+
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _multichunk_steps(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str,
+    max_concurrency: int,
+    schedule: str,
+    context_window: Optional[ContextWindow],
+    pipeline: str,
+) -> Generator[_Step, Any, List[str]]:
+    """multichunk_translation 的流程，见 _run_steps。"""
+
+    if schedule not in SCHEDULES:
+        raise ValueError(f"未知的调度方式：{schedule}，可选值为 {SCHEDULES}")
+    _check_pipeline(pipeline)
+
+    if schedule == "dataflow":
+        translation_2_chunks, timings = yield _step(
+            "dataflow",
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            context_window,
+            pipeline,
+        )
+        ic(timings)
+    else:
+        # 每个块只查找一次翻译记忆，结果传给后面的各个阶段
+        reused_chunks = _memory_lookup(
+            source_lang, target_lang, source_text_chunks, country
+        )
+        with span("stage", stage="initial"):
+            translation_1_chunks = yield _step(
+                "initial",
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                max_concurrency,
+                context_window,
+                reused_chunks,
+            )
+            record_output(translation_1_chunks)
+
+        if pipeline == "draft":
+            translation_2_chunks = translation_1_chunks
+        elif pipeline == "fused":
+            with span("stage", stage="fused"):
+                translation_2_chunks = yield _step(
+                    "fused",
+                    source_lang,
+                    target_lang,
+                    source_text_chunks,
+                    translation_1_chunks,
+                    country,
+                    max_concurrency,
+                    context_window,
+                    reused_chunks,
+                )
+                record_output(translation_2_chunks)
+        else:
+            with span("stage", stage="reflect"):
+                reflection_chunks = yield _step(
+                    "reflect",
+                    source_lang,
+                    target_lang,
+                    source_text_chunks,
+                    translation_1_chunks,
+                    country,
+                    max_concurrency,
+                    context_window,
+                    reused_chunks,
+                )
+                record_output(reflection_chunks)
+
+            with span("stage", stage="improve"):
+                translation_2_chunks = yield _step(
+                    "improve",
+                    source_lang,
+                    target_lang,
+                    source_text_chunks,
+                    translation_1_chunks,
+                    reflection_chunks,
+                    max_concurrency,
+                    context_window,
+                    reused_chunks,
+                )
+                record_output(translation_2_chunks)
+
+    # 草稿不写回翻译记忆，以免之后的完整翻译直接复用较低质量的译文
+    if pipeline != "draft":
+        _memory_write_back(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            translation_2_chunks,
+            country,
+        )
 
     return translation_2_chunks
 
 
+def multichunk_translation(
+    source_lang,
+    target_lang,
+    source_text_chunks,
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    schedule: str = "stage",
+    context_window: Optional[ContextWindow] = None,
+    pipeline: str = "full",
+):
+    """
+    基于初始翻译和反思，改进多个文本块的翻译。
+
+    参数:
+        source_lang (str): 文本块的源语言。
+        target_lang (str): 翻译的目标语言。
+        source_text_chunks (List[str]): 需要翻译的源文本块列表。
+        translation_1_chunks (List[str]): 每个源文本块的初始翻译列表。
+        reflection_chunks (List[str]): 对初始翻译的反思列表。
+        country (str): 目标语言指定的国家
+        max_concurrency (int, 可选): 每个阶段同时处理的最大块数，
+            各阶段内的块会并发请求，输出顺序保持不变。
+        schedule (str, 可选): "stage" 按阶段屏障执行；"dataflow" 使用
+            multichunk_dataflow_translation 按块推进。默认为 "stage"。
+        context_window (ContextWindow, 可选): 三个阶段共享的上下文范围，
+            默认为 None，即每个提示都包含整个源文本。
+        pipeline (str, 可选): 每个块的翻译流程，见 PIPELINES。"draft" 只做
+            初始翻译，"fused" 用一次调用完成反思和改进。默认为 "full"。
+    返回:
+        List[str]: 每个源文本块的改进翻译列表。
+    """
+
+    return _run_steps(
+        _multichunk_steps(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            schedule,
+            context_window,
+            pipeline,
+        ),
+        {
+            "dataflow": multichunk_dataflow_translation,
+            "initial": multichunk_initial_translation,
+            "reflect": multichunk_reflect_on_translation,
+            "improve": multichunk_improve_translation,
+            "fused": multichunk_fused_translation,
+        },
+    )
+
+
 def calculate_chunk_size(token_count: int, token_limit: int) -> int:
     """
     根据令牌总数和令牌限制来计算块的大小。
 
+    已弃用：split_source_text 改为在句子边界上切分（见 chunking.chunk_spans），
+    不再使用这个块大小。保留它只是为了兼容已有的导入，将在以后的版本中删除。
+
     参数:
         token_count (int): 令牌的总数。
         token_limit (int): 每个块允许的最大令牌数。
@@ -610,22 +2024,15 @@ def calculate_chunk_size(token_count: int, token_limit: int) -> int:
     返回:
         int: 计算出的块大小。
 
-    描述:
-        该函数基于给定的令牌总数和令牌限制来计算块的大小。
-        如果令牌总数小于或等于令牌限制，则函数将返回令牌总数作为块大小。
-        否则，它将计算在令牌限制内容纳所有令牌所需的块数。
-        块大小由令牌限制除以块数来确定。
-        如果在令牌总数除以令牌限制后还有剩余的令牌，
-        则通过将剩余的令牌除以块数来调整块大小。
-
     示例:
-        >>> calculate_chunk_size(1000, 500)
-        500
         >>> calculate_chunk_size(1530, 500)
         389
-        >>> calculate_chunk_size(2242, 500)
-        496
     """
+    warnings.warn(
+        "calculate_chunk_size 已弃用，文本切分请使用 split_source_text",
+        DeprecationWarning,
+        stacklevel=2,
+    )
 
     if token_count <= token_limit:
         return token_count
@@ -640,53 +2047,142 @@ def calculate_chunk_size(token_count: int, token_limit: int) -> int:
     return chunk_size
 
 
+def split_source_text(tokenized: TokenizedText, max_tokens: int) -> List[str]:
+    """
+    将超过令牌限制的源文本在句子边界上切分为大小相近的块。
+
+    令牌数和切分位置都来自 tokenized 中已有的编码结果，不会对文本重新分词。
+
+    参数:
+        tokenized (TokenizedText): 已编码的源文本。
+        max_tokens (int): 每个块允许的最大令牌数。
+
+    返回:
+        List[str]: 源文本块列表，按顺序拼接后与源文本完全一致。
+    """
+
+    with span("chunking", tokens=len(tokenized), max_tokens=max_tokens):
+        spans = chunk_spans(tokenized, max_tokens)
+        annotate(chunks=len(spans))
+
+    # 每个块的令牌数
+    token_sizes = [tokenized.count(start, end) for start, end in spans]
+    ic(token_sizes)
+
+    return [tokenized.text[start:end] for start, end in spans]
+
+
+def _split_for_translation(
+    source_text: str, max_tokens: int
+) -> Optional[List[str]]:
+    """
+    决定 source_text 是否需要切分：令牌数小于 max_tokens 时返回 None，作为
+    一个整体块翻译，否则返回切分后的块。translate 和 atranslate 等共用。
+    """
+    # 只编码一次，令牌数和切分位置都复用这次的结果
+    tokenized = TokenizedText(source_text)
+    num_tokens_in_text = len(tokenized)
+
+    ic(num_tokens_in_text)
+    annotate(tokens=num_tokens_in_text)
+
+    if num_tokens_in_text < max_tokens:
+        ic("将文本作为一个单独的块进行翻译")
+        return None
+
+    ic("将文本分成多个块进行翻译")
+    return split_source_text(tokenized, max_tokens)
+
+
 def translate(
     source_lang,
     target_lang,
     source_text,
     country,
     max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    schedule="stage",
+    context_window=None,
+    pipeline="full",
 ):
-    """将 source_text 从 source_lang 翻译到 target_lang."""
+    """将 source_text 从 source_lang 翻译到 target_lang.
+
+    max_concurrency 控制多块翻译时并发请求的最大块数，
+    schedule 选择多块翻译的调度方式（"stage" 或 "dataflow"），
+    context_window 限制每个块的提示中包含的上下文，可以是两侧的相邻块数，
+    也可以是 ContextWindow；默认为 None，即包含整个源文本。
+    pipeline 选择每个块的翻译流程：每块一次调用的 "draft"、两次调用的 "fused"
+    或三次调用的 "full"（默认），可配合 stats.collect_stats 比较调用次数和耗时。
+    """
 
-    # 计算输入文本的令牌数
-    num_tokens_in_text = num_tokens_in_string(source_text)
+    with span(
+        "translate",
+        source_lang=source_lang,
+        target_lang=target_lang,
+        pipeline=pipeline,
+        schedule=schedule,
+    ):
+        _check_pipeline(pipeline)
+
+        source_text_chunks = _split_for_translation(source_text, max_tokens)
+
+        # 如果文本的令牌数小于最大令牌限制，作为一个整体块进行翻译
+        if source_text_chunks is None:
+            final_translation = one_chunk_translate_text(
+                source_lang, target_lang, source_text, country, pipeline
+            )
 
-    ic(num_tokens_in_text)
+            return final_translation
 
-    # 如果文本的令牌数小于最大令牌限制，作为一个整体块进行翻译
-    if num_tokens_in_text < max_tokens:
-        ic("将文本作为一个单独的块进行翻译")
+        else:
+            # 对每个文本块进行多步翻译过程
+            translation_2_chunks = multichunk_translation(
+                source_lang,
+                target_lang,
+                source_text_chunks,
+                country,
+                max_concurrency,
+                schedule,
+                as_context_window(context_window),
+                pipeline,
+            )
 
-        final_translation = one_chunk_translate_text(
-            source_lang, target_lang, source_text, country
-        )
+            # 将所有翻译后的块拼接成最终翻译结果
+            return "".join(translation_2_chunks)
 
-        return final_translation
 
-    else:
-        ic("将文本分成多个块进行翻译")
+def translate_stream(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    context_window=None,
+    pipeline="full",
+) -> Iterator[str]:
+    """translate 的流式版本，按顺序产出每个块完成改进后的翻译。
+
+    第 i 块及其之前的所有块都完成后立即产出第 i 块，把产出的片段依次拼接
+    即得到与 translate 相同形式的结果。文本不超过 max_tokens 时只产出一次。
+    """
 
-        # 计算每个块应有的令牌数
-        token_size = calculate_chunk_size(
-            token_count=num_tokens_in_text, token_limit=max_tokens
-        )
+    _check_pipeline(pipeline)
 
-        ic(token_size)
+    source_text_chunks = _split_for_translation(source_text, max_tokens)
 
-        # 使用 RecursiveCharacterTextSplitter 对文本进行分块
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name="gpt-4",
-            chunk_size=token_size,
-            chunk_overlap=0,
+    if source_text_chunks is None:
+        yield one_chunk_translate_text(
+            source_lang, target_lang, source_text, country, pipeline
         )
 
-        source_text_chunks = text_splitter.split_text(source_text)
-
-        # 对每个文本块进行多步翻译过程
-        translation_2_chunks = multichunk_translation(
-            source_lang, target_lang, source_text_chunks, country
+    else:
+        yield from multichunk_translation_stream(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            as_context_window(context_window),
+            pipeline,
         )
-
-        # 将所有翻译后的块拼接成最终翻译结果
-        return "".join(translation_2_chunks)
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+import pytest
+
+from translation_agent import retry
+
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    """每个测试使用新的断路器，避免前一个测试的失败让端点保持打开。"""
+    retry._breakers.clear()
+    yield
+    retry._breakers.clear()
+
+
+@pytest.fixture
+def fake_response():
+    """返回构造假补全响应的函数，结构与 chat.completions.create 的返回值相同。"""
+
+    def build(content, usage=None):
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)], usage=usage
+        )
+
+    return build
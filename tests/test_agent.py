@@ -1,13 +1,21 @@
 import json
 import os
+import time
 from unittest.mock import patch
 
 import openai
 import pytest
 from dotenv import load_dotenv
 
+from translation_agent.context import ContextWindow
+
 # from translation_agent.utils import find_sentence_starts
+from translation_agent.utils import _multichunk_improve_prompt
+from translation_agent.utils import _multichunk_initial_prompt
+from translation_agent.utils import _multichunk_reflect_prompt
 from translation_agent.utils import get_completion
+from translation_agent.utils import multichunk_initial_translation
+from translation_agent.utils import multichunk_translation
 from translation_agent.utils import num_tokens_in_string
 from translation_agent.utils import one_chunk_improve_translation
 from translation_agent.utils import one_chunk_initial_translation
@@ -249,7 +257,7 @@ def test_one_chunk_translate_text(mocker):
 
     # Assert that the helper functions were called with the correct arguments
     mock_initial_translation.assert_called_once_with(
-        source_lang, target_lang, source_text
+        source_lang, target_lang, source_text, country
     )
     mock_reflect_on_translation.assert_called_once_with(
         source_lang, target_lang, source_text, translation_1, country
@@ -287,3 +295,122 @@ def test_num_tokens_in_string():
     assert (
         num_tokens_in_string("Hello, world!", encoding_name="p50k_base") == 4
     )
+
+
+def test_multichunk_initial_translation_concurrent_keeps_order(mocker):
+    source_text_chunks = [f"chunk {i}. " for i in range(8)]
+
+    def fake_completion(prompt, system_message=None):
+        # 让靠前的块更晚完成，以验证输出顺序不依赖完成顺序
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[-1].split("\n")[0]
+        index = int(chunk.split()[1].rstrip("."))
+        time.sleep(0.01 * (8 - index))
+        return f"translated {index}"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    result = multichunk_initial_translation(
+        "English", "Spanish", source_text_chunks, max_concurrency=4
+    )
+
+    assert result == [f"translated {i}" for i in range(8)]
+
+
+def test_multichunk_translation_passes_max_concurrency(mocker):
+    chunks = ["a", "b"]
+    mock_initial = mocker.patch(
+        "translation_agent.utils.multichunk_initial_translation",
+        return_value=["1a", "1b"],
+    )
+    mock_reflect = mocker.patch(
+        "translation_agent.utils.multichunk_reflect_on_translation",
+        return_value=["ra", "rb"],
+    )
+    mock_improve = mocker.patch(
+        "translation_agent.utils.multichunk_improve_translation",
+        return_value=["2a", "2b"],
+    )
+
+    result = multichunk_translation(
+        "English", "Spanish", chunks, "Mexico", max_concurrency=3
+    )
+
+    # 没有翻译记忆时每个块的查找结果都是 None，各阶段共用同一份结果
+    reused = [None, None]
+    assert result == ["2a", "2b"]
+    mock_initial.assert_called_once_with(
+        "English", "Spanish", chunks, 3, None, reused
+    )
+    mock_reflect.assert_called_once_with(
+        "English", "Spanish", chunks, ["1a", "1b"], "Mexico", 3, None, reused
+    )
+    mock_improve.assert_called_once_with(
+        "English",
+        "Spanish",
+        chunks,
+        ["1a", "1b"],
+        ["ra", "rb"],
+        3,
+        None,
+        reused,
+    )
+
+
+def test_multichunk_initial_translation_context_window(mocker):
+    source_text_chunks = [f"<{i}>" for i in range(6)]
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion", return_value="ok"
+    )
+
+    multichunk_initial_translation(
+        "English",
+        "Spanish",
+        source_text_chunks,
+        context_window=ContextWindow(chunks=1),
+    )
+
+    prompt = mock_get_completion.call_args_list[3].args[0]
+    assert "<SOURCE_TEXT>\n<2><3><4>\n</SOURCE_TEXT>" in prompt
+    assert "<TRANSLATE_THIS>\n<3>\n</TRANSLATE_THIS>" in prompt
+    assert "<1>" not in prompt
+    assert "<5>" not in prompt
+
+
+def test_multichunk_prompts_share_prefix():
+    chunks = ["First part. ", "Second part. ", "Third part."]
+    translations = ["Primera. ", "Segunda. ", "Tercera."]
+
+    initial = [
+        _multichunk_initial_prompt("English", "Spanish", chunks, i)
+        for i in range(3)
+    ]
+    reflect = _multichunk_reflect_prompt(
+        "English", "Spanish", chunks, translations, "", 1
+    )
+    improve = _multichunk_improve_prompt(
+        "English", "Spanish", chunks, translations, ["ok"] * 3, 1
+    )
+
+    prompts = [prompt for _, prompt in initial + [reflect, improve]]
+    shared = prompts[0].split("\n</SOURCE_TEXT>")[0]
+
+    # 所有块和阶段的系统消息相同，提示以完全相同的源文本开头，块本身在最后
+    assert len({system for system, _ in initial + [reflect, improve]}) == 1
+    assert "".join(chunks) in shared
+    for prompt in prompts:
+        assert prompt.startswith(shared)
+        assert "<TRANSLATE_THIS>\n" not in prompt[: len(shared)]
+
+
+def test_context_window_token_budget():
+    chunks = ["aa", "b", "cccc", "dd", "e"]
+    window = ContextWindow(tokens=3)
+
+    # 从目标块两侧交替扩展，放不下的块会被跳过
+    assert window.bounds(chunks, 2, len) == (1, 4)
+    assert ContextWindow(chunks=1, tokens=100).bounds(chunks, 0, len) == (
+        0,
+        2,
+    )
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from translation_agent.async_utils import amultichunk_dataflow_translation
+from translation_agent.async_utils import amultichunk_initial_translation
+from translation_agent.async_utils import amultichunk_translation_stream
+from translation_agent.async_utils import aone_chunk_translate_text
+from translation_agent.tracing import Tracer
+from translation_agent.tracing import trace
+
+
+class Recorder(Tracer):
+    def __init__(self):
+        self.started = []
+
+    def on_span_start(self, span):
+        self.started.append(span)
+
+
+def test_aone_chunk_translate_text(mocker):
+    mock_aget_completion = mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=["Hola", "Looks good.", "Hola."],
+    )
+
+    result = asyncio.run(
+        aone_chunk_translate_text("English", "Spanish", "Hello", "Mexico")
+    )
+
+    assert result == "Hola."
+    assert mock_aget_completion.await_count == 3
+    # 初始翻译的提示同样带上国家的要求
+    assert "Mexico" in mock_aget_completion.await_args_list[0].args[0]
+
+
+def test_amultichunk_initial_translation_bounded_and_ordered(mocker):
+    source_text_chunks = [f"chunk{i}" for i in range(6)]
+    in_flight = 0
+    peak = 0
+
+    async def fake_aget_completion(prompt, system_message=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[-1].split("\n")[0]
+        await asyncio.sleep(0.01 * (6 - int(chunk[-1])))
+        in_flight -= 1
+        return chunk.upper()
+
+    mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=fake_aget_completion,
+    )
+
+    result = asyncio.run(
+        amultichunk_initial_translation(
+            "English", "Spanish", source_text_chunks, max_concurrency=2
+        )
+    )
+
+    assert result == [chunk.upper() for chunk in source_text_chunks]
+    assert peak == 2
+
+
+def test_amultichunk_dataflow_translation(mocker):
+    async def fake_aget_completion(prompt, system_message=None):
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            return "improved"
+        if "<TRANSLATION>" in prompt:
+            return "reflection"
+        return "draft"
+
+    mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=fake_aget_completion,
+    )
+
+    translations, timings = asyncio.run(
+        amultichunk_dataflow_translation(
+            "English", "Spanish", ["One. ", "Two. "], max_concurrency=2
+        )
+    )
+
+    assert translations == ["improved", "improved"]
+    assert set(timings[0].stages) == {"initial", "reflect", "improve"}
+
+
+def test_amultichunk_translation_stream_keeps_order(mocker):
+    async def fake_aget_completion(prompt, system_message=None):
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[-1].split("\n")[0]
+        # 靠前的块更晚完成
+        await asyncio.sleep(0.01 * (3 - len(chunk.split())))
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            return chunk.upper()
+        return "draft"
+
+    mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=fake_aget_completion,
+    )
+
+    async def collect():
+        return [
+            translation
+            async for translation in amultichunk_translation_stream(
+                "English",
+                "Spanish",
+                ["a ", "a b ", "a b c "],
+                max_concurrency=3,
+            )
+        ]
+
+    assert asyncio.run(collect()) == ["A ", "A B ", "A B C "]
+
+
+def test_amultichunk_dataflow_fused_pipeline(mocker):
+    async def fake_aget_completion(prompt, system_message=None, json_mode=False):
+        if json_mode:
+            return '{"critique": "ok", "translation": "fused"}'
+        return "draft"
+
+    mock_aget_completion = mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=fake_aget_completion,
+    )
+
+    result, _ = asyncio.run(
+        amultichunk_dataflow_translation(
+            "English", "Spanish", ["One. ", "Two. "], pipeline="fused"
+        )
+    )
+
+    assert result == ["fused", "fused"]
+    assert mock_aget_completion.await_count == 4
+
+
+def test_aone_chunk_translate_text_records_stage_error(mocker):
+    recorder = Recorder()
+    mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=["Hola", RuntimeError("boom")],
+    )
+
+    with trace(recorder), pytest.raises(RuntimeError):
+        asyncio.run(aone_chunk_translate_text("English", "Spanish", "Hello"))
+
+    # 同步和异步共用的流程中，失败阶段的 span 同样记录到异常
+    stages = {
+        span.attributes["stage"]: span
+        for span in recorder.started
+        if span.name == "stage"
+    }
+    assert stages["initial"].error is None
+    assert isinstance(stages["reflect"].error, RuntimeError)
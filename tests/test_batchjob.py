@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+import pytest
+import tiktoken
+
+from translation_agent.async_utils import amultichunk_dataflow_translation
+from translation_agent.batchjob import BatchJob
+from translation_agent.batchjob import CompletionDeferred
+from translation_agent.batchjob import batch_mode
+from translation_agent.corpus import translate_many
+from translation_agent.utils import multichunk_translation
+from translation_agent.utils import one_chunk_translate_text
+
+
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+def answer(prompt):
+    if "<EXPERT_SUGGESTIONS>" in prompt:
+        return "improved"
+    if "<TRANSLATION>" in prompt:
+        return "reflection"
+    return "draft"
+
+
+def fake_batch_results(job, requests_path):
+    """模拟 Batch API：为请求文件中的每个请求写出一个成功的结果。"""
+    with open(requests_path, encoding="utf-8") as file:
+        requests = [json.loads(line) for line in file]
+    with open(job.results_path(requests_path), "w", encoding="utf-8") as file:
+        for request in requests:
+            prompt = request["body"]["messages"][1]["content"]
+            result = {
+                "id": "batch_req_" + request["custom_id"][:8],
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [{"message": {"content": answer(prompt)}}]
+                    },
+                },
+                "error": None,
+            }
+            file.write(json.dumps(result) + "\n")
+    return len(requests)
+
+
+def run_rounds(directory, run):
+    """重复运行直到不再推迟，返回最终结果和每一轮的请求数。"""
+    batch_sizes = []
+    while True:
+        job = BatchJob(directory)
+        with batch_mode(job):
+            try:
+                return run(), batch_sizes
+            except CompletionDeferred as e:
+                assert e.count == job.pending
+                requests_path = job.write_requests()
+                batch_sizes.append(fake_batch_results(job, requests_path))
+
+
+def test_one_chunk_translation_runs_one_stage_per_batch(tmp_path, mocker):
+    create = mocker.patch(
+        "translation_agent.utils.client.chat.completions.create"
+    )
+
+    result, batch_sizes = run_rounds(
+        str(tmp_path),
+        lambda: one_chunk_translate_text("English", "Spanish", "Hello", ""),
+    )
+
+    assert result == "improved"
+    assert batch_sizes == [1, 1, 1]
+    create.assert_not_called()
+
+    with open(tmp_path / "batch-001.requests.jsonl", encoding="utf-8") as f:
+        request = json.loads(f.readline())
+    assert request["method"] == "POST"
+    assert request["url"] == "/v1/chat/completions"
+    prompt = request["body"]["messages"][1]["content"]
+    assert prompt.endswith("Hello\n\nSpanish:")
+
+
+def test_multichunk_stage_is_collected_into_one_batch(tmp_path):
+    chunks = ["One. ", "Two. ", "Three. "]
+
+    result, batch_sizes = run_rounds(
+        str(tmp_path),
+        lambda: multichunk_translation(
+            "English", "Spanish", chunks, max_concurrency=2
+        ),
+    )
+
+    assert result == ["improved"] * 3
+    assert batch_sizes == [3, 3, 3]
+
+
+def test_dataflow_schedule_collects_every_chunk(tmp_path):
+    job = BatchJob(str(tmp_path))
+
+    with batch_mode(job), pytest.raises(CompletionDeferred) as excinfo:
+        multichunk_translation(
+            "English", "Spanish", ["One. ", "Two. "], schedule="dataflow"
+        )
+
+    assert excinfo.value.count == 2
+    assert job.pending == 2
+
+
+def test_async_dataflow_schedule_collects_every_chunk(tmp_path):
+    chunks = ["One. ", "Two. ", "Three. "]
+
+    def run():
+        translations, _ = asyncio.run(
+            amultichunk_dataflow_translation(
+                "English", "Spanish", chunks, max_concurrency=2
+            )
+        )
+        return translations
+
+    result, batch_sizes = run_rounds(str(tmp_path), run)
+
+    assert result == ["improved"] * 3
+    assert batch_sizes == [3, 3, 3]
+
+
+def test_async_dataflow_cancels_other_chunks_on_error(mocker):
+    cancelled = []
+
+    async def fake_aget_completion(prompt, system_message=None):
+        chunk = prompt.split("<TRANSLATE_THIS>")[-1]
+        if "Two" in chunk:
+            raise ValueError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(chunk)
+            raise
+
+    mocker.patch(
+        "translation_agent.async_utils.aget_completion",
+        side_effect=fake_aget_completion,
+    )
+
+    async def run():
+        with pytest.raises(ValueError):
+            await amultichunk_dataflow_translation(
+                "English",
+                "Spanish",
+                ["One. ", "Two. ", "Three. "],
+                max_concurrency=3,
+            )
+        # 其余的块在错误抛出时已被取消，不会继续发出请求
+        await asyncio.sleep(0)
+        return len(cancelled)
+
+    assert asyncio.run(run()) == 2
+
+
+def test_translate_many_in_batch_mode(tmp_path, mocker):
+    mocker.patch(
+        "translation_agent.tokens.get_encoding", return_value=BYTE_ENCODING
+    )
+    # icecream 在多个线程中首次解析源码时会触发 CPython 3.11 的 ast 竞争问题
+    mocker.patch("translation_agent.utils.ic")
+    records = [{"text": f"record {i}"} for i in range(5)]
+    sink = str(tmp_path / "out.jsonl")
+
+    count, batch_sizes = run_rounds(
+        str(tmp_path / "job"),
+        lambda: translate_many("English", "Spanish", records, sink),
+    )
+
+    assert count == 5
+    assert batch_sizes == [5, 5, 5]
+    with open(sink, encoding="utf-8") as f:
+        assert [json.loads(line)["translation"] for line in f] == [
+            "improved"
+        ] * 5
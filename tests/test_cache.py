@@ -0,0 +1,84 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from translation_agent import utils
+from translation_agent.cache import CompletionCache
+
+
+def test_completion_cache_persists_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = CompletionCache.key("model", "system", "prompt", 0.3, False)
+
+    cache = CompletionCache(path)
+    assert cache.get(key) is None
+    cache.set(key, "value")
+    cache.close()
+
+    reopened = CompletionCache(path)
+    assert reopened.get(key) == "value"
+    assert reopened.stats.disk_hits == 1
+    assert reopened.get(key) == "value"
+    assert reopened.stats.memory_hits == 1
+    assert reopened.stats.hit_rate == 1.0
+
+
+def test_completion_cache_key_covers_all_parameters():
+    base = ("model", "system", "prompt", 0.3, False)
+    keys = {CompletionCache.key(*base)}
+    for i, changed in enumerate(["other", "other", "other", 0.7, True]):
+        params = list(base)
+        params[i] = changed
+        keys.add(CompletionCache.key(*params))
+
+    assert len(keys) == 6
+
+
+def test_completion_cache_evicts_least_recently_used():
+    cache = CompletionCache(max_entries=2, memory_entries=0)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats.evictions == 1
+
+
+def test_completion_cache_expires_entries(mocker):
+    clock = mocker.patch("translation_agent.cache.time.time", return_value=0)
+    cache = CompletionCache(ttl=10)
+    cache.set("a", "1")
+
+    clock.return_value = 5
+    assert cache.get("a") == "1"
+
+    clock.return_value = 11
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def completion_cache():
+    cache = CompletionCache()
+    utils.set_completion_cache(cache)
+    yield cache
+    utils.set_completion_cache(None)
+
+
+def test_get_completion_uses_cache(mocker, completion_cache):
+    response = MagicMock()
+    response.choices[0].message.content = "Bonjour"
+    create = mocker.patch.object(
+        utils.client.chat.completions, "create", return_value=response
+    )
+
+    first = utils.get_completion("Hello", "system", "model")
+    second = utils.get_completion("Hello", "system", "model")
+
+    assert first == second == "Bonjour"
+    create.assert_called_once()
+    assert completion_cache.stats.hits == 1
+    assert completion_cache.stats.misses == 1
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from translation_agent import utils
+from translation_agent.async_utils import aget_completion
+from translation_agent.cassette import Cassette
+from translation_agent.cassette import CassetteMissError
+from translation_agent.stats import collect_stats
+from translation_agent.utils import one_chunk_translate_text
+
+
+@pytest.fixture
+def fake_create(fake_response):
+    def create(**kwargs):
+        prompt = kwargs["messages"][1]["content"]
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            content = "improved"
+        elif "<TRANSLATION>" in prompt:
+            content = "reflection"
+        else:
+            content = "draft"
+        time.sleep(0.05)
+        return fake_response(content)
+
+    return create
+
+
+@pytest.fixture
+def tape_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "cassette", None)
+    return str(tmp_path / "runs" / "tape.jsonl.gz")
+
+
+def record_run(mocker, path, fake_create):
+    mocker.patch.object(
+        utils.client.chat.completions, "create", side_effect=fake_create
+    )
+    with Cassette(path, mode="record") as tape:
+        utils.set_cassette(tape)
+        result = one_chunk_translate_text("English", "Spanish", "Hello")
+    utils.set_cassette(None)
+    return result, tape
+
+
+def test_replay_serves_recorded_run_offline(mocker, tape_path, fake_create):
+    recorded, tape = record_run(mocker, tape_path, fake_create)
+    assert recorded == "improved"
+    assert len(tape) == 3
+
+    create = mocker.patch.object(
+        utils.client.chat.completions,
+        "create",
+        side_effect=AssertionError("不应访问网络"),
+    )
+    utils.set_cassette(Cassette(tape_path, latency_scale=0.0))
+    with collect_stats() as stats:
+        replayed = one_chunk_translate_text("English", "Spanish", "Hello")
+
+    assert replayed == recorded
+    assert create.call_count == 0
+    assert stats.calls == 3
+    assert stats.wall_seconds < 0.05
+
+
+def test_replay_scales_recorded_latency(mocker, tape_path, fake_create):
+    record_run(mocker, tape_path, fake_create)
+    tape = Cassette(tape_path, latency_scale=2.0)
+    key = tape.key(
+        utils.default_model(),
+        "你是一个提供帮助的助手。",
+        "Hello",
+        0.3,
+        False,
+    )
+    tape.record(key, "Hola", 0.05)
+    utils.set_cassette(tape)
+
+    started = time.perf_counter()
+    assert utils.get_completion("Hello") == "Hola"
+    assert time.perf_counter() - started >= 0.1
+
+    started = time.perf_counter()
+    assert asyncio.run(aget_completion("Hello")) == "Hola"
+    assert time.perf_counter() - started >= 0.1
+
+
+def test_replay_repeats_in_recorded_order(tape_path):
+    with Cassette(tape_path, mode="record") as tape:
+        tape.record("k", "first", 0.0)
+        tape.record("k", "second", 0.0)
+
+    tape = Cassette(tape_path)
+    assert [tape.lookup("k").content for _ in range(3)] == [
+        "first",
+        "second",
+        "second",
+    ]
+
+
+def test_replay_miss(mocker, tape_path, fake_create):
+    Cassette(tape_path, mode="record").close()
+
+    utils.set_cassette(Cassette(tape_path))
+    with pytest.raises(CassetteMissError):
+        utils.get_completion("Hello")
+
+    create = mocker.patch.object(
+        utils.client.chat.completions, "create", side_effect=fake_create
+    )
+    utils.set_cassette(Cassette(tape_path, passthrough=True))
+    assert utils.get_completion("Hello") == "draft"
+    assert create.call_count == 1
@@ -0,0 +1,69 @@
+import pytest
+import tiktoken
+
+from translation_agent.chunking import chunk_spans
+from translation_agent.chunking import chunk_text
+from translation_agent.chunking import sentence_boundaries
+from translation_agent.tokens import TokenizedText
+from translation_agent.utils import calculate_chunk_size
+
+
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+def test_chunk_text_splits_cjk_on_sentence_boundaries():
+    text = "今天天气很好。我们去公园散步吧！你觉得怎么样？" * 6
+    tokenized = TokenizedText(text, encoding=BYTE_ENCODING)
+
+    chunks = chunk_text(tokenized, 100)
+
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.encode("utf-8")) <= 100
+        assert chunk[-1] in "。！？"
+
+
+def test_chunk_spans_are_balanced():
+    # 13 个 10 令牌的句子、上限 100 时贪心切分得到 100 + 30，平衡切分应为 70 + 60
+    text = "Sentence. " * 13
+    tokenized = TokenizedText(text, encoding=BYTE_ENCODING)
+
+    sizes = [
+        tokenized.count(start, end)
+        for start, end in chunk_spans(tokenized, 100)
+    ]
+
+    assert sum(sizes) == len(tokenized)
+    assert len(sizes) == 2
+    assert max(sizes) - min(sizes) <= 10
+
+
+def test_chunk_spans_hard_splits_long_sentences():
+    text = "word " * 50 + "x" * 120 + ". Short one."
+    tokenized = TokenizedText(text, encoding=BYTE_ENCODING)
+
+    spans = chunk_spans(tokenized, 40)
+
+    assert "".join(text[start:end] for start, end in spans) == text
+    assert all(tokenized.count(start, end) <= 40 for start, end in spans)
+
+
+def test_sentence_boundaries_skip_decimal_points():
+    text = "Pi is 3.14 today. 真的吗？是的。"
+
+    assert sentence_boundaries(text) == [
+        len("Pi is 3.14 today. "),
+        len("Pi is 3.14 today. 真的吗？"),
+        len(text),
+    ]
+
+
+def test_calculate_chunk_size_is_deprecated():
+    with pytest.warns(DeprecationWarning):
+        assert calculate_chunk_size(1530, 500) == 389
@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+from translation_agent.cli import MANIFEST_NAME
+from translation_agent.cli import Job
+from translation_agent.cli import Progress
+from translation_agent.cli import collect_jobs
+from translation_agent.cli import main
+
+
+def fake_translate(source_lang, target_lang, text, country, **kwargs):
+    if "boom" in text:
+        raise RuntimeError("boom")
+    return text.upper()
+
+
+@pytest.fixture
+def translate(mocker):
+    return mocker.patch(
+        "translation_agent.utils.translate", side_effect=fake_translate
+    )
+
+
+@pytest.fixture
+def docs(tmp_path):
+    root = tmp_path / "docs"
+    (root / "guide").mkdir(parents=True)
+    (root / "intro.txt").write_text("hello", encoding="utf-8")
+    (root / "guide" / "setup.md").write_text("set up", encoding="utf-8")
+    (root / "image.png").write_bytes(b"\x89PNG")
+    return root
+
+
+def run(*args):
+    return main(["-s", "English", "-t", "Spanish", *map(str, args)])
+
+
+def test_translates_directory_and_resumes(translate, docs, tmp_path, capsys):
+    out = tmp_path / "out"
+
+    assert run(docs, "-o", out, "-j", "2") == 0
+    assert (out / "intro.txt").read_text(encoding="utf-8") == "HELLO"
+    assert (out / "guide" / "setup.md").read_text(encoding="utf-8") == "SET UP"
+    assert translate.call_count == 2
+    manifest = json.loads((out / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert set(manifest) == {"intro.txt", os.path.join("guide", "setup.md")}
+    assert "[2/2] 100%" in capsys.readouterr().err
+
+    # 已完成的文件被跳过，只有修改过的文件重新翻译
+    (docs / "intro.txt").write_text("hello again", encoding="utf-8")
+    assert run(docs, "-o", out) == 0
+    assert translate.call_count == 3
+    assert (out / "intro.txt").read_text(encoding="utf-8") == "HELLO AGAIN"
+
+    # 翻译设置变化时全部重新翻译
+    assert run(docs, "-o", out, "--pipeline", "draft") == 0
+    assert translate.call_count == 5
+
+
+def test_failed_file_leaves_no_output(translate, docs, tmp_path):
+    (docs / "broken.txt").write_text("boom", encoding="utf-8")
+    out = tmp_path / "out"
+
+    assert run(docs, "-o", out, "-q") == 1
+    assert not (out / "broken.txt").exists()
+    manifest = json.loads((out / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert manifest["broken.txt"] == {"error": "RuntimeError: boom"}
+    assert (out / "intro.txt").exists()
+    assert [name for name in os.listdir(out) if name.endswith(".tmp")] == []
+
+    # 重新运行时只重试失败的文件
+    (docs / "broken.txt").write_text("fixed", encoding="utf-8")
+    assert run(docs, "-o", out, "-q") == 0
+    assert translate.call_count == 4
+
+
+def test_unreadable_file_is_marked_failed(translate, docs, tmp_path):
+    (docs / "latin1.txt").write_bytes("café".encode("latin-1"))
+    out = tmp_path / "out"
+
+    assert run(docs, "-o", out, "-q") == 1
+    assert (out / "intro.txt").exists()
+    assert translate.call_count == 2
+    manifest = json.loads((out / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert "UnicodeDecodeError" in manifest["latin1.txt"]["error"]
+
+
+def test_progress_counts_only_completed_files():
+    progress = Progress(2, 100, stream=None)
+
+    progress.update(Job("a", "a"), 60, "RuntimeError: boom")
+    assert progress.eta() is None
+    assert progress.total_chars == 40
+
+    progress.started -= 10
+    progress.update(Job("b", "b"), 20)
+    # 10 秒完成 20 个字符，剩余 20 个字符约需 10 秒
+    assert progress.eta() == pytest.approx(10, rel=0.1)
+
+
+def test_collect_jobs_expands_globs_and_files(docs, tmp_path):
+    out = docs / "out"
+    out.mkdir()
+    (out / "intro.txt").write_text("HELLO", encoding="utf-8")
+
+    jobs = collect_jobs(
+        [str(docs / "**" / "*.md"), str(docs / "intro.txt")], str(out)
+    )
+    assert [job.relative for job in jobs] == [
+        os.path.join("guide", "setup.md"),
+        "intro.txt",
+    ]
+    # 输出目录在输入目录中时不会被当作输入
+    assert len(collect_jobs([str(docs)], str(out))) == 2
+
+    with pytest.raises(FileNotFoundError):
+        collect_jobs([str(docs / "*.rst")], str(out))
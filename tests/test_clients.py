@@ -0,0 +1,59 @@
+import asyncio
+
+import openai
+import pytest
+
+from translation_agent import clients
+from translation_agent.clients import ClientOptions
+from translation_agent.clients import get_async_client
+from translation_agent.clients import get_client
+
+
+def test_get_client_is_cached_per_endpoint_url_and_key():
+    first = get_client("key-a", "https://example.com/v1", "CUSTOM")
+
+    assert get_client("key-a", "https://example.com/v1", "CUSTOM") is first
+    assert get_client("key-b", "https://example.com/v1", "CUSTOM") is not first
+    assert get_client("key-a", "https://example.org/v1", "CUSTOM") is not first
+    assert first.max_retries == 0
+
+
+def test_client_uses_pool_options():
+    options = ClientOptions(max_connections=7, timeout=42.0)
+    client = get_client("key", "https://example.com/v1", options=options)
+
+    pool = client._client._transport._pool
+    assert pool._max_connections == 7
+    assert client.timeout.read == 42.0
+    assert get_client("key", "https://example.com/v1") is not client
+
+
+def test_get_async_client():
+    client = get_async_client("key", "https://example.com/v1")
+
+    assert isinstance(client, openai.AsyncOpenAI)
+    assert get_async_client("key", "https://example.com/v1") is client
+    assert get_client("key", "https://example.com/v1") is not client
+
+
+def test_get_async_client_is_cached_per_event_loop():
+    async def fetch():
+        client = get_async_client("key", "https://example.com/v1")
+        assert get_async_client("key", "https://example.com/v1") is client
+        return client
+
+    first = asyncio.run(fetch())
+    second = asyncio.run(fetch())
+
+    # 第二个事件循环不复用绑定在已关闭事件循环上的连接池
+    assert second is not first
+    assert first not in clients._clients.values()
+
+
+def test_http2_requires_h2(mocker):
+    mocker.patch("importlib.util.find_spec", return_value=None)
+
+    with pytest.raises(ImportError):
+        clients.get_client(
+            "key", "https://example.com/v1", options=ClientOptions(http2=True)
+        )
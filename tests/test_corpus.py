@@ -0,0 +1,79 @@
+import io
+import json
+import threading
+import time
+
+from translation_agent.corpus import iter_translations
+from translation_agent.corpus import read_jsonl
+from translation_agent.corpus import translate_many
+
+
+def test_translate_many_writes_jsonl_in_order(mocker, tmp_path):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_translate(source_lang, target_lang, text, country, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        # 靠前的记录更晚完成
+        time.sleep(0.002 * (20 - int(text.split()[1])))
+        with lock:
+            in_flight -= 1
+        return text.upper()
+
+    mocker.patch(
+        "translation_agent.utils.translate", side_effect=fake_translate
+    )
+
+    records = [{"id": i, "text": f"record {i}"} for i in range(20)]
+    path = str(tmp_path / "out.jsonl")
+
+    count = translate_many(
+        "English", "Spanish", records, path, max_workers=3
+    )
+
+    assert count == 20
+
+    results = list(read_jsonl(path))
+    assert [result["id"] for result in results] == list(range(20))
+    assert results[5] == {
+        "id": 5,
+        "text": "record 5",
+        "translation": "RECORD 5",
+    }
+    assert peak <= 3
+
+
+def test_iter_translations_reads_records_lazily(mocker):
+    mocker.patch(
+        "translation_agent.utils.translate",
+        side_effect=lambda sl, tl, text, country, **kwargs: text[::-1],
+    )
+    consumed = []
+
+    def records():
+        for i in range(100):
+            consumed.append(i)
+            yield f"text {i}"
+
+    results = iter_translations("English", "Spanish", records(), max_workers=2)
+    first = next(results)
+    results.close()
+
+    assert first == {"text": "text 0", "translation": "0 txet"}
+    assert len(consumed) <= 4
+
+
+def test_translate_many_accepts_file_objects(mocker):
+    mocker.patch(
+        "translation_agent.utils.translate",
+        side_effect=lambda sl, tl, text, country, **kwargs: "hola",
+    )
+    sink = io.StringIO()
+
+    translate_many("English", "Spanish", ["hello"], sink, output_key="es")
+
+    assert json.loads(sink.getvalue()) == {"text": "hello", "es": "hola"}
@@ -0,0 +1,94 @@
+import pytest
+import tiktoken
+
+from translation_agent import utils
+from translation_agent.gating import NO_CHANGES
+from translation_agent.gating import ReflectionGate
+from translation_agent.gating import dominant_script
+from translation_agent.gating import reflection_is_empty
+from translation_agent.stats import collect_stats
+from translation_agent.utils import multichunk_translation
+
+
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+@pytest.fixture(autouse=True)
+def byte_encoding(mocker):
+    mocker.patch(
+        "translation_agent.gating.get_encoding", return_value=BYTE_ENCODING
+    )
+
+
+def test_reflection_is_empty():
+    assert reflection_is_empty(NO_CHANGES)
+    assert reflection_is_empty("  无需修改。\n")
+    assert reflection_is_empty("No changes needed.")
+    assert reflection_is_empty("")
+    assert not reflection_is_empty("1. 将“你好”改为“您好”。")
+
+
+def test_dominant_script():
+    assert dominant_script("Hello, 世界!") == "LATIN"
+    assert dominant_script("简介与概述 API") == "CJK"
+    assert dominant_script("42 %") is None
+
+
+def test_gate_decisions():
+    gate = ReflectionGate(max_tokens=40)
+
+    assert gate.review_reason("2024-06-01", "2024-06-01") is None
+    assert gate.review_reason("Introduction", "Introducción") is None
+    assert gate.review_reason("Introduction", "") == "empty"
+    assert gate.review_reason("x" * 41, "y" * 41) == "long"
+    assert gate.review_reason("Quarterly results", "Quarterly results") == (
+        "untranslated"
+    )
+    assert gate.review_reason("Quarterly results", "R") == "length"
+
+
+def test_gate_saves_reflect_and_improve_calls(mocker):
+    def fake_completion(prompt, system_message=None):
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            return "improved"
+        if "<TRANSLATION>" in prompt:
+            return "Use a more formal tone."
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[-1].split("\n")[0]
+        return "Resumen" if chunk == "Summary" else "Un texto traducido largo."
+
+    completion = mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+    chunks = ["Summary", "A long paragraph that should still be reviewed."]
+
+    utils.set_reflection_gate(ReflectionGate(max_tokens=20))
+    try:
+        with collect_stats() as stats:
+            result = multichunk_translation("English", "Spanish", chunks)
+    finally:
+        utils.set_reflection_gate(None)
+
+    assert result == ["Resumen", "improved"]
+    assert completion.call_count == 4
+    assert stats.stages["reflect"].skipped == 1
+    assert stats.stages["improve"].skipped == 1
+    assert stats.saved == 2
+
+
+def test_no_changes_reflection_skips_improve(mocker):
+    completion = mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["Hola", NO_CHANGES],
+    )
+
+    with collect_stats() as stats:
+        result = utils.one_chunk_translate_text("English", "Spanish", "Hello")
+
+    assert result == "Hola"
+    assert completion.call_count == 2
+    assert stats.saved == 1
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+
+# import translation_agent.utils 的耗时预算（秒），取多次运行的最小值比较
+IMPORT_BUDGET = 0.5
+
+HEAVY_MODULES = ("openai", "httpx", "tiktoken", "icecream", "dotenv")
+
+SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import translation_agent
+import translation_agent.utils
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": sorted({name.split(".")[0] for name in sys.modules}),
+    "client": "client" in vars(translation_agent.utils),
+}))
+"""
+
+
+def run_import():
+    # 不设置 API 密钥，导入也不应失败
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key not in ("GROQ_API_KEY", "OPENAI_API_KEY")
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def test_import_is_lazy_and_within_budget():
+    runs = [run_import() for _ in range(3)]
+
+    for run in runs:
+        assert not set(HEAVY_MODULES) & set(run["loaded"])
+        assert not run["client"]
+    assert min(run["seconds"] for run in runs) < IMPORT_BUDGET
+
+
+def test_client_created_on_first_use(monkeypatch):
+    from translation_agent import utils
+
+    monkeypatch.delitem(vars(utils), "client", raising=False)
+    monkeypatch.setenv("GROQ_API_KEY", "late")
+    monkeypatch.setenv("OpenAI_Compatibility_BASE_URL", "https://late.test/v1")
+
+    assert utils.client is utils.default_client()
+    assert utils.client.api_key == "late"
+    assert str(utils.client.base_url) == "https://late.test/v1/"
@@ -0,0 +1,263 @@
+import sqlite3
+
+import pytest
+
+from translation_agent import utils
+from translation_agent.memory import TranslationMemory
+from translation_agent.memory import split_sentences
+from translation_agent.utils import multichunk_translation
+from translation_agent.utils import one_chunk_initial_translation
+from translation_agent.utils import one_chunk_translate_text
+
+
+def test_translation_memory_exact_match_ignores_whitespace(tmp_path):
+    path = str(tmp_path / "tm.sqlite")
+    memory = TranslationMemory(path)
+    memory.add("English", "Spanish", "Hello,  world!\n", "¡Hola, mundo!")
+    memory.close()
+
+    memory = TranslationMemory(path)
+    assert memory.exact("English", "Spanish", " Hello, world!") == (
+        "¡Hola, mundo!"
+    )
+    assert memory.exact("English", "French", "Hello, world!") is None
+    assert len(memory) == 1
+
+
+def test_translation_memory_opens_database_without_aligned_column(tmp_path):
+    path = str(tmp_path / "tm.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE segments ("
+        "id INTEGER PRIMARY KEY, lang_pair TEXT NOT NULL, "
+        "source_hash TEXT NOT NULL, source TEXT NOT NULL, "
+        "translation TEXT NOT NULL, UNIQUE (lang_pair, source_hash))"
+    )
+    conn.commit()
+    conn.close()
+
+    memory = TranslationMemory(path)
+    memory.add("English", "Spanish", "Hello.", "Hola.")
+
+    assert memory.exact("English", "Spanish", "Hello.") == "Hola."
+
+
+def test_translation_memory_fuzzy_match():
+    memory = TranslationMemory()
+    memory.add(
+        "English",
+        "Spanish",
+        "The quick brown fox jumps over the lazy dog.",
+        "El rápido zorro marrón salta sobre el perro perezoso.",
+    )
+    memory.add(
+        "English",
+        "Spanish",
+        "Quarterly revenue grew by twelve percent.",
+        "Los ingresos trimestrales crecieron un doce por ciento.",
+    )
+
+    matches = memory.fuzzy(
+        "English", "Spanish", "The quick brown fox jumps over the lazy cat."
+    )
+
+    assert [match.source for match in matches] == [
+        "The quick brown fox jumps over the lazy dog."
+    ]
+    assert 0.6 <= matches[0].score < 1.0
+    assert memory.fuzzy("English", "Spanish", "Something else entirely") == []
+
+
+def test_split_sentences_round_trips():
+    text = "\nHello there.  How are you?\n\n你好。再见！"
+
+    sentences = split_sentences(text)
+
+    assert "".join("".join(parts) for parts in sentences) == text
+    assert [core for _, core, _ in sentences if core] == [
+        "Hello there.",
+        "How are you?",
+        "你好。",
+        "再见！",
+    ]
+
+
+def test_translation_memory_recalls_accepted_sentences():
+    memory = TranslationMemory()
+    memory.add("English", "Spanish", "Welcome aboard.", "Bienvenido.")
+    memory.add("English", "Spanish", "Bring your badge.", "Traiga su credencial.")
+
+    # 块在另一个文档中重新组合，整块不同，但每个句子都命中
+    assert memory.recall(
+        "English", "Spanish", "Welcome aboard.\n\nBring your badge. "
+    ) == "Bienvenido.\n\nTraiga su credencial. "
+    assert (
+        memory.recall("English", "Spanish", "Bring your badge. And a pen.")
+        is None
+    )
+
+
+def test_translation_memory_keeps_aligned_sentences_for_reference_only():
+    memory = TranslationMemory()
+    memory.learn(
+        "English",
+        "Spanish",
+        "The office opens at nine. Bring your badge.",
+        "La oficina abre a las nueve. Traiga su credencial.",
+    )
+    memory.learn("English", "Spanish", "Welcome aboard.", "Bienvenido.")
+
+    # 按句子数猜出的句子对不作为已接受的翻译复用
+    assert memory.exact("English", "Spanish", "Bring your badge.") is None
+    assert (
+        memory.recall(
+            "English", "Spanish", "Welcome aboard. Bring your badge."
+        )
+        is None
+    )
+    assert memory.exact(
+        "English", "Spanish", "The office opens at nine. Bring your badge."
+    ) == "La oficina abre a las nueve. Traiga su credencial."
+
+    # 之后被接受的翻译覆盖猜出的句子对，反过来则不会
+    memory.add("English", "Spanish", "Bring your badge.", "Traiga su gafete.")
+    memory.learn(
+        "English",
+        "Spanish",
+        "Sign in. Bring your badge.",
+        "Regístrese. Traiga su credencial.",
+    )
+    assert memory.exact("English", "Spanish", "Bring your badge.") == (
+        "Traiga su gafete."
+    )
+
+    # 句子数不同时无法对齐，只保存整个片段
+    memory.learn("English", "Spanish", "One. Two.", "Uno y dos.")
+    assert memory.references("English", "Spanish", "One. Three.") == []
+
+    references = memory.references(
+        "English", "Spanish", "Welcome aboard. The office opens at ten."
+    )
+    assert references[0].source == "Welcome aboard."
+    assert references[0].score == 1.0
+    assert "The office opens at nine." in [m.source for m in references]
+
+
+def test_translation_memory_keys_translations_by_country():
+    memory = TranslationMemory()
+    memory.add("English", "Spanish", "Grab the bus.", "Toma el camión.", "Mexico")
+
+    assert memory.exact("English", "Spanish", "Grab the bus.", "Mexico") == (
+        "Toma el camión."
+    )
+    assert memory.exact("English", "Spanish", "Grab the bus.", "Spain") is None
+    assert memory.recall("English", "Spanish", "Grab the bus.") is None
+
+    # 为其他国家审校过的翻译仍可作为模糊参考
+    matches = memory.fuzzy("English", "Spanish", "Grab the bus now.")
+    assert [match.translation for match in matches] == ["Toma el camión."]
+
+
+@pytest.fixture
+def translation_memory():
+    memory = TranslationMemory()
+    utils.set_translation_memory(memory)
+    yield memory
+    utils.set_translation_memory(None)
+
+
+def test_one_chunk_translate_text_reuses_and_writes_back(
+    mocker, translation_memory
+):
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["Hola", "Bien.", "Hola."],
+    )
+
+    first = one_chunk_translate_text("English", "Spanish", "Hello")
+    second = one_chunk_translate_text("English", "Spanish", "Hello")
+
+    assert first == second == "Hola."
+    assert mock_get_completion.call_count == 3
+    assert translation_memory.exact("English", "Spanish", "Hello") == "Hola."
+
+
+def test_initial_translation_prompt_includes_fuzzy_references(
+    mocker, translation_memory
+):
+    translation_memory.add(
+        "English",
+        "Spanish",
+        "Open source software is everywhere.",
+        "El software de código abierto está en todas partes.",
+    )
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion", return_value="ok"
+    )
+
+    one_chunk_initial_translation(
+        "English", "Spanish", "Open source software is everywhere now."
+    )
+
+    prompt = mock_get_completion.call_args.args[0]
+    assert "<REFERENCES>" in prompt
+    assert "código abierto" in prompt
+
+
+def test_multichunk_translation_skips_remembered_chunks(
+    mocker, translation_memory
+):
+    translation_memory.add("English", "Spanish", "Known. ", "Conocido.")
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion", return_value="Nuevo."
+    )
+
+    result = multichunk_translation("English", "Spanish", ["Known. ", "New."])
+
+    assert result == ["Conocido.", "Nuevo."]
+    # 只有未命中的块需要初始翻译、反思和改进三次调用
+    assert mock_get_completion.call_count == 3
+    assert translation_memory.exact("English", "Spanish", "New.") == "Nuevo."
+
+
+def test_multichunk_translation_looks_up_each_chunk_once(
+    mocker, translation_memory
+):
+    translation_memory.add("English", "Spanish", "Known.", "Conocido.")
+    translation_memory.add("English", "Spanish", "Again.", "Otra vez.")
+    recall = mocker.spy(translation_memory, "recall")
+    mocker.patch(
+        "translation_agent.utils.get_completion", return_value="Nuevo."
+    )
+
+    result = multichunk_translation(
+        "English", "Spanish", ["Again. Known. ", "New."], pipeline="fused"
+    )
+
+    assert result == ["Otra vez. Conocido. ", "Nuevo."]
+    assert recall.call_count == 2
+
+
+def test_one_chunk_translate_text_does_not_reuse_other_country(
+    mocker, translation_memory
+):
+    translation_memory.add(
+        "English", "Spanish", "Grab the bus.", "Toma el camión.", "Mexico"
+    )
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["Coge el autobús.", "Bien.", "Coge el autobús."],
+    )
+
+    result = one_chunk_translate_text(
+        "English", "Spanish", "Grab the bus.", "Spain"
+    )
+
+    assert result == "Coge el autobús."
+    assert mock_get_completion.call_count == 3
+    assert translation_memory.exact(
+        "English", "Spanish", "Grab the bus.", "Spain"
+    ) == "Coge el autobús."
+    assert translation_memory.exact(
+        "English", "Spanish", "Grab the bus.", "Mexico"
+    ) == "Toma el camión."
@@ -0,0 +1,129 @@
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from translation_agent import utils
+from translation_agent.metrics import Histogram
+from translation_agent.metrics import ModelPrice
+from translation_agent.metrics import estimate_cost
+from translation_agent.metrics import prometheus_text
+from translation_agent.retry import RetryPolicy
+from translation_agent.stats import PipelineStats
+from translation_agent.stats import collect_stats
+from translation_agent.stats import global_stats
+from translation_agent.stats import set_global_stats
+from translation_agent.utils import multichunk_translation
+
+
+@pytest.fixture
+def completion(fake_response):
+    def build(content):
+        return fake_response(
+            content,
+            SimpleNamespace(
+                prompt_tokens=1000,
+                completion_tokens=100,
+                total_tokens=1100,
+                prompt_tokens_details=SimpleNamespace(cached_tokens=400),
+            ),
+        )
+
+    return build
+
+
+@pytest.fixture
+def no_retry_delay():
+    policy = utils.retry_policy
+    utils.set_retry_policy(RetryPolicy(initial_delay=0.0, jitter=0.0))
+    yield
+    utils.set_retry_policy(policy)
+
+
+def test_histogram_cumulative_buckets():
+    histogram = Histogram(buckets=(1.0, 5.0))
+    for value in (0.5, 1.0, 3.0, 9.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("1.0", 2), ("5.0", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+    assert histogram.sum == 13.5
+
+
+def test_estimate_cost_uses_cached_price():
+    price = ModelPrice(prompt=2.0, completion=8.0, cached_prompt=0.5)
+
+    assert price.cost(1_000_000, 0, 0) == 2.0
+    assert price.cost(1_000_000, 1_000_000, 500_000) == 1.0 + 0.25 + 8.0
+    assert estimate_cost("unknown-model", 1000, 1000) == 0.0
+
+
+def test_stats_per_chunk_retries_and_cost(
+    mocker, no_retry_delay, completion
+):
+    failures = [
+        openai.APITimeoutError(request=httpx.Request("POST", "https://x"))
+    ]
+
+    def create(**kwargs):
+        if failures:
+            raise failures.pop()
+        prompt = kwargs["messages"][1]["content"]
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            return completion("improved")
+        if "<TRANSLATION>" in prompt:
+            return completion("reflection")
+        return completion("draft")
+
+    mocker.patch.object(
+        utils.client.chat.completions, "create", side_effect=create
+    )
+
+    with collect_stats() as stats:
+        result = multichunk_translation(
+            "English", "Spanish", ["One. ", "Two. "], max_concurrency=1
+        )
+
+    assert result == ["improved", "improved"]
+    assert stats.retries == 1
+    assert stats.stages["initial"].retries == 1
+    assert stats.chunks[0].retries == 1
+    assert stats.chunks[1].calls == 3
+    assert stats.chunks[1].completion_tokens == 300
+    assert stats.stages["reflect"].latency.count == 2
+
+    exported = json.loads(json.dumps(stats.as_dict()))
+    assert exported["stages"]["improve"]["prompt_tokens"] == 2000
+    assert exported["chunks"]["0"]["calls"] == 3
+
+
+def test_global_stats_prometheus_export(mocker, completion):
+    mocker.patch.object(
+        utils.client.chat.completions,
+        "create",
+        return_value=completion("draft"),
+    )
+
+    set_global_stats(PipelineStats())
+    try:
+        utils.get_completion("Hello", model="gpt-4o-mini")
+        stats = global_stats()
+        text = prometheus_text(stats)
+    finally:
+        set_global_stats(None)
+
+    # 600 个未缓存和 400 个缓存的提示令牌，100 个补全令牌
+    assert stats.cost == pytest.approx(
+        (600 * 0.15 + 400 * 0.075 + 100 * 0.6) / 1e6
+    )
+    assert "# TYPE translation_agent_requests_total counter" in text
+    assert 'translation_agent_requests_total{stage="completion"} 1' in text
+    assert (
+        'translation_agent_cached_tokens_total{stage="completion"} 400' in text
+    )
+    assert (
+        'translation_agent_request_seconds_bucket{stage="completion",le="+Inf"} 1'
+        in text
+    )
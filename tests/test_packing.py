@@ -0,0 +1,133 @@
+import json
+
+import tiktoken
+
+from translation_agent import utils
+from translation_agent.corpus import read_jsonl
+from translation_agent.corpus import translate_many
+from translation_agent.memory import TranslationMemory
+from translation_agent.packing import pack_segments
+from translation_agent.packing import translate_packed
+from translation_agent.packing import unpack_translations
+
+
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+def segments_in(prompt):
+    body = prompt.split("<SEGMENTS>\n")[1].split("\n</SEGMENTS>")[0]
+    return json.loads(body)
+
+
+def test_pack_segments_respects_budget_and_order():
+    assert pack_segments([3, 3, 3, 5, 1], max_tokens=6) == [
+        [0, 1],
+        [2],
+        [3, 4],
+    ]
+    assert pack_segments([1] * 5, max_tokens=100, max_items=2) == [
+        [0, 1],
+        [2, 3],
+        [4],
+    ]
+    # 超过预算的片段单独成组
+    assert pack_segments([10, 1], max_tokens=4) == [[0], [1]]
+
+
+def test_unpack_translations_validates_entries():
+    content = json.dumps(
+        {
+            "translations": [
+                {"id": 1, "translation": "uno"},
+                {"id": "0", "translation": "cero"},
+                {"id": 1, "translation": "duplicate"},
+                {"id": 7, "translation": "out of range"},
+                {"id": 2, "translation": ""},
+                "garbage",
+            ]
+        }
+    )
+
+    assert unpack_translations(content, 3) == ["cero", "uno", None]
+    assert unpack_translations("not json", 2) == [None, None]
+    assert unpack_translations('{"translations": {}}', 1) == [None]
+
+
+def test_translate_packed_falls_back_per_item(mocker):
+    mocker.patch(
+        "translation_agent.utils.get_encoding", return_value=BYTE_ENCODING
+    )
+    memory = TranslationMemory()
+    mocker.patch.object(utils, "translation_memory", memory)
+
+    def fake_completion(prompt, system_message=None, json_mode=False):
+        if json_mode:
+            # 漏掉最后一个条目
+            items = segments_in(prompt)[:-1]
+            return json.dumps(
+                {
+                    "translations": [
+                        {"id": item["id"], "translation": item["text"].upper()}
+                        for item in items
+                    ]
+                }
+            )
+        # 逐条重新翻译时同样带上国家的要求
+        assert "Mexico" in prompt
+        return "fallback"
+
+    completion = mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    result = translate_packed("English", "Spanish", ["a", "b", "c"], "Mexico")
+
+    assert result == ["A", "B", "fallback"]
+    assert completion.call_count == 2
+    # 打包的译文只是草稿，不写回翻译记忆
+    assert len(memory) == 0
+
+    # 翻译记忆中已接受的译文直接复用
+    memory.add("English", "Spanish", "c", "C", "Mexico")
+    assert translate_packed("English", "Spanish", ["c"], "Mexico") == ["C"]
+    assert completion.call_count == 2
+
+
+def test_translate_many_packs_short_records(mocker, tmp_path):
+    mocker.patch(
+        "translation_agent.utils.get_encoding", return_value=BYTE_ENCODING
+    )
+    mocker.patch("translation_agent.packing.ic")
+
+    def fake_completion(prompt, system_message=None, json_mode=False):
+        items = segments_in(prompt)
+        return json.dumps(
+            {
+                "translations": [
+                    {"id": item["id"], "translation": item["text"][::-1]}
+                    for item in items
+                ]
+            }
+        )
+
+    completion = mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+    records = [{"id": i, "text": f"record {i}"} for i in range(40)]
+    path = str(tmp_path / "out.jsonl")
+
+    count = translate_many(
+        "English", "Spanish", records, path, max_workers=2, pack_tokens=100
+    )
+
+    assert count == 40
+    results = list(read_jsonl(path))
+    assert [result["id"] for result in results] == list(range(40))
+    assert results[12]["translation"] == "21 drocer"
+    # 每条记录 8 或 9 个字节令牌，每个请求不超过 100 个令牌，共 4 个请求
+    assert completion.call_count == 4
@@ -0,0 +1,116 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from translation_agent import utils
+from translation_agent.stats import collect_stats
+from translation_agent.utils import multichunk_translation
+from translation_agent.utils import one_chunk_translate_text
+
+
+def answer(prompt, json_mode=False):
+    if json_mode:
+        return json.dumps({"critique": "ok", "translation": "fused"})
+    if "<EXPERT_SUGGESTIONS>" in prompt:
+        return "improved"
+    if "<TRANSLATION>" in prompt:
+        return "reflection"
+    return "draft"
+
+
+@pytest.fixture
+def fake_create(fake_response):
+    def create(**kwargs):
+        prompt = kwargs["messages"][1]["content"]
+        return fake_response(answer(prompt, "response_format" in kwargs))
+
+    return create
+
+
+@pytest.fixture
+def create(mocker, fake_create):
+    return mocker.patch.object(
+        utils.client.chat.completions, "create", side_effect=fake_create
+    )
+
+
+@pytest.mark.parametrize(
+    "pipeline, expected, stages",
+    [
+        ("draft", "draft", {"initial": 1}),
+        ("fused", "fused", {"initial": 1, "fused": 1}),
+        ("full", "improved", {"initial": 1, "reflect": 1, "improve": 1}),
+    ],
+)
+def test_one_chunk_pipelines(create, pipeline, expected, stages):
+    with collect_stats() as stats:
+        result = one_chunk_translate_text(
+            "English", "Spanish", "Hello", pipeline=pipeline
+        )
+
+    assert result == expected
+    assert {stage: s.calls for stage, s in stats.stages.items()} == stages
+    assert stats.calls == create.call_count == len(stages)
+    assert stats.wall_seconds > 0
+
+
+@pytest.mark.parametrize("schedule", ["stage", "dataflow"])
+def test_multichunk_fused_pipeline(create, schedule):
+    chunks = ["One. ", "Two. ", "Three. "]
+
+    with collect_stats() as stats:
+        result = multichunk_translation(
+            "English",
+            "Spanish",
+            chunks,
+            max_concurrency=2,
+            schedule=schedule,
+            pipeline="fused",
+        )
+
+    assert result == ["fused"] * 3
+    assert stats.stages["initial"].calls == 3
+    assert stats.stages["fused"].calls == 3
+    assert stats.calls == 6
+
+
+def test_fused_falls_back_to_draft_on_invalid_json(mocker):
+    mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["draft", "not json"],
+    )
+
+    assert (
+        one_chunk_translate_text("English", "Spanish", "Hello", pipeline="fused")
+        == "draft"
+    )
+
+
+def test_unknown_pipeline():
+    with pytest.raises(ValueError):
+        multichunk_translation("English", "Spanish", ["a"], pipeline="fast")
+
+
+def test_stats_record_cached_tokens(mocker, fake_create):
+    def create_with_usage(**kwargs):
+        response = fake_create(**kwargs)
+        response.usage = SimpleNamespace(
+            prompt_tokens=100,
+            completion_tokens=10,
+            total_tokens=110,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=64),
+        )
+        return response
+
+    mocker.patch.object(
+        utils.client.chat.completions, "create", side_effect=create_with_usage
+    )
+
+    with collect_stats() as stats:
+        multichunk_translation("English", "Spanish", ["One. ", "Two. "])
+
+    assert stats.stages["reflect"].prompt_tokens == 200
+    assert stats.stages["improve"].cached_tokens == 128
+    assert stats.cached_tokens == 6 * 64
+    assert stats.as_dict()["prompt_tokens"] == 600
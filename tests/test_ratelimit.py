@@ -0,0 +1,76 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from translation_agent import utils
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.ratelimit import TokenBucket
+from translation_agent.ratelimit import limiter_for
+
+
+def test_token_bucket_queues_reservations():
+    bucket = TokenBucket(60, capacity=1)
+    now = bucket._updated
+
+    assert bucket.reserve(1, now) == 0.0
+    assert bucket.reserve(1, now) == 1.0
+    assert bucket.reserve(1, now) == 2.0
+    # 3 秒后额度恢复到容量上限
+    assert bucket.reserve(1, now + 3.0) == 0.0
+
+
+def test_rate_limiter_budgets_tokens_and_settles():
+    limiter = RateLimiter(tpm=600)
+
+    assert limiter._reserve(600) == 0.0
+    assert limiter._reserve(60) > 5.9
+
+    # 实际只用了 60 个令牌，退回多扣的额度
+    limiter.settle(600, 60)
+    assert limiter._reserve(60) < 0.1
+
+
+def test_rate_limiter_does_not_serialize_calls():
+    limiter = RateLimiter(rpm=600)
+
+    def call():
+        limiter.acquire()
+        time.sleep(0.2)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.perf_counter() - started < 0.6
+
+
+def test_limiter_for_is_shared_per_endpoint():
+    first = limiter_for("test-endpoint|a", rpm=10)
+    again = limiter_for("test-endpoint|a", rpm=20, tpm=1000)
+
+    assert first is again
+    assert (again.rpm, again.tpm) == (20, 1000)
+    assert limiter_for("test-endpoint|b", rpm=10) is not first
+
+
+def test_get_completion_acquires_limiter(mocker, fake_response):
+    response = fake_response("Hola", SimpleNamespace(total_tokens=12))
+    mocker.patch.object(
+        utils.client.chat.completions, "create", return_value=response
+    )
+    mocker.patch("translation_agent.utils._estimate_tokens", return_value=40)
+    limiter = RateLimiter(rpm=600, tpm=6000)
+    acquire = mocker.spy(limiter, "acquire")
+    settle = mocker.spy(limiter, "settle")
+
+    utils.set_rate_limiter(limiter)
+    try:
+        assert utils.get_completion("Hello", "system", "model") == "Hola"
+    finally:
+        utils.set_rate_limiter(None)
+
+    acquire.assert_called_once_with(40)
+    settle.assert_called_once_with(40, 12)
@@ -0,0 +1,143 @@
+import email.utils
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import openai
+import pytest
+
+from translation_agent import utils
+from translation_agent.retry import CircuitBreaker
+from translation_agent.retry import CircuitOpenError
+from translation_agent.retry import RetryPolicy
+from translation_agent.retry import call_with_retry
+from translation_agent.retry import retry_after
+
+
+def rate_limit_error(headers=None):
+    response = httpx.Response(
+        429,
+        headers=headers or {},
+        request=httpx.Request("POST", "https://example.com/v1/chat"),
+    )
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_retry_after_header_formats():
+    assert retry_after(rate_limit_error({"retry-after": "3"})) == 3.0
+    assert retry_after(rate_limit_error({"retry-after-ms": "250"})) == 0.25
+
+    moment = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < retry_after(rate_limit_error({"retry-after": moment})) <= 30
+    assert retry_after(rate_limit_error()) is None
+    assert retry_after(ValueError("no response")) is None
+
+
+def test_call_with_retry_backs_off_and_honours_retry_after():
+    errors = [rate_limit_error({"retry-after": "7"}), rate_limit_error()]
+    calls = []
+
+    def request():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    delays = []
+    policy = RetryPolicy(initial_delay=1.0, multiplier=2.0, jitter=0.0)
+
+    assert call_with_retry(request, policy, sleep=delays.append) == "ok"
+    assert len(calls) == 3
+    assert delays == [7.0, 2.0]
+
+
+def test_call_with_retry_raises_non_retryable_errors_at_once():
+    def request():
+        raise ValueError("bad request")
+
+    delays = []
+    with pytest.raises(ValueError):
+        call_with_retry(request, RetryPolicy(), sleep=delays.append)
+    assert delays == []
+
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    def request():
+        raise rate_limit_error()
+
+    policy = RetryPolicy(max_attempts=2, jitter=0.0, initial_delay=0.0)
+    with pytest.raises(openai.RateLimitError):
+        call_with_retry(request, policy, breaker, sleep=lambda _: None)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before_call()
+    assert 59 < info.value.retry_in <= 60
+
+    # 打开时重试循环等到 reset_timeout 结束，再放行一个试探请求，成功则关闭
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        breaker._opened_at -= delay
+
+    assert call_with_retry(lambda: "ok", policy, breaker, sleep=sleep) == "ok"
+    assert len(delays) == 1 and 59 < delays[0] <= 60
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_with_non_retryable_error_releases_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker._opened_at -= 60
+
+    def request():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        call_with_retry(request, RetryPolicy(), breaker)
+    assert breaker.state == "half-open"
+    assert call_with_retry(lambda: "ok", RetryPolicy(), breaker) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_concurrent_throttling_does_not_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    barrier = threading.Barrier(8)
+
+    def call():
+        throttled = [rate_limit_error({"retry-after": "0.05"})]
+
+        def request():
+            # 8 个请求同时收到限流
+            if throttled:
+                barrier.wait(timeout=5)
+                raise throttled.pop()
+            return "ok"
+
+        return call_with_retry(request, RetryPolicy(jitter=0.0), breaker)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: call(), range(8)))
+
+    assert results == ["ok"] * 8
+    assert breaker.state == "closed"
+
+
+def test_get_completion_retries_only_the_failed_call(mocker, fake_response):
+    response = fake_response("Hola")
+    create = mocker.patch.object(
+        utils.client.chat.completions,
+        "create",
+        side_effect=[rate_limit_error({"retry-after": "0"}), response],
+    )
+
+    utils.set_retry_policy(RetryPolicy(jitter=0.0))
+    try:
+        assert utils.get_completion("Hello", "system", "model") == "Hola"
+    finally:
+        utils.set_retry_policy(RetryPolicy())
+
+    assert create.call_count == 2
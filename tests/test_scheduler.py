@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from translation_agent.scheduler import DataflowScheduler
+from translation_agent.utils import multichunk_dataflow_translation
+from translation_agent.utils import multichunk_translation_stream
+
+
+def test_dataflow_scheduler_advances_longest_chunk_first():
+    calls = []
+
+    def stage(name):
+        def run(i):
+            calls.append((name, i))
+            return f"{name}-{i}"
+
+        return run
+
+    scheduler = DataflowScheduler(
+        [("a", stage("a")), ("b", stage("b"))], max_concurrency=1
+    )
+    results = scheduler.run([1, 5, 3])
+
+    assert results == {"a": ["a-0", "a-1", "a-2"], "b": ["b-0", "b-1", "b-2"]}
+    # 每个块完成所有阶段后才开始下一个块，且最长的块最先开始
+    assert calls == [
+        ("a", 1),
+        ("b", 1),
+        ("a", 2),
+        ("b", 2),
+        ("a", 0),
+        ("b", 0),
+    ]
+    assert set(scheduler.timings[1].stages) == {"a", "b"}
+    assert scheduler.timings[1].duration("a") >= 0
+
+
+def test_dataflow_scheduler_does_not_wait_for_stage_barrier():
+    # 块 0 的第一阶段一直阻塞，直到块 1 完成第二阶段
+    second_stage_done = threading.Event()
+
+    def first(i):
+        if i == 0:
+            assert second_stage_done.wait(timeout=5)
+        return i
+
+    def second(i):
+        if i == 1:
+            second_stage_done.set()
+        return i
+
+    scheduler = DataflowScheduler(
+        [("first", first), ("second", second)], max_concurrency=2
+    )
+
+    assert scheduler.run([10, 1]) == {"first": [0, 1], "second": [0, 1]}
+
+
+def test_dataflow_scheduler_raises_stage_error():
+    def fail(i):
+        raise RuntimeError("boom")
+
+    scheduler = DataflowScheduler(
+        [("first", lambda i: i), ("second", fail)], max_concurrency=3
+    )
+
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.run([1, 2, 3])
+
+
+def test_multichunk_dataflow_translation(mocker):
+    def fake_completion(prompt, system_message=None):
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            return "improved"
+        if "<TRANSLATION>" in prompt:
+            return "reflection"
+        return "draft"
+
+    mock_get_completion = mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    translations, timings = multichunk_dataflow_translation(
+        "English", "Spanish", ["One. ", "Two. ", "Three."], max_concurrency=2
+    )
+
+    assert translations == ["improved"] * 3
+    assert mock_get_completion.call_count == 9
+    assert [set(t.stages) for t in timings] == [
+        {"initial", "reflect", "improve"}
+    ] * 3
+
+
+def test_dataflow_scheduler_in_order_reports_completion():
+    completed = []
+    scheduler = DataflowScheduler(
+        [("a", lambda i: i), ("b", lambda i: i)],
+        in_order=True,
+        on_complete=completed.append,
+    )
+    scheduler.run([1, 5, 3])
+
+    assert completed == [0, 1, 2]
+
+
+def test_multichunk_translation_stream_yields_before_last_chunk(mocker):
+    first_yielded = threading.Event()
+
+    def fake_completion(prompt, system_message=None):
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[-1].split("\n")[0]
+        if "<EXPERT_SUGGESTIONS>" in prompt:
+            # 最后一块在调用方拿到第一块之后才能完成
+            if chunk == "Three. ":
+                assert first_yielded.wait(5)
+            return f"improved {chunk.strip()}"
+        if "<TRANSLATION>" in prompt:
+            return "reflection"
+        return "draft"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    stream = multichunk_translation_stream(
+        "English",
+        "Spanish",
+        ["One. ", "Two. ", "Three. "],
+        max_concurrency=3,
+    )
+
+    assert next(stream) == "improved One."
+    first_yielded.set()
+    assert list(stream) == ["improved Two.", "improved Three."]
@@ -0,0 +1,131 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from translation_agent import utils
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.retry import RetryPolicy
+from translation_agent.stats import collect_stats
+from translation_agent.streaming import current_stream
+from translation_agent.streaming import stream_completions
+from translation_agent.utils import multichunk_initial_translation
+
+
+def fake_stream(*parts):
+    return [
+        SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=part))]
+        )
+        for part in parts
+    ]
+
+
+def test_get_completion_streams_deltas(mocker):
+    create = mocker.patch.object(
+        utils.client.chat.completions,
+        "create",
+        return_value=fake_stream("Hola", None, ", mundo"),
+    )
+    deltas = []
+
+    with stream_completions(deltas.append) as stream:
+        result = utils.get_completion("Hello, world", "system", "model")
+
+    assert result == "Hola, mundo"
+    assert deltas == ["Hola", ", mundo"]
+    assert len(stream.time_to_first_token) == 1
+    assert create.call_args.kwargs["stream"] is True
+    assert current_stream() is None
+
+
+def test_streamed_usage_is_recorded_and_settled(mocker):
+    usage = SimpleNamespace(
+        prompt_tokens=20, completion_tokens=5, total_tokens=25
+    )
+    chunks = fake_stream("Hola") + [SimpleNamespace(choices=[], usage=usage)]
+    create = mocker.patch.object(
+        utils.client.chat.completions, "create", return_value=chunks
+    )
+    mocker.patch("translation_agent.utils._estimate_tokens", return_value=100)
+    limiter = RateLimiter(tpm=1000)
+    settle = mocker.spy(limiter, "settle")
+    mocker.patch.object(utils, "rate_limiter", limiter)
+
+    with collect_stats() as stats, stream_completions(lambda delta: None):
+        assert utils.get_completion("Hello", "system", "model") == "Hola"
+
+    assert create.call_args.kwargs["stream_options"] == {
+        "include_usage": True
+    }
+    assert stats.prompt_tokens == 20
+    assert stats.completion_tokens == 5
+    settle.assert_called_once_with(100, 25)
+
+
+def test_retried_stream_discards_partial_text(mocker):
+    def broken_stream():
+        yield from fake_stream("Ho")
+        raise openai.APIConnectionError(
+            request=httpx.Request("POST", "https://example.com/v1/chat")
+        )
+
+    mocker.patch.object(
+        utils.client.chat.completions,
+        "create",
+        side_effect=[broken_stream(), fake_stream("Hola", ", mundo")],
+    )
+    mocker.patch.object(
+        utils, "retry_policy", RetryPolicy(initial_delay=0.0, jitter=0.0)
+    )
+    shown = []
+
+    def on_discard(text):
+        assert "".join(shown).endswith(text)
+        del shown[-len(text) :]
+
+    with stream_completions(shown.extend, on_discard):
+        result = utils.get_completion("Hello, world", "system", "model")
+
+    assert result == "Hola, mundo"
+    assert "".join(shown) == "Hola, mundo"
+
+
+def test_get_completion_without_stream_is_unchanged(mocker, fake_response):
+    response = fake_response("Hola")
+    create = mocker.patch.object(
+        utils.client.chat.completions, "create", return_value=response
+    )
+
+    assert utils.get_completion("Hello", "system", "model") == "Hola"
+    assert "stream" not in create.call_args.kwargs
+
+
+def test_stream_reaches_worker_threads(mocker):
+    threads = set()
+
+    def create(**kwargs):
+        threads.add(threading.get_ident())
+        chunk = kwargs["messages"][1]["content"].split("<TRANSLATE_THIS>\n")[-1]
+        return fake_stream(chunk.split("\n")[0].upper())
+
+    mocker.patch.object(
+        utils.client.chat.completions, "create", side_effect=create
+    )
+    deltas = []
+    lock = threading.Lock()
+
+    def on_delta(delta):
+        with lock:
+            deltas.append(delta)
+
+    with stream_completions(on_delta) as stream:
+        result = multichunk_initial_translation(
+            "English", "Spanish", ["a. ", "b. ", "c. "], max_concurrency=3
+        )
+
+    assert result == ["A. ", "B. ", "C. "]
+    assert sorted(deltas) == ["A. ", "B. ", "C. "]
+    assert len(stream.time_to_first_token) == 3
+    assert threading.get_ident() not in threads
@@ -0,0 +1,41 @@
+import tiktoken
+
+from translation_agent import utils
+from translation_agent.tokens import TokenizedText
+
+
+# 每个字节一个令牌的编码器，不需要联网下载 BPE 文件
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+def test_tokenized_text_counts_ranges_from_offsets():
+    tokenized = TokenizedText("ab 你好", encoding=BYTE_ENCODING)
+
+    # "你" 和 "好" 各占 3 个字节
+    assert len(tokenized) == 9
+    assert tokenized.count(0, 3) == 3
+    assert tokenized.count(3, 4) == 3
+    assert tokenized.count(0, len(tokenized.text)) == len(tokenized)
+
+
+def test_translate_encodes_source_once(mocker):
+    encode = mocker.spy(BYTE_ENCODING, "encode")
+    mocker.patch(
+        "translation_agent.tokens.get_encoding", return_value=BYTE_ENCODING
+    )
+    mocker.patch(
+        "translation_agent.utils.multichunk_translation",
+        side_effect=lambda sl, tl, chunks, *args: chunks,
+    )
+
+    source_text = "one two three four. " * 20
+
+    assert utils.translate("English", "Spanish", source_text, "", 100) == (
+        source_text
+    )
+    encode.assert_called_once_with(source_text)
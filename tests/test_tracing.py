@@ -0,0 +1,156 @@
+import httpx
+import openai
+import pytest
+import tiktoken
+
+from translation_agent import utils
+from translation_agent.retry import RetryPolicy
+from translation_agent.retry import call_with_retry
+from translation_agent.stats import stage_label
+from translation_agent.tracing import Profiler
+from translation_agent.tracing import Tracer
+from translation_agent.tracing import span
+from translation_agent.tracing import trace
+from translation_agent.utils import translate
+
+
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+class Recorder(Tracer):
+    def __init__(self):
+        self.started = []
+        self.events = []
+
+    def on_span_start(self, span):
+        self.started.append(span)
+
+    def on_event(self, span, name, attributes):
+        self.events.append((span.name, name, attributes))
+
+
+def fake_completion(prompt, system_message=None):
+    if "<EXPERT_SUGGESTIONS>" in prompt:
+        return "improved "
+    if "<TRANSLATION>" in prompt:
+        return "reflection "
+    return "draft "
+
+
+def test_span_without_tracer_is_noop():
+    with span("translate") as current:
+        assert current is None
+
+
+def test_translate_emits_stage_and_call_spans(mocker):
+    mocker.patch(
+        "translation_agent.tokens.get_encoding", return_value=BYTE_ENCODING
+    )
+    mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+    text = "First sentence here. Second sentence here. Third one here."
+    recorder = Recorder()
+    profiler = Profiler()
+
+    with trace(recorder, profiler):
+        result = translate("English", "Spanish", text, "", max_tokens=25)
+
+    spans = {span.span_id: span for span in profiler.spans}
+    root = next(span for span in profiler.spans if span.name == "translate")
+    assert root.parent_id is None
+    assert root.attributes["tokens"] == len(text)
+
+    stages = [span for span in profiler.spans if span.name == "stage"]
+    assert [span.attributes["stage"] for span in stages] == [
+        "initial",
+        "reflect",
+        "improve",
+    ]
+    chunks = len(stages[0].output)
+    assert chunks > 1
+    assert result == "".join(stages[2].output) == "improved " * chunks
+
+    calls = [span for span in profiler.spans if span.name == "call"]
+    assert len(calls) == 3 * chunks
+    for call in calls:
+        assert spans[call.parent_id].name == "stage"
+        assert spans[call.parent_id].attributes["stage"] == (
+            call.attributes["stage"]
+        )
+    assert {call.attributes["chunk"] for call in calls} == set(range(chunks))
+
+    # 开始事件按执行顺序到达
+    assert [span.name for span in recorder.started[:3]] == [
+        "translate",
+        "chunking",
+        "stage",
+    ]
+
+    path = profiler.critical_path()
+    assert path[0] == (0, root)
+    assert [
+        span.attributes["stage"] for depth, span in path if depth == 1
+        and span.name == "stage"
+    ] == ["initial", "reflect", "improve"]
+    assert "关键路径" in profiler.report()
+
+
+def test_retry_is_recorded_as_event():
+    errors = [
+        openai.APITimeoutError(request=httpx.Request("POST", "https://x"))
+    ]
+
+    def request():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    recorder = Recorder()
+    with trace(recorder), stage_label("initial", 3):
+        call_with_retry(
+            request, RetryPolicy(jitter=0.0), sleep=lambda delay: None
+        )
+
+    assert recorder.events == [
+        ("call", "retry", {"error": "APITimeoutError", "delay": 1.0})
+    ]
+
+
+def test_span_records_error():
+    profiler = Profiler()
+
+    with pytest.raises(ValueError), trace(profiler), span("stage"):
+        raise ValueError("boom")
+
+    assert isinstance(profiler.spans[0].error, ValueError)
+
+
+def test_opentelemetry_tracer_exports_spans(mocker):
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    from translation_agent.tracing import OpenTelemetryTracer
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    mocker.patch(
+        "translation_agent.utils.get_completion", side_effect=fake_completion
+    )
+
+    with trace(OpenTelemetryTracer(provider.get_tracer("test"))):
+        utils.one_chunk_translate_text("English", "Spanish", "Hello")
+
+    names = [span.name for span in exporter.get_finished_spans()]
+    assert names.count("translation_agent.stage") == 3
+    assert names.count("translation_agent.call") == 3